@@ -0,0 +1,144 @@
+# src/analysis/influence_engine.py
+"""
+Weighted PageRank and batched personalized PageRank over the multimodal graph.
+
+Works on the weighted CSR adjacency (co-appearance weights, other edges weight 1) with sparse
+matrix-vector / matrix-matrix power iteration; many seed sets converge together as the columns
+of one matrix. Node-type projections (e.g. user-user only) are applied as a 0/1 mask inside the
+iteration, so restricting the graph never copies it.
+"""
+import numpy as np
+from scipy import sparse
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.graph_csr import CSRGraph, is_csr, load_graph
+
+class InfluenceEngine:
+    def __init__(self, A, names, node_type, type_names, alpha=0.85):
+        self.A = sparse.csr_matrix(A, dtype=np.float64)  # undirected graph: A is symmetric, so P^T x = A (x / w)
+        self.names = names
+        self.node_type = np.asarray(node_type)
+        self.type_names = list(type_names)
+        self.alpha = alpha
+        self._index = None
+        self._masks = {}
+        self._pr = {}
+
+    @classmethod
+    def from_graph_path(cls, graph_path, alpha=0.85):
+        if is_csr(graph_path):
+            g = CSRGraph(graph_path)
+            return cls(g.adjacency(weighted=True), [str(x) for x in g.node_ids], g.node_type, g.node_types, alpha)
+        return cls.from_networkx(load_graph(graph_path), alpha)
+
+    @classmethod
+    def from_networkx(cls, G, alpha=0.85):
+        nodes = list(G.nodes())
+        idx = {n: i for i, n in enumerate(nodes)}
+        type_names = sorted({d.get('type') for _, d in G.nodes(data=True) if d.get('type') is not None})
+        node_type = [type_names.index(d['type']) if d.get('type') is not None else -1 for _, d in G.nodes(data=True)]
+        rows, cols, w = [], [], []
+        for a, b, d in G.edges(data=True):
+            x = float(d.get('weight', 1.0))
+            rows += [idx[a], idx[b]]; cols += [idx[b], idx[a]]; w += [x, x]
+        A = sparse.csr_matrix((w, (rows, cols)), shape=(len(nodes), len(nodes)))
+        return cls(A, [str(n) for n in nodes], node_type, type_names, alpha)
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = {n: i for i, n in enumerate(self.names)}
+        return self._index
+
+    def rows(self, nodes):
+        return np.array([self.index[n] for n in nodes if n in self.index], dtype=np.int64)
+
+    def projection(self, types):
+        """Sorted tuple of the node types of a projection (None = whole graph); ValueError if empty or unknown."""
+        if types is None:
+            return None
+        key = tuple(sorted(set(types)))
+        if not key:
+            raise ValueError("empty node type set")
+        unknown = [t for t in key if t not in self.type_names]
+        if unknown:
+            raise ValueError(f"unknown node types {', '.join(map(str, unknown))} (the graph has {', '.join(self.type_names)})")
+        return key
+
+    def _mask(self, types):
+        """(0/1 node mask, masked out-weights) for a node-type projection; None = whole graph."""
+        key = self.projection(types)
+        if key not in self._masks:
+            if key is None:
+                m = np.ones(len(self.names))
+            else:
+                codes = [self.type_names.index(t) for t in key]
+                m = np.isin(self.node_type, codes).astype(np.float64)
+            self._masks[key] = (m, m * (self.A @ m))
+        return self._masks[key]
+
+    def _iterate(self, S, types=None, tol=1e-8, max_iter=200, check_every=4):
+        """Power iteration X = alpha * P^T X + (1-alpha) S (+ dangling mass back to S), column-wise."""
+        m, w = self._mask(types)
+        inv_w = np.divide(1.0, w, out=np.zeros_like(w), where=w > 0)[:, None]
+        dangling = np.nonzero((m > 0) & (w == 0))[0]
+        mcol = m[:, None] if types is not None else None
+        teleport = (1 - self.alpha) * S
+        X = S.copy()
+        for it in range(max_iter):
+            # X stays zero outside the mask, so only the result needs masking
+            X_new = self.A @ (X * inv_w)
+            if mcol is not None:
+                X_new *= mcol
+            X_new *= self.alpha
+            X_new += teleport
+            if len(dangling):
+                X_new += S * (self.alpha * X[dangling].sum(axis=0))
+            if it % check_every == 0 and np.abs(X_new - X).sum(axis=0).max() < tol:
+                return X_new
+            X = X_new
+        return X
+
+    def pagerank(self, types=None, tol=1e-8, max_iter=200):
+        """Global weighted PageRank (restricted to `types` if given); cached per projection."""
+        key = self.projection(types)
+        if key not in self._pr:
+            m, _ = self._mask(types)
+            self._pr[key] = self._iterate((m / m.sum())[:, None], types, tol, max_iter)[:, 0]
+        return self._pr[key]
+
+    def personalized(self, seed_sets, types=None, tol=1e-8, max_iter=200):
+        """Personalized PageRank for many seed sets at once; returns an (n, len(seed_sets)) matrix."""
+        m, _ = self._mask(types)
+        S = np.zeros((len(self.names), len(seed_sets)))
+        for j, seeds in enumerate(seed_sets):
+            r = self.rows(seeds)
+            r = r[m[r] > 0]
+            if len(r):
+                S[r, j] = 1.0 / len(r)
+        return self._iterate(S, types, tol, max_iter)
+
+    def top_k(self, scores, k=10, among=None, types=None):
+        """[(node, score)] of the k best rows, optionally only among the given rows / node types."""
+        scores = np.asarray(scores, dtype=np.float64).copy()
+        if types is not None:
+            scores[self._mask(types)[0] == 0] = -np.inf
+        if among is not None:
+            keep = np.full(len(scores), False); keep[among] = True
+            scores[~keep] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        top = np.argpartition(-scores, k-1)[:k] if k else np.zeros(0, dtype=np.int64)
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.names[i], float(scores[i])) for i in top]
+
+    def top_influencers(self, seed_sets=None, k=10, types=None, within=True):
+        """
+        Global top-k by PageRank when seed_sets is None; otherwise one ranked list per seed set
+        (a community or user set) from a single batched personalized run. within=True ranks
+        only the set's own members, else every node reachable from it.
+        """
+        if seed_sets is None:
+            return self.top_k(self.pagerank(types), k, types=types)
+        X = self.personalized(seed_sets, types)
+        return [self.top_k(X[:, j], k, among=self.rows(s) if within else None, types=types)
+                for j, s in enumerate(seed_sets)]
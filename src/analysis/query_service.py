@@ -0,0 +1,366 @@
+# src/analysis/query_service.py
+"""
+Long-lived local query service over the multimodal graph (HTTP on localhost or a Unix socket).
+
+The graph (CSR arrays, weighted PageRank engine) is loaded once. Communities, PageRank and the
+link model / recommendation candidates are built on first use and reuse the on-disk result cache.
+Answers go through an in-memory LRU cache keyed by endpoint and parameters. Requests are served
+by a thread per connection (keep-alive). POST /reload (or --watch SECONDS) loads a graph rewritten
+by build_graph into a fresh state. The old state keeps serving until the swap, and a failed
+reload leaves it in place. The CSR arrays are read into memory rather than mapped, and --watch
+keys on the files of the current CSR generation, which only change once save_csr has atomically
+switched meta.json to a complete new generation (build_graph also replaces the gpickle atomically),
+so a rebuild in progress is never loaded half-written.
+Endpoints (GET, JSON; node names as in the graph, e.g. user_123, img_4, person_7):
+  /health                                       graph size, load time, cache and request counters
+  /nodes?type=user&limit=100                    node names (e.g. to pick load-test queries)
+  /neighbors?node=N[&type=user][&limit=100]     neighbours with edge type, weight and face (contains edges)
+  /community?node=N[&limit=100]                 community index, size and (some) members
+  /centrality?node=N[&types=user]               weighted PageRank score and rank
+  /top_influencers?k=10[&types=user][&seeds=a,b | &community=0]
+  /link_score?a=U&b=V                           link-model probability for a user pair
+  /recommend?user=U[&k=10]                      top-k candidates (see models/recommend.py)
+  POST /reload                                  reload graph + model from disk
+Usage:
+  python query_service.py --graph data/dataset/multimodal_graph.csr --model data/dataset/link_model.joblib --port 8750
+  python query_service.py --graph data/dataset/multimodal_graph.csr --socket /tmp/graph.sock --watch 10
+  curl 'http://127.0.0.1:8750/top_influencers?k=5&types=user'
+"""
+import os, sys, json, time, argparse, threading, socketserver
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.graph_csr import CSRGraph, is_csr, csr_path_for, load_graph
+from analysis.influence_engine import InfluenceEngine
+from analysis.result_cache import cached, _stat_key
+
+class LRUCache:
+    def __init__(self, size=4096):
+        self.size = size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return self.data[key]
+            self.misses += 1
+        value = compute()  # outside the lock: slow queries do not block cache hits
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.data), 'size': self.size, 'hits': self.hits, 'misses': self.misses}
+
+def _split(s):
+    return [x for x in s.split(',') if x] if s else None
+
+def _int(s, name, default):
+    try:
+        return int(s) if s is not None else default
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+class ModelUnavailable(Exception):
+    """The service was started without a (readable) link model; answered with 503."""
+
+class GraphState:
+    """Everything one loaded graph answers queries from; replaced wholesale on reload."""
+    def __init__(self, graph_path, emb_dir=None, model_path=None, alpha=0.85, cache_size=4096):
+        self.graph_path, self.emb_dir, self.model_path, self.alpha = graph_path, emb_dir, model_path, alpha
+        csr = graph_path if is_csr(graph_path) else csr_path_for(graph_path)
+        self.path = csr if is_csr(csr) else graph_path
+        self.stat = _stat_key(self.path)
+        t = time.perf_counter()
+        if is_csr(self.path):  # in memory (not mmapped), neighbour lists with edge types
+            g = CSRGraph(self.path, mmap=False)
+            self.engine = InfluenceEngine(g.adjacency(weighted=True), [str(x) for x in g.node_ids], g.node_type,
+                                          g.node_types, alpha)
+            self.indptr, self.indices, self.weight = g.indptr, g.indices, np.nan_to_num(g.weight, nan=1.0)
+            self.edge_type, self.edge_types, self.edge_face = g.edge_type, g.edge_types, g.edge_face
+        else:
+            self.engine = InfluenceEngine.from_graph_path(self.path, alpha)
+            A = self.engine.A
+            self.indptr, self.indices, self.weight = A.indptr, A.indices, A.data
+            self.edge_type, self.edge_types, self.edge_face = None, [], None
+        self.types = np.array(self.engine.type_names + [None], dtype=object)[self.engine.node_type]
+        self.load_seconds = time.perf_counter() - t
+        self.loaded_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.cache = LRUCache(cache_size)
+        self.lock = threading.Lock()  # guards the lazily built parts below
+        self.pr_lock = threading.Lock()
+        self._communities = self._community_of = None
+        self._pr = {}
+        self._model = self._candidates = None
+
+    def row(self, node):
+        if node is None:
+            raise ValueError("missing node name")
+        if node not in self.engine.index:
+            raise KeyError(node)
+        return self.engine.index[node]
+
+    def communities(self):
+        with self.lock:
+            if self._communities is None:
+                from analysis.communities import detect_communities, community_map
+                path = self.path
+                self._communities = cached(path, "communities", {'method': 'louvain', 'seed': 42},
+                                           lambda: detect_communities(load_graph(path), seed=42))
+                self._community_of = community_map(self._communities)
+        return self._communities, self._community_of
+
+    def pagerank(self, types=None):
+        key = self.engine.projection(types) or ()  # ValueError (-> 400) for an empty or unknown type set
+        with self.pr_lock:
+            if key not in self._pr:
+                self._pr[key] = cached(self.path, "pagerank", {'alpha': self.alpha, 'types': list(key)},
+                                       lambda: self.engine.pagerank(types))
+            return self._pr[key]
+
+    def link_model(self):
+        with self.lock:
+            if self._model is None:
+                if not self.model_path or not os.path.exists(self.model_path):
+                    raise ModelUnavailable("no link model loaded (start with --model, see link_prediction_baseline --save_model)")
+                from models.link_prediction_baseline import load_model
+                from models.candidates import CandidateIndex
+                self._model = load_model(self.model_path)
+                self._candidates = CandidateIndex.from_graph(self.path, self.emb_dir)
+                self._user_pos = {str(self._candidates.names[r]): i for i, r in enumerate(self._candidates.user_rows)}
+        return self._model, self._candidates, self._user_pos
+
+    # --- queries: string parameters in, JSON-able dicts out ---
+    def health(self):
+        return {'graph': self.path, 'nodes': len(self.engine.names), 'edges': int(self.engine.A.nnz // 2),
+                'loaded_at': self.loaded_at, 'load_seconds': round(self.load_seconds, 3), 'cache': self.cache.stats()}
+
+    def nodes(self, type=None, limit=None):
+        rows = np.nonzero(self.types == type)[0] if type else np.arange(len(self.engine.names))
+        return {'nodes': [self.engine.names[i] for i in rows[:_int(limit, 'limit', 100)]], 'total': int(len(rows))}
+
+    def neighbors(self, node=None, type=None, limit=None):
+        i = self.row(node)
+        lo, hi = self.indptr[i], self.indptr[i+1]
+        out = []
+        for j, pos in zip(self.indices[lo:hi], range(lo, hi)):
+            if type and self.types[j] != type:
+                continue
+            e = {'node': self.engine.names[j], 'type': self.types[j], 'weight': float(self.weight[pos])}
+            if self.edge_type is not None and self.edge_type[pos] >= 0:
+                e['edge'] = self.edge_types[self.edge_type[pos]]
+            if self.edge_face is not None and self.edge_face[pos] >= 0:
+                e['face'] = int(self.edge_face[pos])
+            out.append(e)
+        limit = _int(limit, 'limit', 100)
+        return {'node': node, 'degree': int(hi - lo), 'neighbors': out[:limit], 'total': len(out)}
+
+    def community(self, node=None, limit=None):
+        self.row(node)
+        communities, community_of = self.communities()
+        c = community_of.get(node)
+        if c is None:
+            return {'node': node, 'community': None}
+        members = sorted(map(str, communities[c]))
+        return {'node': node, 'community': c, 'size': len(members), 'members': members[:_int(limit, 'limit', 100)]}
+
+    def centrality(self, node=None, types=None):
+        i = self.row(node)
+        types = _split(types)
+        pr = self.pagerank(types)
+        if types and self.types[i] not in types:
+            raise ValueError(f"{node} is not in the {'/'.join(types)} projection")
+        return {'node': node, 'pagerank': float(pr[i]), 'rank': int((pr > pr[i]).sum()) + 1}
+
+    def top_influencers(self, k=None, types=None, seeds=None, community=None):
+        k, types = _int(k, 'k', 10), _split(types)
+        if seeds or community is not None:
+            if seeds:
+                seed_set = _split(seeds)
+            else:
+                communities, _ = self.communities()
+                c = _int(community, 'community', 0)
+                if not 0 <= c < len(communities):
+                    raise KeyError(f"community {c}")
+                seed_set = sorted(map(str, communities[c]))
+            ranking = self.engine.top_influencers([seed_set], k, types)[0]
+        else:
+            ranking = self.engine.top_k(self.pagerank(types), k, types=types)
+        return {'k': k, 'top': [{'node': n, 'score': s} for n, s in ranking]}
+
+    def link_score(self, a=None, b=None):
+        model, index, pos = self.link_model()
+        for n in (a, b):
+            if n not in pos:
+                raise KeyError(n if n is not None else "missing user")
+        return {'a': a, 'b': b, 'score': float(index.score(model, pos[a], np.array([pos[b]]))[0]),
+                'linked': bool(pos[b] in set(index.excluded(pos[a]).tolist()))}
+
+    def recommend(self, user=None, k=None):
+        model, index, pos = self.link_model()
+        if user not in pos:
+            raise KeyError(user if user is not None else "missing user")
+        top, scores, n = index.recommend(model, pos[user], _int(k, 'k', 10))
+        return {'user': user, 'candidates_scored': n,
+                'recommendations': [{'user': str(index.names[index.user_rows[c]]), 'score': float(s)}
+                                    for c, s in zip(top, scores)]}
+
+QUERIES = {'/health', '/nodes', '/neighbors', '/community', '/centrality', '/top_influencers', '/link_score', '/recommend'}
+UNCACHED = {'/health'}
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, every response carries Content-Length
+
+    def setup(self):
+        # headers and body are separate writes: without TCP_NODELAY each reply waits on a delayed ACK (~40 ms)
+        self.disable_nagle_algorithm = isinstance(self.client_address, tuple)  # not on Unix sockets
+        super().setup()
+
+    def _send(self, code, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        server = self.server
+        server.count()
+        if url.path not in QUERIES:
+            return self._send(404, {'error': f"unknown endpoint {url.path}"})
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        state = server.state  # one consistent state per request, even if a reload swaps it meanwhile
+        method = getattr(state, url.path[1:])
+        try:
+            if url.path in UNCACHED:
+                result = method(**params)
+                result['requests'] = server.requests
+            else:
+                result = state.cache.get_or_compute((url.path, tuple(sorted(params.items()))), lambda: method(**params))
+        except KeyError as e:
+            return self._send(404, {'error': f"not found: {e.args[0] if e.args else e}"})
+        except (TypeError, ValueError) as e:
+            return self._send(400, {'error': str(e)})
+        except ModelUnavailable as e:
+            return self._send(503, {'error': str(e)})
+        except Exception as e:
+            return self._send(500, {'error': f"{type(e).__name__}: {e}"})
+        self._send(200, result)
+
+    def do_POST(self):
+        self.server.count()
+        if urlsplit(self.path).path != '/reload':
+            return self._send(404, {'error': f"unknown endpoint {self.path}"})
+        n = int(self.headers.get('Content-Length') or 0)
+        if n:
+            self.rfile.read(n)
+        try:
+            self._send(200, self.server.reload())
+        except Exception as e:
+            self._send(500, {'error': f"reload failed, still serving the previous graph: {type(e).__name__}: {e}"})
+
+    def address_string(self):
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+class ServiceMixin:
+    """State holder shared by the TCP and Unix-socket servers."""
+    daemon_threads = True
+
+    def setup_service(self, make_state, verbose=False):
+        self.make_state = make_state
+        self.verbose = verbose
+        self.reload_lock = threading.Lock()
+        self.counter_lock = threading.Lock()
+        self.requests = 0
+        self.state = make_state()
+
+    def count(self):
+        with self.counter_lock:
+            self.requests += 1
+
+    def reload(self):
+        with self.reload_lock:  # one reload at a time; queries keep using the old state meanwhile
+            t = time.perf_counter()
+            state = self.make_state()
+            old = self.state
+            self.state = state
+            return {'reloaded': True, 'seconds': round(time.perf_counter() - t, 3), 'nodes': len(state.engine.names),
+                    'changed': state.stat != old.stat}
+
+    def watch(self, interval):
+        """Reload whenever a new CSR generation (or a replaced gpickle) appears, checked every interval seconds."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    if _stat_key(self.state.path) != self.state.stat:
+                        print("Graph changed on disk, reloading:", self.reload(), flush=True)
+                except Exception as e:  # e.g. caught build_graph mid-write: keep serving, retry next round
+                    print(f"Reload failed ({type(e).__name__}: {e}), keeping the previous graph", flush=True)
+        threading.Thread(target=loop, daemon=True).start()
+
+class GraphServer(ServiceMixin, ThreadingHTTPServer):
+    pass
+
+class UnixGraphServer(ServiceMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    pass
+
+def serve(graph_path, emb_dir=None, model_path=None, host='127.0.0.1', port=8750, socket_path=None,
+          cache_size=4096, watch=None, alpha=0.85, verbose=False):
+    make_state = lambda: GraphState(graph_path, emb_dir, model_path, alpha, cache_size)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixGraphServer(socket_path, Handler)
+        where = socket_path
+    else:
+        server = GraphServer((host, port), Handler)
+        where = f"http://{host}:{server.server_address[1]}"
+    server.setup_service(make_state, verbose)
+    s = server.state
+    print(f"Loaded {s.path}: {len(s.engine.names)} nodes in {s.load_seconds:.2f}s; serving on {where}", flush=True)
+    if watch:
+        server.watch(watch)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--graph", default="data/dataset/multimodal_graph.csr", help="gpickle or .csr directory (the .csr copy is preferred)")
+    p.add_argument("--emb_dir", default="data/dataset/embeddings", help="embeddings for the recommendation candidates")
+    p.add_argument("--model", default=None, help="link model from link_prediction_baseline --save_model")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8750)
+    p.add_argument("--socket", default=None, help="serve on this Unix socket instead of TCP")
+    p.add_argument("--cache_size", type=int, default=4096, help="LRU entries for query results")
+    p.add_argument("--watch", type=float, default=None, help="poll the graph every N seconds and reload when it changes")
+    p.add_argument("--alpha", type=float, default=0.85)
+    p.add_argument("--verbose", action="store_true", help="log every request")
+    args = p.parse_args(argv)
+    serve(args.graph, args.emb_dir, args.model, args.host, args.port, args.socket, args.cache_size, args.watch,
+          args.alpha, args.verbose)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# src/analysis/result_cache.py
+"""
+On-disk cache for analysis results (centrality vectors, community assignments, layouts).
+
+Entries are keyed by a content fingerprint of the graph (sha1 of the gpickle, or of the current
+generation's files in a .csr directory, see graph_csr.py) plus the algorithm name and its parameters, so a result is reused only
+for exactly the same graph and settings. Fingerprints are memoised by (size, mtime) per path:
+when build_graph rewrites the graph the stat changes, the file is rehashed once, and entries
+for the old content simply stop matching. The cache is size bounded; least recently used
+entries are evicted first.
+Default location: <graph dir>/.analysis_cache
+"""
+import os, sys, json, pickle, hashlib, tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.graph_csr import is_csr, generation_files
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+def _graph_files(graph_path):
+    """(name, path) of the files holding the graph; names do not change when the same graph is rewritten."""
+    if is_csr(graph_path):
+        return generation_files(graph_path)
+    if os.path.isdir(graph_path):
+        return [(f, os.path.join(graph_path, f)) for f in sorted(os.listdir(graph_path))]
+    return [(os.path.basename(graph_path), graph_path)]
+
+def _stat_key(graph_path):
+    return [[os.path.basename(f), os.stat(f).st_size, os.stat(f).st_mtime_ns] for _, f in _graph_files(graph_path)]
+
+def _hash_files(files, block=1<<20):
+    h = hashlib.sha1()
+    for name, path in files:
+        h.update(name.encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(block), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+class ResultCache:
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._fp_path = os.path.join(cache_dir, "fingerprints.json")
+
+    @classmethod
+    def for_graph(cls, graph_path, max_bytes=DEFAULT_MAX_BYTES):
+        return cls(os.path.join(os.path.dirname(os.path.abspath(graph_path)), ".analysis_cache"), max_bytes)
+
+    def fingerprint(self, graph_path):
+        """Content hash of the graph; only rehashes when its size/mtime changed since the last call."""
+        key = os.path.abspath(graph_path)
+        memo = {}
+        if os.path.exists(self._fp_path):
+            with open(self._fp_path, encoding='utf-8') as f:
+                memo = json.load(f)
+        stat = _stat_key(graph_path)
+        entry = memo.get(key)
+        if entry and entry['stat'] == stat:
+            return entry['sha1']
+        sha1 = _hash_files(_graph_files(graph_path))
+        memo[key] = {'stat': stat, 'sha1': sha1}
+        self._atomic_write(self._fp_path, json.dumps(memo).encode())
+        return sha1
+
+    def _entry_path(self, fingerprint, name, params):
+        k = hashlib.sha1(json.dumps([fingerprint, name, params], sort_keys=True, default=str).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}-{k}.pkl")
+
+    def is_valid(self, graph_path, name, params=None):
+        """True if a result for the graph's current content and these parameters is cached."""
+        return os.path.exists(self._entry_path(self.fingerprint(graph_path), name, params or {}))
+
+    def get_or_compute(self, graph_path, name, params, compute):
+        path = self._entry_path(self.fingerprint(graph_path), name, params or {})
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+                os.utime(path)  # mark as recently used
+                return value
+            except Exception:
+                pass  # unreadable entry: recompute and overwrite
+        value = compute()
+        self._atomic_write(path, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        self.evict()
+        return value
+
+    def evict(self):
+        entries = []
+        for e in os.scandir(self.cache_dir):
+            if e.name.endswith('.pkl'):
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+        total = sum(s for _, s, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def _atomic_write(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+def cached(graph_path, name, params, compute):
+    """get_or_compute with the default cache next to the graph."""
+    return ResultCache.for_graph(graph_path).get_or_compute(graph_path, name, params, compute)
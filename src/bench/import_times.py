@@ -0,0 +1,122 @@
+# src/bench/import_times.py
+"""
+Import-time report for the CLI commands (see cli.py), to catch startup regressions.
+
+For every command, a fresh interpreter imports the command's module under `python -X importtime`
+(the best of --repeat runs is kept), and `cli.py <command> --help` is timed end to end. The report lists
+the import time, the --help wall time and which heavy packages (torch, ultralytics, sklearn, ...)
+the import already pulled in, with their cumulative import times. Those should only load when
+a stage runs. --baseline compares against an earlier JSON and exits non-zero when a command's
+import got slower than --tolerance allows.
+Usage:
+  python import_times.py --out data/bench/import_times.json
+  python import_times.py --commands preprocess,face_cluster --baseline data/bench/import_times.json
+"""
+import os, sys, json, time, argparse, platform, subprocess
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cli import COMMANDS, SRC
+
+HEAVY = ['torch', 'ultralytics', 'face_recognition', 'dlib', 'pytesseract', 'cv2', 'sklearn',
+         'matplotlib', 'networkx', 'scipy', 'pandas']
+
+def parse_importtime(stderr):
+    """{package: cumulative µs} of every import in -X importtime output (the outermost entry per name)."""
+    out = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # header line
+        name = parts[2].strip()
+        out[name] = max(out.get(name, 0), int(parts[1]))
+    return out
+
+def time_import(module, repeat=3):
+    """(import ms, {heavy package: cumulative ms}) for a fresh interpreter importing module; best of repeat."""
+    code = f"import sys; sys.path.insert(0, {SRC!r}); import {module}"
+    best = None
+    for _ in range(repeat):
+        r = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+        if r.returncode != 0:
+            raise RuntimeError(r.stderr.strip().splitlines()[-1] if r.stderr.strip() else f"exit {r.returncode}")
+        times = parse_importtime(r.stderr)
+        if best is None or times.get(module, 0) < best.get(module, 0):
+            best = times
+    heavy = {p: round(best[p] / 1e3, 1) for p in HEAVY if p in best}
+    return round(best.get(module, 0) / 1e3, 1), heavy
+
+def time_help(command, repeat=3):
+    """Best wall ms of `python cli.py <command> --help` (interpreter startup included)."""
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(SRC, "cli.py"), command, "--help"],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        ms = (time.perf_counter() - t) * 1e3
+        best = ms if best is None else min(best, ms)
+    return round(best, 1)
+
+def report(commands, repeat=3):
+    results = []
+    for name in commands:
+        module = COMMANDS[name][0]
+        res = {'command': name, 'module': module, 'ok': False}
+        try:
+            res['import_ms'], res['heavy'] = time_import(module, repeat)
+            res['help_ms'] = time_help(name, repeat)
+            res['ok'] = True
+            heavy = ", ".join(f"{p} {ms:.0f}" for p, ms in sorted(res['heavy'].items(), key=lambda x: -x[1]))
+            print(f"  {name:<24} import {res['import_ms']:7.0f} ms   --help {res['help_ms']:7.0f} ms"
+                  + (f"   heavy: {heavy}" if heavy else ""))
+        except Exception as e:
+            res['error'] = str(e)
+            print(f"  {name:<24} FAILED: {e}")
+        results.append(res)
+    return results
+
+def compare(results, baseline, tolerance=0.25, min_ms=50):
+    """Commands whose import got slower than the baseline report by more than tolerance (and min_ms)."""
+    old = {r['command']: r for r in baseline['results'] if r.get('ok')}
+    regressions = []
+    for r in results:
+        o = old.get(r['command'])
+        if not o or not r.get('ok'):
+            continue
+        if r['import_ms'] > o['import_ms'] * (1 + tolerance) and r['import_ms'] - o['import_ms'] > min_ms:
+            new = sorted(set(r['heavy']) - set(o.get('heavy', {})))
+            regressions.append(f"{r['command']}: import {o['import_ms']:.0f} -> {r['import_ms']:.0f} ms"
+                               + (f" (now imports {', '.join(new)})" if new else ""))
+    return regressions
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--commands", default=None, help="comma separated (default: all CLI commands)")
+    p.add_argument("--repeat", type=int, default=3, help="runs per measurement, the best is kept")
+    p.add_argument("--out", default=None, help="write the JSON report here")
+    p.add_argument("--baseline", default=None, help="earlier report JSON to check for regressions")
+    p.add_argument("--tolerance", type=float, default=0.25, help="allowed relative import slowdown")
+    args = p.parse_args(argv)
+    commands = [c for c in args.commands.split(',') if c] if args.commands else list(COMMANDS)
+    unknown = [c for c in commands if c not in COMMANDS]
+    if unknown:
+        p.error(f"unknown commands {unknown}")
+    baseline = None
+    if args.baseline:  # read before --out possibly overwrites it
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    results = report(commands, args.repeat)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                       'platform': platform.platform(), 'results': results}, f, indent=2)
+        print("Wrote", args.out)
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for r in regressions:
+            print("REGRESSION", r)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
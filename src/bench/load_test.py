@@ -0,0 +1,159 @@
+# src/bench/load_test.py
+"""
+Load test for the graph query service (analysis/query_service.py).
+
+Picks query nodes from the service itself (/nodes), then --concurrency threads, each with its own
+keep-alive connection, send a weighted mix of queries for --duration seconds (or --requests in
+total). Nodes are drawn Zipf-like, so some queries repeat and hit the service's LRU cache as a
+dashboard would. The report has count, errors, p50/p90/p99/max latency in ms and throughput, per
+endpoint and overall, and can be written as JSON.
+Usage:
+  python load_test.py --url http://127.0.0.1:8750 --concurrency 8 --duration 20
+  python load_test.py --socket /tmp/graph.sock --requests 5000 --mix neighbors=3,centrality=2,recommend=1 --out data/bench/load.json
+"""
+import os, json, time, socket, argparse, threading
+import http.client
+from urllib.parse import urlsplit, urlencode
+import numpy as np
+
+DEFAULT_MIX = "neighbors=4,centrality=3,community=1,top_influencers=1,link_score=2,recommend=1"
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+def connect(url=None, socket_path=None, timeout=30):
+    if socket_path:
+        return UnixHTTPConnection(socket_path, timeout)
+    u = urlsplit(url)
+    return http.client.HTTPConnection(u.hostname, u.port or 80, timeout=timeout)
+
+def request(conn, method, path):
+    conn.request(method, path)
+    r = conn.getresponse()
+    return r.status, r.read()
+
+def make_queries(users, nodes, mix, n, rng, zipf=1.1):
+    """n (endpoint, path) pairs following the weighted mix; nodes are picked with a Zipf-like skew."""
+    def pick(pool, size):
+        p = 1.0 / np.arange(1, len(pool) + 1) ** zipf
+        return [pool[i] for i in rng.choice(len(pool), size=size, p=p / p.sum())]
+    names, weights = zip(*mix.items())
+    kinds = rng.choice(len(names), size=n, p=np.array(weights) / sum(weights))
+    u, v, x = pick(users, n), pick(users, n), pick(nodes, n)
+    out = []
+    for i, k in enumerate(kinds):
+        ep = names[k]
+        if ep == 'neighbors':
+            q = {'node': x[i]}
+        elif ep in ('centrality', 'community'):
+            q = {'node': u[i]}
+        elif ep == 'top_influencers':
+            q = {'k': 10, 'types': 'user'}
+        elif ep == 'link_score':
+            q = {'a': u[i], 'b': v[i]}
+        elif ep == 'recommend':
+            q = {'user': u[i], 'k': 10}
+        else:
+            raise ValueError(f"unknown endpoint {ep}")
+        out.append((ep, f"/{ep}?{urlencode(q)}"))
+    return out
+
+def _worker(conn_args, queries, results, deadline):
+    conn = connect(**conn_args)
+    for ep, path in queries:
+        if deadline and time.perf_counter() > deadline:
+            break
+        t = time.perf_counter()
+        try:
+            status, _ = request(conn, 'GET', path)
+        except (OSError, http.client.HTTPException):
+            status = None
+            conn.close(); conn = connect(**conn_args)
+        results.append((ep, time.perf_counter() - t, status))
+    conn.close()
+
+def summarize(results, wall):
+    def stats(rows):
+        lat = np.array([r[1] for r in rows]) * 1e3
+        errors = sum(1 for r in rows if r[2] != 200)
+        p50, p90, p99 = np.percentile(lat, [50, 90, 99]) if len(lat) else (0, 0, 0)
+        return {'count': len(rows), 'errors': errors, 'p50_ms': round(float(p50), 3), 'p90_ms': round(float(p90), 3),
+                'p99_ms': round(float(p99), 3), 'max_ms': round(float(lat.max()), 3) if len(lat) else 0,
+                'per_s': round(len(rows) / wall, 1) if wall else None}
+    by = {}
+    for r in results:
+        by.setdefault(r[0], []).append(r)
+    return {'overall': stats(results), 'endpoints': {ep: stats(rows) for ep, rows in sorted(by.items())}}
+
+def run(url=None, socket_path=None, concurrency=8, duration=10.0, n_requests=None, mix=DEFAULT_MIX,
+        n_nodes=1000, warmup=True, seed=0):
+    conn_args = {'url': url, 'socket_path': socket_path}
+    mix = {k: float(v) for k, v in (x.split('=') for x in mix.split(',') if x)}
+    conn = connect(**conn_args)
+    status, body = request(conn, 'GET', '/health')
+    if status != 200:
+        raise RuntimeError(f"service not healthy: {status} {body[:200]!r}")
+    health = json.loads(body)
+    users = json.loads(request(conn, 'GET', f"/nodes?type=user&limit={n_nodes}")[1])['nodes']
+    nodes = json.loads(request(conn, 'GET', f"/nodes?limit={n_nodes * 5}")[1])['nodes']
+    if warmup:  # build the lazily loaded parts (PageRank, communities, link model) outside the measurement
+        for ep, path in make_queries(users, nodes, {k: 1 for k in mix}, 4 * len(mix), np.random.default_rng(seed + 1)):
+            request(conn, 'GET', path)
+    conn.close()
+    print(f"Service: {health['nodes']} nodes from {health['graph']}; {len(users)} users / {len(nodes)} nodes to query")
+    rng = np.random.default_rng(seed)
+    total = n_requests or int(max(1, duration) * 20000)  # duration runs stop at the deadline
+    queries = make_queries(users, nodes, mix, total, rng)
+    per = [queries[i::concurrency] for i in range(concurrency)]
+    results = []  # list.append is atomic under the GIL
+    t0 = time.perf_counter()
+    deadline = None if n_requests else t0 + duration
+    threads = [threading.Thread(target=_worker, args=(conn_args, q, results, deadline)) for q in per]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    wall = time.perf_counter() - t0
+    report = summarize(results, wall)
+    report.update({'concurrency': concurrency, 'wall_s': round(wall, 3), 'mix': mix})
+    o = report['overall']
+    print(f"{o['count']} requests in {wall:.1f}s ({o['per_s']}/s, {o['errors']} errors), "
+          f"p50 {o['p50_ms']} ms, p99 {o['p99_ms']} ms")
+    for ep, s in report['endpoints'].items():
+        print(f"  {ep:<16} {s['count']:7d}  p50 {s['p50_ms']:8.3f} ms  p99 {s['p99_ms']:8.3f} ms  errors {s['errors']}")
+    conn = connect(**conn_args)
+    report['cache'] = json.loads(request(conn, 'GET', '/health')[1])['cache']
+    conn.close()
+    print(f"Cache: {report['cache']}")
+    return report
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--url", default="http://127.0.0.1:8750")
+    p.add_argument("--socket", default=None, help="Unix socket of the service (instead of --url)")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--duration", type=float, default=10.0, help="seconds to run (ignored with --requests)")
+    p.add_argument("--requests", type=int, default=None, help="total requests instead of a duration")
+    p.add_argument("--mix", default=DEFAULT_MIX, help="endpoint=weight, comma separated")
+    p.add_argument("--nodes", type=int, default=1000, help="users (and 5x nodes) to draw queries from")
+    p.add_argument("--no_warmup", action="store_true", help="measure the first queries too (lazy loading included)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default=None, help="write the JSON report here")
+    args = p.parse_args(argv)
+    report = run(args.url, args.socket, args.concurrency, args.duration, args.requests, args.mix, args.nodes,
+                 not args.no_warmup, args.seed)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print("Wrote", args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# src/bench/run_benchmarks.py
+"""
+Per-stage scaling benchmarks on synthetic data (see synthetic.py).
+
+For every size the synthetic inputs are generated once, then each stage runs in a fresh
+process so its peak RSS is its own: face_cluster.cluster (DBSCAN rebuild), build_graph.build,
+link_prediction_baseline.run, train_gnn_lite.run and the scalable graph_metrics_summary report.
+Results (wall seconds, baseline and peak RSS in MB per stage and size) are written as JSON for
+plotting scaling curves; --baseline compares against an earlier JSON and exits non-zero when a
+stage got slower or bigger than --tolerance allows.
+Usage:
+  python run_benchmarks.py --sizes 1000,10000,50000 --out data/bench/results.json
+  python run_benchmarks.py --sizes 10000 --stages build_graph,face_cluster --baseline data/bench/results.json
+"""
+import os, sys, io, json, time, shutil, argparse, platform, contextlib, traceback
+import multiprocessing as mp
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench.synthetic import generate
+from utils import profiling
+from utils.profiling import peak_rss_mb
+
+STAGES = ['face_cluster', 'build_graph', 'link_prediction', 'gnn', 'graph_metrics']
+GRAPH_STAGES = {'link_prediction', 'gnn', 'graph_metrics'}
+
+def _stage(name, d, opts):
+    """Import and run one stage on the synthetic dataset in directory d; returns extra result fields."""
+    meta, emb = os.path.join(d, "metadata.csv"), os.path.join(d, "embeddings")
+    graph = os.path.join(d, "multimodal_graph.gpickle")
+    if name == 'face_cluster':
+        from data.face_cluster import cluster
+        import pandas as pd
+        from sklearn.metrics import adjusted_rand_score
+        out = os.path.join(d, "face_clusters_bench.csv")
+        return lambda: cluster(emb, meta, out, rebuild=True), lambda: {
+            'ari_vs_planted': adjusted_rand_score(
+                pd.read_csv(os.path.join(d, "face_clusters.csv")).sort_values(['img_id', 'face'])['cluster'],
+                pd.read_csv(out).sort_values(['img_id', 'face'])['cluster'])}
+    if name == 'build_graph':
+        from data.build_graph import build
+        return lambda: build(meta, os.path.join(d, "cv_metadata_lite.csv"), os.path.join(d, "face_clusters.csv"), graph), None
+    if name == 'link_prediction':
+        from models.link_prediction_baseline import run as lp_run
+        return lambda: lp_run(os.path.join(d, "multimodal_graph.csr"), opts['sample']), None
+    if name == 'gnn':
+        from models.train_gnn_lite import run as gnn_run
+        return lambda: gnn_run(graph, emb, epochs=opts['gnn_epochs'], n_pairs=opts['sample'], threads=opts['threads']), None
+    if name == 'graph_metrics':
+        from visualize.graph_metrics_summary import summarize
+        return lambda: summarize(os.path.join(d, "multimodal_graph.csr"), mode='scalable', k=opts['k'],
+                                 budget=opts['budget'], workers=opts['threads'] or 1), None
+    raise ValueError(f"unknown stage {name}")
+
+def _child(name, d, opts, conn):
+    res = {'stage': name, 'ok': False}
+    if opts.get('trace'):  # written at exit of this spawned child
+        profiling.init(os.path.join(opts['trace'], f"{name}-{os.path.basename(d)}.trace.json"), name)
+    try:
+        fn, extra = _stage(name, d, opts)
+        res['base_rss_mb'] = peak_rss_mb()
+        log = io.StringIO()
+        t = time.perf_counter()
+        with contextlib.redirect_stdout(log):
+            fn()
+        res['wall_s'] = round(time.perf_counter() - t, 4)
+        res['peak_rss_mb'] = peak_rss_mb()
+        if extra:
+            res.update(extra())
+        res['ok'] = True
+    except Exception:
+        res['error'] = traceback.format_exc(limit=3)
+    conn.send(res)
+    conn.close()
+
+def run_stage(name, d, opts):
+    ctx = mp.get_context('spawn')
+    parent, child = ctx.Pipe(duplex=False)
+    p = ctx.Process(target=_child, args=(name, d, opts, child))
+    p.start()
+    child.close()
+    res = parent.recv() if parent.poll(opts['timeout']) else {'stage': name, 'ok': False, 'error': 'timeout'}
+    p.join(5)
+    if p.is_alive():
+        p.terminate()
+    return res
+
+def compare(results, baseline, tolerance=0.25, min_seconds=0.5):
+    """Stages that got slower / used more memory than the baseline report by more than tolerance."""
+    old = {(r['stage'], r['n_images']): r for r in baseline['results'] if r.get('ok')}
+    regressions = []
+    for r in results:
+        o = old.get((r['stage'], r['n_images']))
+        if not o or not r.get('ok'):
+            continue
+        if r['wall_s'] > o['wall_s'] * (1 + tolerance) and r['wall_s'] - o['wall_s'] > min_seconds:
+            regressions.append(f"{r['stage']} @ {r['n_images']}: {o['wall_s']:.2f}s -> {r['wall_s']:.2f}s")
+        if r.get('peak_rss_mb') and o.get('peak_rss_mb') and r['peak_rss_mb'] > o['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{r['stage']} @ {r['n_images']}: {o['peak_rss_mb']:.0f}MB -> {r['peak_rss_mb']:.0f}MB peak RSS")
+    return regressions
+
+def benchmark(sizes, stages, work_dir, opts, seed=0):
+    results = []
+    for n in sizes:
+        d = os.path.join(work_dir, f"n{n}")
+        t = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate(d, n, vis_dim=opts['vis_dim'], seed=seed)
+        # same seed -> same graph content, so drop cached results or reruns would time cache hits
+        shutil.rmtree(os.path.join(d, ".analysis_cache"), ignore_errors=True)
+        if 'build_graph' not in stages and set(stages) & GRAPH_STAGES:
+            run_stage('build_graph', d, opts)  # untimed, the graph stages need its output
+        print(f"[{n} images] synthetic data in {time.perf_counter()-t:.1f}s")
+        for name in stages:
+            res = run_stage(name, d, opts)
+            res['n_images'] = n
+            results.append(res)
+            if res['ok']:
+                rss = f", peak {res['peak_rss_mb']:.0f} MB" if res.get('peak_rss_mb') else ""
+                print(f"  {name:<16} {res['wall_s']:8.2f}s{rss}")
+            else:
+                print(f"  {name:<16} FAILED: {res['error'].strip().splitlines()[-1]}")
+    return results
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", default="1000,10000", help="numbers of images, comma separated")
+    p.add_argument("--stages", default=",".join(STAGES))
+    p.add_argument("--work_dir", default="data/bench", help="synthetic datasets go to <work_dir>/n<size>")
+    p.add_argument("--out", default="data/bench/results.json")
+    p.add_argument("--baseline", default=None, help="earlier results JSON to check for regressions")
+    p.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown / memory growth")
+    p.add_argument("--sample", type=int, default=500, help="pairs for the link-prediction stages")
+    p.add_argument("--gnn_epochs", type=int, default=2)
+    p.add_argument("--k", type=int, default=64, help="pivots for the sampled graph metrics")
+    p.add_argument("--budget", type=float, default=30.0, help="seconds per sampled graph metric")
+    p.add_argument("--threads", type=int, default=None)
+    p.add_argument("--vis_dim", type=int, default=64)
+    p.add_argument("--timeout", type=float, default=3600.0, help="seconds per stage")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--trace", default=None, help="directory for one Chrome-trace JSON per stage and size (see utils/profiling.py)")
+    args = p.parse_args(argv)
+    opts = {k: getattr(args, k) for k in ('sample', 'gnn_epochs', 'k', 'budget', 'threads', 'vis_dim', 'timeout', 'trace')}
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    stages = [s for s in args.stages.split(',') if s]
+    baseline = None
+    if args.baseline:  # read before --out possibly overwrites it
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    results = benchmark(sizes, stages, args.work_dir, opts, args.seed)
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+              'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'options': opts,
+              'sizes': sizes, 'results': results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print("Wrote", args.out)
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for r in regressions:
+            print("REGRESSION", r)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
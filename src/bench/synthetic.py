@@ -0,0 +1,109 @@
+# src/bench/synthetic.py
+"""
+Synthetic workload generator: the pipeline's inputs without images, face_recognition or YOLO.
+
+Writes into --out (same layout as data/dataset):
+  metadata.csv            id, file, title, owner
+  cv_metadata_lite.csv    id, file, num_faces, yolo_labels, ocr
+  embeddings/face_*, vis_* sharded stores (see data/embedding_store.py), faces keyed <id>:<k>
+  face_clusters.csv       img_id, face, cluster  (the planted identities, i.e. the ground truth)
+Users and identities are split into social circles; an image's faces (one, sometimes several)
+are usually identities of its owner's circle, so co-appearance edges, communities and link
+prediction all have structure.
+Face embeddings are planted clusters: identity centres are ~1.6 apart in 128-d, faces lie within
+~0.3 of each other, so DBSCAN(eps=0.6) recovers the identities exactly.
+Usage:
+  python synthetic.py --out data/synthetic/10k --images 10000
+  python synthetic.py --out data/synthetic/100k --images 100000 --users 20000 --identities 10000
+"""
+import os, sys, argparse
+import numpy as np
+import pandas as pd
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.embedding_store import EmbeddingStore, face_key
+
+FACE_DIM = 128
+CV_COLUMNS = ['id', 'file', 'num_faces', 'yolo_labels', 'ocr']  # as written by preprocess_cv_lite (not imported: it loads the CV models)
+YOLO_LABELS = ['person', 'car', 'dog', 'chair', 'bottle', 'cup', 'bicycle', 'tv']
+
+def _zipf_choice(rng, n, size, a=1.2):
+    """Heavy-tailed picks in [0, n): a few users post / identities appear much more than others."""
+    p = 1.0 / np.arange(1, n+1) ** a
+    return rng.choice(n, size=size, p=p / p.sum())
+
+def generate(out_dir, n_images=10000, n_users=None, n_identities=None, n_circles=None, face_frac=0.6,
+             in_circle=0.9, vis_dim=64, shard_size=50000, seed=0, multi_face=0.3, max_faces=4):
+    rng = np.random.default_rng(seed)
+    n_users = n_users or max(2, n_images // 5)
+    n_identities = n_identities or max(2, n_images // 10)
+    n_circles = n_circles or max(1, n_users // 50)
+    os.makedirs(out_dir, exist_ok=True)
+    emb_dir = os.path.join(out_dir, "embeddings")
+    for name in ('face', 'vis'):  # start from empty stores so reruns do not append duplicates
+        for f in os.listdir(emb_dir) if os.path.isdir(emb_dir) else []:
+            if f.startswith(name + "_"):
+                os.remove(os.path.join(emb_dir, f))
+
+    ids = np.arange(n_images)
+    owners = _zipf_choice(rng, n_users, n_images)
+    user_circle = rng.integers(0, n_circles, n_users)
+    ident_circle = rng.integers(0, n_circles, n_identities)
+    circle_members = [np.nonzero(ident_circle == c)[0] for c in range(n_circles)]
+    has_face = rng.random(n_images) < face_frac
+    # images with a face have another one with probability multi_face (each), up to max_faces
+    num_faces = np.where(has_face, np.minimum(rng.geometric(1 - multi_face, n_images), max_faces), 0)
+    face_img = np.repeat(ids, num_faces)  # one entry per face, grouped by image
+    face_k = np.arange(len(face_img)) - np.repeat(np.cumsum(num_faces) - num_faces, num_faces)
+    identity = _zipf_choice(rng, n_identities, len(face_img))
+    # most faces come from the owner's circle (when it has identities), the rest from anywhere
+    local = rng.random(len(face_img)) < in_circle
+    for f in np.nonzero(local)[0]:
+        members = circle_members[user_circle[owners[face_img[f]]]]
+        if len(members):
+            identity[f] = members[rng.integers(len(members))]
+
+    pd.DataFrame({'id': ids, 'file': [f"synthetic/{i}.jpg" for i in ids],
+                  'title': [f"{i}.jpg" for i in ids], 'owner': [f"owner_{u}" for u in owners]}
+                 ).to_csv(os.path.join(out_dir, "metadata.csv"), index=False)
+    labels = rng.integers(0, len(YOLO_LABELS), (n_images, 2))
+    yolo = [",".join(sorted({YOLO_LABELS[a], YOLO_LABELS[b]} | ({'person'} if f else set())))
+            for (a, b), f in zip(labels, has_face)]
+    pd.DataFrame({'id': ids, 'file': [f"synthetic/{i}.jpg" for i in ids], 'num_faces': num_faces,
+                  'yolo_labels': yolo, 'ocr': ""}, columns=CV_COLUMNS
+                 ).to_csv(os.path.join(out_dir, "cv_metadata_lite.csv"), index=False)
+    pd.DataFrame({'img_id': face_img, 'face': face_k, 'cluster': identity}
+                 ).to_csv(os.path.join(out_dir, "face_clusters.csv"), index=False)
+
+    centres = rng.normal(0, 0.1, (n_identities, FACE_DIM)).astype('float32')
+    face = EmbeddingStore(emb_dir, 'face', shard_size)
+    vis = EmbeddingStore(emb_dir, 'vis', shard_size)
+    for s in range(0, n_images, shard_size):
+        block = ids[s:s+shard_size]
+        for i, v in zip(block, rng.random((len(block), vis_dim), dtype=np.float32)):
+            vis.add(i, v)
+        lo, hi = np.searchsorted(face_img, [block[0], block[-1] + 1])
+        X = centres[identity[lo:hi]] + rng.normal(0, 0.02, (hi - lo, FACE_DIM)).astype('float32')
+        for i, k, v in zip(face_img[lo:hi], face_k[lo:hi], X):
+            face.add(face_key(i, k), v)
+    face.flush(); vis.flush()
+    print(f"Wrote {n_images} images, {n_users} users, {len(face_img)} faces of {n_identities} identities "
+          f"in {n_circles} circles to {out_dir}")
+    return out_dir
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--out", default="data/synthetic")
+    p.add_argument("--images", type=int, default=10000)
+    p.add_argument("--users", type=int, default=None, help="default images/5")
+    p.add_argument("--identities", type=int, default=None, help="default images/10")
+    p.add_argument("--circles", type=int, default=None, help="social circles, default users/50")
+    p.add_argument("--face_frac", type=float, default=0.6, help="fraction of images with a face")
+    p.add_argument("--multi_face", type=float, default=0.3, help="chance that an image with faces has one more")
+    p.add_argument("--vis_dim", type=int, default=64, help="visual embedding size (the real pipeline uses 4096)")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+    generate(args.out, args.images, args.users, args.identities, args.circles, args.face_frac,
+             vis_dim=args.vis_dim, seed=args.seed, multi_face=args.multi_face)
+
+if __name__ == "__main__":
+    main()
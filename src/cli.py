@@ -0,0 +1,74 @@
+# src/cli.py
+"""
+One entry point for all pipeline scripts: python src/cli.py <command> [script args].
+
+Commands map to the scripts' main(argv). Only the chosen script's module is imported, and the
+scripts import their heavy libraries (ultralytics/dlib/Tesseract, sklearn, matplotlib) inside the
+functions that use them, so `--help` and no-op reruns start in well under a second.
+--import_time prints how long importing the command's module took (stderr); the full per-command
+report with the heaviest packages and a regression check is `cli.py import_times`.
+Usage:
+  python src/cli.py --help
+  python src/cli.py preprocess --meta data/dataset/metadata.csv --out data/dataset --workers 4
+  python src/cli.py --import_time face_cluster --help
+  python src/cli.py import_times --out data/bench/import_times.json
+"""
+import os, sys, time, importlib
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+
+COMMANDS = {  # name: (module with main(argv), summary); names follow the run_pipeline stages
+    'urls': ('data.generate_image_urls_csv', "write a CSV of sample image URLs"),
+    'download': ('data.download_images_from_urls', "download the images of a URL CSV"),
+    'prepare': ('data.dataset_prepare_visualgenome', "metadata.csv from a local image dir or Visual Genome"),
+    'dedup': ('data.dedup_images', "find near-duplicate images (dedup_map.csv)"),
+    'preprocess': ('data.preprocess_cv_lite', "faces, YOLO labels, visual embeddings and OCR per image"),
+    'embeddings': ('data.embedding_store', "migrate legacy *.pkl embeddings into the sharded store"),
+    'face_cluster': ('data.face_cluster', "cluster face embeddings into identities"),
+    'build_graph': ('data.build_graph', "build the multimodal user-image-person graph"),
+    'graph_csr': ('data.graph_csr', "convert a gpickle graph to the memory-mapped CSR format"),
+    'baseline': ('models.link_prediction_baseline', "logistic-regression link prediction"),
+    'gnn': ('models.train_gnn_lite', "GraphSAGE-style link prediction"),
+    'recommend': ('models.recommend', "per-user top-k recommendations from retrieved candidates"),
+    'bulk_score': ('models.bulk_score', "score all user pairs in tiles, top-k per user (LR or GNN)"),
+    'influence': ('analysis.influence_analysis', "top influencers (PageRank / degree)"),
+    'serve': ('analysis.query_service', "local HTTP / Unix-socket graph query service"),
+    'metrics': ('visualize.graph_metrics_summary', "graph metrics report"),
+    'community_viz': ('visualize.community_viz', "draw the detected communities"),
+    'community_influence_viz': ('visualize.community_influence_viz', "communities with influencers labelled"),
+    'pipeline': ('run_pipeline', "run the whole pipeline as a stage DAG"),
+    'synthetic': ('bench.synthetic', "generate a synthetic dataset"),
+    'bench': ('bench.run_benchmarks', "per-stage scaling benchmarks"),
+    'load_test': ('bench.load_test', "load test for the query service (p50/p99 latency)"),
+    'import_times': ('bench.import_times', "import-time report per command"),
+}
+
+def usage():
+    lines = ["usage: cli.py [--import_time] <command> [args...]", "", "commands:"]
+    lines += [f"  {name:<24} {summary}" for name, (_, summary) in COMMANDS.items()]
+    lines += ["", "`cli.py <command> --help` shows the command's options."]
+    return "\n".join(lines)
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    report = '--import_time' in argv[:1]
+    if report:
+        argv = argv[1:]
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0
+    name, rest = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print(f"cli.py: unknown command {name!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+    t = time.perf_counter()
+    module = importlib.import_module(COMMANDS[name][0])
+    if report:
+        print(f"[cli] import {COMMANDS[name][0]}: {(time.perf_counter() - t)*1e3:.0f} ms", file=sys.stderr)
+    sys.argv = [f"{os.path.basename(sys.argv[0])} {name}"] + rest  # argparse prog / usage lines
+    return module.main(rest)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,16 +4,59 @@ Build multimodal graph from metadata + cv outputs.
 
 Outputs:
   data/dataset/multimodal_graph.gpickle
+  data/dataset/multimodal_graph.csr/   (memory-mappable CSR copy, see graph_csr.py)
 Usage:
   python build_graph.py --meta data/dataset/metadata.csv --cv data/dataset/cv_metadata_lite.csv --faces data/dataset/face_clusters.csv
+  (add --dedup data/dataset/dedup_map.csv when preprocessing skipped duplicate images)
+face_clusters.csv has one row per face, so an image gets a contains edge to every person cluster
+seen in it (the edge's 'face' is the first face index of that cluster in the image).
 """
 import argparse, os
+import numpy as np
 import pandas as pd
 import networkx as nx
+from scipy import sparse
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.graph_csr import save_csr, csr_path_for
+from data.dedup_images import load_dedup_map
+from utils import profiling
 
-def build(meta_csv, cv_csv, faces_csv, out_path):
-    meta = pd.read_csv(meta_csv)
-    cv = pd.read_csv(cv_csv) if os.path.exists(cv_csv) else pd.DataFrame()
+def coappearance_counts(faces, owner):
+    """
+    Weighted user-user co-appearance from face clusters.
+    faces: DataFrame(img_id, cluster), one row per face; owner: Series image id -> user node
+    (ids are matched as strings, so numeric and path-like ids such as "a/b/c" both work).
+    Builds the binary cluster x user incidence B once and returns (user_a, user_b, weight)
+    arrays from the upper triangle of B^T B, i.e. the number of clusters two users share.
+    """
+    f_owner = faces['img_id'].astype(str).map(owner.set_axis(owner.index.astype(str)))
+    valid = f_owner.notna().to_numpy()
+    if not valid.any():
+        return [], [], []
+    c_codes, _ = pd.factorize(faces['cluster'][valid])
+    u_codes, u_labels = pd.factorize(f_owner[valid])
+    B = sparse.csr_matrix((np.ones(len(c_codes), dtype=np.int64), (c_codes, u_codes)),
+                          shape=(c_codes.max()+1, len(u_labels)))
+    B.data[:] = 1  # a user counts once per cluster, however many of their images it appears in
+    C = sparse.triu(B.T @ B, k=1).tocoo()
+    order = np.lexsort((C.col, C.row))
+    return u_labels[C.row[order]], u_labels[C.col[order]], C.data[order]
+
+def expand_duplicate_faces(faces, canonical_of):
+    """Give every duplicate image the face rows of its canonical image (unless it already has rows)."""
+    faces = faces.assign(img_id=faces['img_id'].astype(str))
+    have = set(faces['img_id'])
+    dups = pd.DataFrame([(d, c) for d, c in canonical_of.items() if d not in have], columns=['img_id', 'canon'])
+    extra = dups.merge(faces.rename(columns={'img_id': 'canon'}), on='canon').drop(columns='canon')
+    if len(extra):
+        faces = pd.concat([faces, extra[faces.columns]], ignore_index=True)
+    return faces
+
+def build(meta_csv, cv_csv, faces_csv, out_path, dedup_csv=None):
+    with profiling.stage("read_csv"):
+        meta = pd.read_csv(meta_csv)
+        cv = pd.read_csv(cv_csv) if os.path.exists(cv_csv) else pd.DataFrame()
     G = nx.Graph()
 
     # if metadata has owner column, anonymize, else create pseudo-user per image
@@ -22,51 +65,66 @@ def build(meta_csv, cv_csv, faces_csv, out_path):
     else:
         meta['user_anon'] = meta['id'].apply(lambda x: f"user_{x}")
 
-    # add user + image nodes
-    for _, r in meta.iterrows():
-        uid = r['user_anon']
-        iname = f"img_{r['id']}"
-        G.add_node(uid, type='user')
-        G.add_node(iname, type='image', file=r.get('file'), title=r.get('title'))
-        G.add_edge(uid, iname, type='posted')
+    # add user + image nodes (interleaved in row order) and posted edges in bulk
+    users = meta['user_anon'].tolist()
+    img_nodes = [f"img_{i}" for i in meta['id'].tolist()]
+    files = meta['file'].tolist() if 'file' in meta.columns else [None]*len(meta)
+    titles = meta['title'].tolist() if 'title' in meta.columns else [None]*len(meta)
+    nodes = []
+    for uid, iname, fl, tl in zip(users, img_nodes, files, titles):
+        nodes.append((uid, {'type': 'user'}))
+        nodes.append((iname, {'type': 'image', 'file': fl, 'title': tl}))
+    with profiling.stage("user_image_nodes", images=len(meta)):
+        G.add_nodes_from(nodes)
+        G.add_edges_from(zip(users, img_nodes), type='posted')
+    canonical_of = load_dedup_map(dedup_csv) if dedup_csv and os.path.exists(dedup_csv) else {}
+    if canonical_of:
+        # duplicates keep their own image node and poster, marked with the canonical image
+        G.add_nodes_from((f"img_{d}", {'duplicate_of': f"img_{c}"}) for d, c in canonical_of.items() if G.has_node(f"img_{d}"))
 
     # add person clusters + contains edges
     if os.path.exists(faces_csv):
         faces = pd.read_csv(faces_csv)
-        for _, fr in faces.iterrows():
-            cid = int(fr['cluster'])
-            person_node = f"person_{cid}"
-            G.add_node(person_node, type='person_cluster')
-            img_node = f"img_{fr['img_id']}"
-            if G.has_node(img_node):
-                G.add_edge(img_node, person_node, type='contains')
+        if canonical_of:
+            faces = expand_duplicate_faces(faces, canonical_of)
+        if 'face' not in faces.columns:  # one face per image before multi-face preprocessing
+            faces['face'] = 0
+        edges = faces.sort_values('face', kind='stable').drop_duplicates(['img_id', 'cluster']).sort_index()
+        person_nodes = ("person_" + edges['cluster'].astype(int).astype(str)).tolist()
+        face_imgs = ("img_" + edges['img_id'].astype(str)).tolist()
+        with profiling.stage("person_nodes", faces=len(faces)):
+            G.add_nodes_from(person_nodes, type='person_cluster')
+            image_set = set(img_nodes)
+            G.add_edges_from(((i, pn, {'face': int(k)}) for i, pn, k in zip(face_imgs, person_nodes, edges['face'].tolist())
+                              if i in image_set), type='contains')
 
         # coappearance -> user-user edges
-        grouped = faces.groupby('cluster')['img_id'].apply(list).to_dict()
-        for cluster, imgs in grouped.items():
-            users=set()
-            for iid in imgs:
-                rows = meta[meta['id']==int(iid)]
-                if len(rows)>0:
-                    users.add(rows.iloc[0]['user_anon'])
-            users = list(users)
-            for i in range(len(users)):
-                for j in range(i+1, len(users)):
-                    if G.has_edge(users[i], users[j]):
-                        G[users[i]][users[j]]['weight'] = G[users[i]][users[j]].get('weight',0)+1
-                    else:
-                        G.add_edge(users[i], users[j], weight=1, type='coappearance')
+        with profiling.stage("coappearance"):
+            owner = meta.drop_duplicates('id').set_index('id')['user_anon']
+            ua, ub, w = coappearance_counts(faces, owner)
+            G.add_edges_from((a, b, {'weight': int(x), 'type': 'coappearance'}) for a, b, x in zip(ua, ub, w))
 
     import pickle
-    with open(out_path, "wb") as f:
-        pickle.dump(G, f)
+    with profiling.stage("save_pickle"):
+        tmp = f"{out_path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            pickle.dump(G, f)
+        os.replace(tmp, out_path)  # readers (query_service --watch) never see a half-written pickle
+    with profiling.stage("save_csr"):
+        save_csr(G, csr_path_for(out_path))
     print("Saved graph to", out_path, "with", G.number_of_nodes(), "nodes and", G.number_of_edges(), "edges")
 
-if __name__ == "__main__":
+def main(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("--meta", default="data/dataset/metadata.csv")
     p.add_argument("--cv", default="data/dataset/cv_metadata_lite.csv")
     p.add_argument("--faces", default="data/dataset/face_clusters.csv")
     p.add_argument("--out", default="data/dataset/multimodal_graph.gpickle")
-    args = p.parse_args()
-    build(args.meta, args.cv, args.faces, args.out)
+    p.add_argument("--dedup", default=None, help="dedup_map.csv: duplicate images get their canonical image's faces")
+    profiling.add_trace_arg(p)
+    args = p.parse_args(argv)
+    profiling.init(args.trace, "build_graph", args.trace_top)
+    build(args.meta, args.cv, args.faces, args.out, args.dedup)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# src/data/cv_manifest.py
+"""
+Persistent manifest for incremental / resumable CV preprocessing.
+
+One row per image id in data/dataset/cv_manifest.sqlite holding the image content hash, the
+pipeline version it was processed with, the stages that finished and its cv_metadata_lite row.
+An image is skipped on rerun when its file is unchanged (size/mtime, else sha1) and every stage
+finished under the current PIPELINE_VERSION; stages that failed are retried.
+"""
+import os, json, hashlib, sqlite3
+
+# bump when a stage or model changes so every image is reprocessed
+PIPELINE_VERSION = "cv-lite-2"  # 2: every face per image, keyed "<id>:<k>", with boxes
+STAGES = ('face', 'yolo', 'vis', 'ocr')
+
+def file_hash(path, block=1<<20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_stat(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+class CVManifest:
+    def __init__(self, path, version=PIPELINE_VERSION):
+        self.path = path
+        self.version = version
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS images (
+            id TEXT PRIMARY KEY, hash TEXT, version TEXT, stages TEXT,
+            size INTEGER, mtime_ns INTEGER, row TEXT)""")
+        self.conn.commit()
+
+    def get(self, img_id):
+        cur = self.conn.execute("SELECT hash, version, stages, size, mtime_ns, row FROM images WHERE id=?", (str(img_id),))
+        r = cur.fetchone()
+        if r is None:
+            return None
+        return {'hash': r[0], 'version': r[1], 'stages': r[2].split(',') if r[2] else [],
+                'size': r[3], 'mtime_ns': r[4], 'row': json.loads(r[5])}
+
+    def is_complete(self, img_id, path, entry=None):
+        """True when the cached entry is current and no stage needs to run (checked via stat only)."""
+        entry = entry if entry is not None else self.get(img_id)
+        if entry is None or entry['version'] != self.version or not path or not os.path.exists(path):
+            return False
+        if not set(STAGES) <= set(entry['stages']):
+            return False
+        return (entry['size'], entry['mtime_ns']) == file_stat(path)
+
+    def record(self, img_id, info, row):
+        """Upsert an image; info is {'hash','size','mtime_ns','stages'} (None for a missing file)."""
+        info = info or {}
+        self.conn.execute("INSERT OR REPLACE INTO images VALUES (?,?,?,?,?,?,?)",
+                          (str(img_id), info.get('hash'), self.version, ",".join(info.get('stages', [])),
+                           info.get('size'), info.get('mtime_ns'), json.dumps(row)))
+
+    def commit(self):
+        self.conn.commit()
+
+    def rows(self, ids, batch=900):
+        """Yield stored rows for ids (in the given order), skipping ids that were never recorded."""
+        ids = [str(i) for i in ids]
+        for start in range(0, len(ids), batch):
+            chunk = ids[start:start+batch]
+            q = "SELECT id, row FROM images WHERE id IN (%s)" % ",".join("?"*len(chunk))
+            found = dict(self.conn.execute(q, chunk).fetchall())
+            for i in chunk:
+                if i in found:
+                    yield json.loads(found[i])
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -5,7 +5,9 @@ Prepare dataset metadata.
 Two modes:
 1) If you already have Visual Genome annotation file `visual_genome_image_data.json`
    in the same folder: the script will parse it and download required images.
+   The JSON is streamed item by item and rows are written in chunks, so memory stays flat.
 2) If you have a local directory of images (data/images), it will just produce metadata.csv.
+   Nested directories are scanned in parallel; width/height come from the image headers.
 
 Outputs:
   data/dataset/metadata.csv  (columns: id, file, title, width, height, url)
@@ -15,66 +17,183 @@ Usage:
   python dataset_prepare_visualgenome.py --mode vg --vg_json path/to/image_data.json --out data/dataset
 """
 
-import os, argparse, json, csv
+import os, sys, argparse, json, csv
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import profiling
 
-def prepare_from_local(img_dir, out_dir):
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+def iter_json_array(path, read_size=1<<20):
+    """
+    Yield the items of a top-level JSON array one at a time, reading the file in read_size
+    chunks (json.JSONDecoder.raw_decode on a rolling buffer), so memory is bounded by the
+    largest single item rather than the file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buf, pos, eof = f.read(read_size), 0, False
+        pos = len(buf) - len(buf.lstrip())
+        if buf[pos:pos+1] != '[':
+            raise ValueError(f"{path}: expected a JSON array")
+        pos += 1
+        while True:
+            # skip whitespace and the separating comma
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                buf, pos = f.read(read_size), 0
+                eof = not buf
+            if pos >= len(buf):
+                raise ValueError(f"{path}: truncated JSON array")
+            if buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                # only take the item once the ',' or ']' after it is in the buffer: a number cut by
+                # the chunk boundary ("[1, 22" + "222, 3]", "-1." + "5]") decodes as a shorter one
+                nxt = end
+                while nxt < len(buf) and buf[nxt] in ' \t\r\n':
+                    nxt += 1
+                complete = eof or (nxt < len(buf) and buf[nxt] in ',]')
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                more = f.read(read_size)  # item spans the chunk boundary
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield item
+            pos = end
+            if pos > read_size:
+                buf, pos = buf[pos:], 0
+
+def write_csv_chunks(rows, out_csv, fieldnames, chunk=10000):
+    """Write an iterable of row dicts in chunks to out_csv (atomically); returns the row count."""
+    tmp = out_csv + ".tmp"
+    n = 0
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        batch = []
+        for r in rows:
+            batch.append(r)
+            if len(batch) >= chunk:
+                writer.writerows(batch); n += len(batch); batch = []
+        writer.writerows(batch); n += len(batch)
+    os.replace(tmp, out_csv)
+    return n
+
+def _scan_dir(path):
+    files, dirs = [], []
+    with os.scandir(path) as it:
+        for e in it:
+            if e.is_dir(follow_symlinks=False):
+                dirs.append(e.path)
+            elif e.name.lower().endswith(IMAGE_EXTS):
+                files.append(e.path)
+    return files, dirs
+
+def scan_images(img_dir, workers=8):
+    """Image paths under img_dir (nested directories included), each directory scanned in a thread pool."""
+    found = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = [pool.submit(_scan_dir, img_dir)]
+        while pending:
+            files, dirs = pending.pop().result()
+            found.extend(files)
+            pending.extend(pool.submit(_scan_dir, d) for d in dirs)
+    return sorted(found)
+
+def image_size(path):
+    """(width, height) from the image header; PIL does not decode pixels until they are accessed."""
+    from PIL import Image
+    try:
+        with Image.open(path) as im:
+            return im.size
+    except Exception:
+        return None, None
+
+def local_ids(paths, root):
+    """
+    Image id per path: the file name without extension, prefixed with its sub-directories
+    ("a/b/c" for root/a/b/c.jpg). Files whose id would be shared (x.jpg next to x.png), or equal
+    another file's path, keep their extension, so ids never collide.
+    """
+    rel = [os.path.relpath(os.path.abspath(p), root).replace(os.sep, '/') for p in paths]
+    stems = [os.path.splitext(r)[0] for r in rel]
+    count = {}
+    for s in stems:
+        count[s] = count.get(s, 0) + 1
+    full = set(rel)
+    return [s if count[s] == 1 and s not in full else r for s, r in zip(stems, rel)]
+
+def prepare_from_local(img_dir, out_dir, workers=8):
     os.makedirs(out_dir, exist_ok=True)
-    rows=[]
-    for fname in os.listdir(img_dir):
-        if not fname.lower().endswith((".jpg",".jpeg",".png")):
-            continue
-        img_id = os.path.splitext(fname)[0]
-        path = os.path.abspath(os.path.join(img_dir, fname))
-        rows.append({'id': img_id, 'file': path, 'title': fname})
-    # write CSV
+    with profiling.stage("scan"):
+        paths = scan_images(img_dir, workers)
+    ids = local_ids(paths, os.path.abspath(img_dir))
+
+    def rows():
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for start in range(0, len(paths), 4096):
+                block = paths[start:start+4096]
+                for path, img_id, (w, h) in zip(block, ids[start:start+4096], pool.map(image_size, block)):
+                    path = os.path.abspath(path)
+                    yield {'id': img_id, 'file': path, 'title': os.path.basename(path), 'width': w, 'height': h}
     out_csv = os.path.join(out_dir, "metadata.csv")
-    with open(out_csv, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['id','file','title'])
-        writer.writeheader()
-        for r in rows: writer.writerow(r)
-    print("Wrote", out_csv, "with", len(rows), "rows")
+    with profiling.stage("headers_and_write", images=len(paths)):
+        n = write_csv_chunks(tqdm(rows(), total=len(paths)), out_csv, ['id','file','title','width','height'])
+    print("Wrote", out_csv, "with", n, "rows")
 
 def prepare_from_vg(vg_json_path, out_dir, img_dir=None, limit=None):
     """
     vg_json_path: path to Visual Genome image_data.json (list of dicts)
     Each item usually has: 'image_id', 'url', 'width', 'height', 'img_name'
+    The file is parsed item by item and rows are written in chunks.
     """
     os.makedirs(out_dir, exist_ok=True)
-    rows=[]
-    with open(vg_json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    for i, item in enumerate(tqdm(data)):
-        if limit and i >= limit: break
-        img_id = str(item.get('image_id') or item.get('img_name') or i)
-        url = item.get('url')
-        fname = None
-        if img_dir:
-            # expect image already downloaded with name image_id.jpg
-            candidate = os.path.join(img_dir, f"{img_id}.jpg")
-            if os.path.exists(candidate):
-                fname = os.path.abspath(candidate)
-        rows.append({'id': img_id, 'url': url, 'file': fname, 'width': item.get('width'), 'height': item.get('height')})
+    # expect images already downloaded with name image_id.jpg; one directory listing instead of a stat per item
+    local = set()
+    if img_dir and os.path.isdir(img_dir):
+        with os.scandir(img_dir) as it:
+            local = {e.name for e in it}
+
+    def rows():
+        for i, item in enumerate(tqdm(iter_json_array(vg_json_path))):
+            if limit and i >= limit: break
+            img_id = str(item.get('image_id') or item.get('img_name') or i)
+            fname = os.path.abspath(os.path.join(img_dir, f"{img_id}.jpg")) if f"{img_id}.jpg" in local else None
+            yield {'id': img_id, 'url': item.get('url'), 'file': fname, 'width': item.get('width'), 'height': item.get('height')}
     out_csv = os.path.join(out_dir, "metadata.csv")
-    import csv
-    with open(out_csv, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['id','file','url','width','height'])
-        writer.writeheader()
-        for r in rows: writer.writerow(r)
-    print("Wrote", out_csv, "with", len(rows), "rows")
+    n = write_csv_chunks(rows(), out_csv, ['id','file','url','width','height'])
+    print("Wrote", out_csv, "with", n, "rows")
 
-if __name__ == "__main__":
+def main(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("--mode", choices=['local','vg'], default='local')
     p.add_argument("--img_dir", default="data/images")
     p.add_argument("--vg_json", default=None)
     p.add_argument("--out", default="data/dataset")
     p.add_argument("--limit", type=int, default=None)
-    args = p.parse_args()
+    p.add_argument("--workers", type=int, default=8, help="threads for the directory scan / header reads (local mode)")
+    profiling.add_trace_arg(p)
+    args = p.parse_args(argv)
+    profiling.init(args.trace, "dataset_prepare_visualgenome", args.trace_top)
     if args.mode == 'local':
-        prepare_from_local(args.img_dir, args.out)
+        with profiling.stage("prepare_local"):
+            prepare_from_local(args.img_dir, args.out, args.workers)
     else:
         if not args.vg_json:
             print("Please provide --vg_json path (Visual Genome image_data.json)")
         else:
-            prepare_from_vg(args.vg_json, args.out, args.img_dir, args.limit)
+            with profiling.stage("prepare_vg"):
+                prepare_from_vg(args.vg_json, args.out, args.img_dir, args.limit)
+
+if __name__ == "__main__":
+    main()
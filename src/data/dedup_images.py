@@ -0,0 +1,138 @@
+# src/data/dedup_images.py
+"""
+Near-duplicate detection before CV processing (reposts, and the ids generate_image_urls_csv repeats).
+
+Each image gets a 64-bit difference hash (dHash: grayscale 9x8 thumbnail, one bit per
+left/right brightness comparison); JPEGs are decoded at reduced scale via PIL's draft mode.
+Images are visited in metadata order and the first of every group of hashes within
+--max_dist bits is its canonical image. The Hamming search uses a multi-index table: the
+hash is split into max_dist+1 blocks, and by pigeonhole any hash within max_dist bits equals
+the query exactly on at least one block. A lookup therefore only verifies the few candidates
+that share a block instead of scanning every canonical hash.
+
+Output: data/dataset/dedup_map.csv with columns id, canonical, distance, phash (canonical == id
+for unique images). preprocess_cv_lite --dedup reuses the canonical image's CV results and
+embeddings for the duplicates; build_graph --dedup gives every copy the canonical's faces, so
+every original id still links to its own poster.
+Usage:
+  python dedup_images.py --meta data/dataset/metadata.csv --out data/dataset/dedup_map.csv --workers 4
+"""
+import os, sys, argparse
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from PIL import Image
+from tqdm import tqdm
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import profiling
+
+HASH_BITS = 64
+
+def dhash(path, size=8):
+    """64-bit difference hash of an image file (None if it cannot be read)."""
+    try:
+        with Image.open(path) as im:
+            im.draft('L', (size * 4, size * 4))  # JPEG: let the decoder downscale, no full-size decode
+            px = np.asarray(im.convert('L').resize((size + 1, size), Image.LANCZOS), dtype=np.int16)
+    except Exception:
+        return None
+    bits = (px[:, 1:] > px[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def _hash_row(args):
+    img_id, path = args
+    return img_id, dhash(path) if path and os.path.exists(path) else None
+
+class HammingIndex:
+    """Multi-index hashing over fixed-width integer hashes for radius queries in Hamming space."""
+    def __init__(self, max_dist=4, bits=HASH_BITS):
+        self.max_dist = max_dist
+        n_blocks = max_dist + 1
+        widths = [bits // n_blocks + (1 if i < bits % n_blocks else 0) for i in range(n_blocks)]
+        self.blocks = []  # (shift, mask) per block
+        shift = bits
+        for w in widths:
+            shift -= w
+            self.blocks.append((shift, (1 << w) - 1))
+        self.tables = [{} for _ in self.blocks]
+        self.hashes = []
+        self.keys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, h):
+        i = len(self.keys)
+        self.keys.append(key); self.hashes.append(h)
+        for (shift, mask), table in zip(self.blocks, self.tables):
+            table.setdefault((h >> shift) & mask, []).append(i)
+
+    def query(self, h):
+        """(key, distance) of the closest indexed hash within max_dist (earliest added on ties), else None."""
+        best = None
+        seen = set()
+        for (shift, mask), table in zip(self.blocks, self.tables):
+            for i in table.get((h >> shift) & mask, ()):
+                if i in seen:
+                    continue
+                seen.add(i)
+                d = bin(h ^ self.hashes[i]).count('1')
+                if d <= self.max_dist and (best is None or (d, i) < best):
+                    best = (d, i)
+        return None if best is None else (self.keys[best[1]], best[0])
+
+def find_duplicates(ids, hashes, max_dist=4):
+    """[(id, canonical id, distance)] in input order; ids without a hash are their own canonical."""
+    index = HammingIndex(max_dist)
+    out = []
+    for img_id, h in zip(ids, hashes):
+        hit = index.query(h) if h is not None else None
+        if hit is None:
+            if h is not None:
+                index.add(img_id, h)
+            out.append((img_id, img_id, 0))
+        else:
+            out.append((img_id, hit[0], hit[1]))
+    return out
+
+def load_dedup_map(path):
+    """{duplicate id: canonical id} from a dedup_map.csv (unique images are left out)."""
+    df = pd.read_csv(path, dtype={'id': str, 'canonical': str})
+    df = df[df['id'] != df['canonical']]
+    return dict(zip(df['id'], df['canonical']))
+
+def dedup(meta_csv, out_csv, max_dist=4, workers=1, chunksize=32):
+    meta = pd.read_csv(meta_csv)
+    files = meta['file'] if 'file' in meta.columns else pd.Series([None] * len(meta))
+    jobs = [(str(i), f if isinstance(f, str) else None) for i, f in zip(meta['id'], files)]
+    with profiling.stage("hash", images=len(jobs), workers=workers):
+        if workers > 1:
+            with Pool(workers) as pool:
+                hashed = dict(tqdm(pool.imap(_hash_row, jobs, chunksize=chunksize), total=len(jobs)))
+        else:
+            hashed = dict(_hash_row(j) for j in tqdm(jobs))
+    ids = [j[0] for j in jobs]
+    hashes = [hashed[i] for i in ids]
+    with profiling.stage("match"):
+        pairs = find_duplicates(ids, hashes, max_dist)
+    df = pd.DataFrame(pairs, columns=['id', 'canonical', 'distance'])
+    df['phash'] = [f"{h:016x}" if h is not None else "" for h in hashes]
+    df.drop_duplicates('id').to_csv(out_csv, index=False)
+    n_dup = int((df['id'] != df['canonical']).sum())
+    print(f"Wrote {out_csv}: {n_dup} of {len(df)} images are duplicates of {df['canonical'].nunique()} canonical images "
+          f"({sum(h is None for h in hashes)} unreadable)")
+    return df
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--meta", default="data/dataset/metadata.csv")
+    p.add_argument("--out", default="data/dataset/dedup_map.csv")
+    p.add_argument("--max_dist", type=int, default=4, help="max differing bits (of 64) for a near-duplicate")
+    p.add_argument("--workers", type=int, default=1)
+    profiling.add_trace_arg(p)
+    args = p.parse_args(argv)
+    profiling.init(args.trace, "dedup_images", args.trace_top)
+    dedup(args.meta, args.out, args.max_dist, args.workers)
+
+if __name__ == "__main__":
+    main()
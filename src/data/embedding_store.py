@@ -0,0 +1,311 @@
+# src/data/embedding_store.py
+"""
+Sharded, memory-mapped embedding store (replaces the per-image <id>_face.pkl / <id>_vis.pkl files).
+
+Layout inside the embeddings dir, one set per store name ('face', 'vis'):
+  <name>_index.csv      (columns: id, shard, row)  -- append-only, last entry for an id wins;
+                        shard -1 is a tombstone (the id was removed)
+  <name>_00000.npy ...  dense float32 shards of up to shard_size rows, opened with mmap_mode='r'
+Each flush appends to the last shard until it holds shard_size rows, so frequent checkpoints do
+not leave thousands of tiny shards: rows are written past the end of the file first and the .npy
+header's row count is updated afterwards, so a reader that mapped the shard earlier keeps a valid
+view of the rows it knows about. An index line cut short by an interrupted run is ignored when
+reading and cut off before the next append.
+The 'face' store holds one vector per detected face, keyed "<image id>:<k>" (face_key); stores from
+before multi-face preprocessing hold one vector keyed by the bare image id, which face_keys_by_image
+reads as face 0.
+Usage:
+  python embedding_store.py --migrate data/dataset/embeddings   (one-time import of the old *.pkl files)
+"""
+import os, sys, io, argparse, csv
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import profiling
+
+class EmbeddingStore:
+    def __init__(self, root, name, shard_size=50000):
+        self.root = root
+        self.name = name
+        self.shard_size = shard_size
+        self.index = {}          # id -> (shard, row)
+        self._shards = {}        # shard -> memmap
+        self._pending = []       # (id, vec) not yet flushed
+        self._next_shard = 0
+        path = self.index_path
+        if os.path.exists(path):
+            with open(path, newline='', encoding='utf-8') as f:
+                for r in csv.DictReader(line for line in f if line.endswith('\n')):
+                    try:
+                        s, row = int(r['shard']), int(r['row'])
+                    except (TypeError, ValueError):
+                        continue  # malformed line
+                    if s < 0:
+                        self.index.pop(r['id'], None)
+                        continue
+                    self.index[r['id']] = (s, row)
+                    self._next_shard = max(self._next_shard, s+1)
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, f"{self.name}_index.csv")
+
+    def shard_path(self, shard):
+        return os.path.join(self.root, f"{self.name}_{shard:05d}.npy")
+
+    def __len__(self):
+        return len(self.index) + len(self._pending)
+
+    def __contains__(self, key):
+        return str(key) in self.index
+
+    def ids(self):
+        return list(self.index.keys())
+
+    def add(self, key, vec):
+        self._pending.append((str(key), np.asarray(vec, dtype='float32').ravel()))
+        if len(self._pending) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        """Append pending vectors to the last shard while it has room, then to new shards, and index them."""
+        os.makedirs(self.root, exist_ok=True)
+        if not self._pending:
+            if not os.path.exists(self.index_path):
+                self._open_index()[0].close()  # an empty store still gets its (header-only) index
+            return
+        f, writer = self._open_index()
+        with f:
+            pending = self._pending
+            while pending:
+                shard = self._next_shard - 1
+                rows = self._rows(shard, len(pending[0][1])) if shard >= 0 else None
+                start = None
+                if rows is not None and rows < self.shard_size:
+                    chunk = pending[:self.shard_size - rows]
+                    start = self._append_rows(shard, np.vstack([v for _, v in chunk]))
+                if start is None:
+                    chunk = pending[:self.shard_size]
+                    shard, start = self._next_shard, 0
+                    tmp = self.shard_path(shard) + ".tmp"
+                    with open(tmp, 'wb') as out:
+                        np.save(out, np.vstack([v for _, v in chunk]))
+                    os.replace(tmp, self.shard_path(shard))
+                    self._next_shard += 1
+                for row, (key, _) in enumerate(chunk, start):
+                    writer.writerow([key, shard, row])
+                    self.index[key] = (shard, row)
+                pending = pending[len(chunk):]
+        self._pending = []
+
+    def _rows(self, shard, dim):
+        """Row count of a shard that rows of width dim can be appended to, else None."""
+        try:
+            with open(self.shard_path(shard), 'rb') as f:
+                shape, fortran, dtype, _ = _read_npy_header(f)
+        except (OSError, ValueError):
+            return None
+        if fortran or dtype != np.float32 or len(shape) != 2 or shape[1] != dim:
+            return None
+        return shape[0]
+
+    def _append_rows(self, shard, X):
+        """
+        Append X to an existing shard in place and return the row of its first vector (None if the
+        header cannot hold the new row count). Data goes past the rows in the header first, then the
+        header is rewritten.
+        """
+        with open(self.shard_path(shard), 'r+b') as f:
+            shape, fortran, dtype, version = _read_npy_header(f)
+            offset = f.tell()
+            header = io.BytesIO()
+            write = np.lib.format.write_array_header_1_0 if version == (1, 0) else np.lib.format.write_array_header_2_0
+            write(header, {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': fortran,
+                           'shape': (shape[0] + len(X), shape[1])})
+            if header.tell() != offset:
+                return None
+            f.seek(offset + shape[0] * shape[1] * dtype.itemsize)
+            f.write(np.ascontiguousarray(X, dtype=dtype).tobytes())
+            f.flush()
+            f.seek(0)
+            f.write(header.getvalue())
+        self._shards.pop(shard, None)  # a cached memmap has the old row count
+        return shape[0]
+
+    def _open_index(self):
+        """(file, csv writer) appending to the index, with a header if it is new; a half-written last line is cut off first."""
+        path = self.index_path
+        if os.path.exists(path):
+            _truncate_partial_line(path)
+        new_index = not os.path.exists(path) or os.path.getsize(path) == 0
+        f = open(path, 'a', newline='', encoding='utf-8')
+        writer = csv.writer(f)
+        if new_index:
+            writer.writerow(['id', 'shard', 'row'])
+        return f, writer
+
+    def alias(self, pairs):
+        """
+        Point each key of (key, target) pairs at target's stored vector: an index entry, no copy.
+        Used for duplicate images; targets must already be flushed, missing ones are skipped.
+        Returns the number of aliases written.
+        """
+        rows = [(str(k), self.index[str(t)]) for k, t in pairs if str(t) in self.index]
+        self._append_index(rows)
+        return len(rows)
+
+    def remove(self, keys):
+        """Drop keys (e.g. faces an image no longer has) with tombstone entries; returns how many existed."""
+        rows = [(k, (-1, -1)) for k in dict.fromkeys(map(str, keys)) if k in self.index]
+        self._append_index(rows)
+        return len(rows)
+
+    def _append_index(self, rows):
+        if not rows:
+            return
+        f, writer = self._open_index()
+        with f:
+            for key, loc in rows:
+                writer.writerow([key, *loc])
+                if loc[0] < 0:
+                    self.index.pop(key, None)
+                else:
+                    self.index[key] = loc
+
+    def _shard(self, shard):
+        if shard not in self._shards:
+            self._shards[shard] = np.load(self.shard_path(shard), mmap_mode='r')
+        return self._shards[shard]
+
+    def get(self, key):
+        shard, row = self.index[str(key)]
+        return self._shard(shard)[row]
+
+    def matrix(self, ids=None):
+        """
+        Return (ids, X) for the requested ids (default: all, in index order).
+        When the rows form one contiguous run of a single shard X is a zero-copy memmap view.
+        """
+        ids = self.ids() if ids is None else [str(i) for i in ids]
+        if len(ids) == 0:
+            return ids, None
+        locs = np.array([self.index[i] for i in ids])
+        shards, rows = locs[:,0], locs[:,1]
+        if (shards == shards[0]).all() and (np.diff(rows) == 1).all():
+            return ids, self._shard(int(shards[0]))[rows[0]:rows[-1]+1]
+        X = np.empty((len(ids), self._shard(int(shards[0])).shape[1]), dtype='float32')
+        for s in np.unique(shards):
+            m = shards == s
+            X[m] = self._shard(int(s))[rows[m]]
+        return ids, X
+
+    def iter_shards(self):
+        """Yield (ids, memmap) per shard for streaming bulk reads."""
+        by_shard = {}
+        for key, (s, row) in self.index.items():
+            by_shard.setdefault(s, []).append((row, key))
+        for s in sorted(by_shard):
+            rows = sorted(by_shard[s])
+            mm = self._shard(s)
+            if len(rows) == mm.shape[0] == len({r for r, _ in rows}):
+                yield [k for _, k in rows], mm
+            else:  # some rows were superseded by later shards, or are shared by aliases
+                yield [k for _, k in rows], mm[[r for r, _ in rows]]
+
+def _read_npy_header(f):
+    """(shape, fortran_order, dtype, version) of an open .npy file, leaving f at the start of the data."""
+    version = np.lib.format.read_magic(f)
+    read = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+    return (*read(f), version)
+
+def _truncate_partial_line(path, block=1 << 16):
+    """Cut off a last line without a newline (an interrupted append), so the next row starts on its own line."""
+    with open(path, 'rb+') as f:
+        end = pos = f.seek(0, os.SEEK_END)
+        while pos > 0:
+            n = min(pos, block)
+            f.seek(pos - n)
+            buf = f.read(n)
+            if pos == end and buf.endswith(b'\n'):
+                return
+            i = buf.rfind(b'\n')
+            if i >= 0:
+                f.truncate(pos - n + i + 1)
+                return
+            pos -= n
+        f.truncate(0)
+
+def face_key(img_id, k=0):
+    """Face store key of the k-th face detected in an image."""
+    return f"{img_id}:{k}"
+
+def stale_face_keys(store, img_id, n_faces):
+    """Face keys of img_id beyond its current n_faces (left by an earlier run), plus a legacy bare-id key."""
+    stale = [str(img_id)] if str(img_id) in store else []
+    k = n_faces
+    while face_key(img_id, k) in store:
+        stale.append(face_key(img_id, k)); k += 1
+    return stale
+
+def face_keys_by_image(store):
+    """{image id: [(k, key), ...] in face order} for a face store; legacy bare image-id keys count as face 0."""
+    faces, legacy = {}, {}
+    for key in store.index:
+        img, sep, k = key.rpartition(':')
+        if sep and k.isdigit():
+            faces.setdefault(img, []).append((int(k), key))
+        else:
+            legacy[key] = [(0, key)]
+    for img, keys in legacy.items():
+        faces.setdefault(img, keys)  # superseded once the image is reprocessed with per-face keys
+    return {img: sorted(keys) for img, keys in faces.items()}
+
+def has_pickles(emb_dir, name):
+    if not os.path.isdir(emb_dir):
+        return False
+    suffix = f"_{name}.pkl"
+    with os.scandir(emb_dir) as it:
+        return any(e.name.endswith(suffix) for e in it)
+
+def open_store(emb_dir, name):
+    """The emb_dir store for name; legacy <id>_<name>.pkl files are imported first while it is still empty."""
+    store = EmbeddingStore(emb_dir, name)
+    if len(store) == 0 and has_pickles(emb_dir, name):
+        migrate_from_pickles(emb_dir, names=(name,))
+        store = EmbeddingStore(emb_dir, name)
+    return store
+
+def migrate_from_pickles(emb_dir, names=('face', 'vis'), shard_size=50000):
+    """One-time import of legacy <id>_<name>.pkl files into stores in the same directory."""
+    import joblib
+    from tqdm import tqdm
+    for name in names:
+        store = EmbeddingStore(emb_dir, name, shard_size)
+        suffix = f"_{name}.pkl"
+        with os.scandir(emb_dir) as it:
+            files = sorted(e.name for e in it if e.name.endswith(suffix))
+        added = 0
+        for fname in tqdm(files, desc=name):
+            key = fname[:-len(suffix)]
+            if key in store:
+                continue
+            try:
+                with profiling.item(f"load_{name}_pickle", key):
+                    vec = joblib.load(os.path.join(emb_dir, fname))
+                store.add(key, vec)
+                added += 1
+            except Exception:
+                continue
+        store.flush()
+        print(f"Migrated {added} '{name}' embeddings into {store.index_path}")
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--migrate", required=True, help="embeddings dir holding legacy *.pkl files")
+    p.add_argument("--shard_size", type=int, default=50000)
+    profiling.add_trace_arg(p)
+    args = p.parse_args(argv)
+    profiling.init(args.trace, "embedding_store", args.trace_top)
+    migrate_from_pickles(args.migrate, shard_size=args.shard_size)
+
+if __name__ == "__main__":
+    main()
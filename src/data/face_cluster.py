@@ -1,48 +1,187 @@
 # src/data/face_cluster.py
 """
 Cluster face embeddings to produce person clusters (co-appearance).
-Outputs: data/dataset/face_clusters.csv with columns img_id, cluster
+Outputs: data/dataset/face_clusters.csv with columns img_id, face, cluster, emb
+(one row per detected face, so an image with several people belongs to several clusters;
+emb is a digest of the face embedding the label was computed from)
+
+When face_clusters.csv already exists, only faces that are not in it yet are clustered: they are
+matched against a radius index over the existing members and either join (or bridge) existing
+clusters or start new ones, so person_<cid> ids stay stable across runs. Faces whose embedding
+changed since (the image was re-encoded) are assigned again the same way, and a cluster that
+lost faces (removed images, re-encoded faces) is split into the connected components of its
+remaining members, since the lost faces may have been what held it together. Clusters are the
+connected components of the eps-neighbourhood graph, which is exactly what
+DBSCAN(eps=0.6, min_samples=1) computes; --rebuild reruns that DBSCAN over the whole corpus.
 Usage:
   python face_cluster.py --emb_dir data/dataset/embeddings --meta data/dataset/metadata.csv
+  python face_cluster.py --emb_dir data/dataset/embeddings --meta data/dataset/metadata.csv --rebuild
 """
-import os, argparse, glob, joblib
+import os, sys, argparse, hashlib
 import numpy as np
-from sklearn.cluster import DBSCAN
 import pandas as pd
-from tqdm import tqdm
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.embedding_store import face_keys_by_image, open_store
+from utils import profiling
+
+EPS = 0.6
 
 def load_face_embeddings(emb_dir, meta_csv):
+    """(X, image id per row, face index per row) for every face of the images in meta_csv."""
+    store = open_store(emb_dir, 'face')  # older runs wrote one <id>_face.pkl per image
     meta = pd.read_csv(meta_csv)
-    embs=[]; img_ids=[]
-    for _, r in tqdm(meta.iterrows(), total=len(meta)):
-        fid = str(r['id'])
-        path = os.path.join(emb_dir, f"{fid}_face.pkl")
-        if os.path.exists(path):
-            try:
-                emb = joblib.load(path)
-                embs.append(emb)
-                img_ids.append(fid)
-            except:
-                continue
-    if len(embs)==0:
-        return None, None
-    return np.vstack(embs), img_ids
-
-def cluster(emb_dir, meta_csv, out_csv):
-    X, img_ids = load_face_embeddings(emb_dir, meta_csv)
+    by_img = face_keys_by_image(store)
+    rows = [(fid, k, key) for fid in meta['id'].astype(str) for k, key in by_img.get(fid, ())]
+    if len(rows)==0:
+        return None, None, None
+    img_ids, faces, keys = zip(*rows)
+    return store.matrix(keys)[1], list(img_ids), list(faces)
+
+def _digests(X):
+    return [hashlib.blake2b(np.ascontiguousarray(x).tobytes(), digest_size=8).hexdigest() for x in X]
+
+def _face_ids(img_ids, faces):
+    return [f"{i}:{k}" for i, k in zip(img_ids, faces)]
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def assign_incremental(X_old, labels_old, X_new, eps=EPS):
+    """
+    Single-linkage assignment of new embeddings against existing clusters.
+    Returns (labels for X_new, {old cluster id: id it was merged into}).
+    A new face within eps of members of several clusters merges them into the smallest id;
+    components with no existing cluster get fresh ids in order of their first face, so with
+    no prior state this reproduces DBSCAN(eps, min_samples=1) labels exactly.
+    """
+    from sklearn.neighbors import NearestNeighbors
+    labels_old = np.asarray(labels_old)
+    old_ids = np.unique(labels_old) if len(labels_old) else np.array([], dtype=int)
+    K, m = len(old_ids), len(X_new)
+    slot = {c: k for k, c in enumerate(old_ids)}
+    parent = list(range(K + m))
+    def union(a, b):
+        ra, rb = _find(parent, a), _find(parent, b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)  # keep old-cluster slots (< K) as roots
+    if K and m:
+        index = NearestNeighbors(radius=eps).fit(X_old)
+        for i, nbrs in enumerate(index.radius_neighbors(X_new, return_distance=False)):
+            for c in set(labels_old[nbrs].tolist()):
+                union(K + i, slot[c])
+    if m:
+        batch = NearestNeighbors(radius=eps).fit(X_new)
+        for i, nbrs in enumerate(batch.radius_neighbors(X_new, return_distance=False)):
+            for j in nbrs:
+                union(K + i, K + int(j))
+    remap = {}
+    for k, c in enumerate(old_ids):
+        root = _find(parent, k)
+        if root != k:
+            remap[int(c)] = int(old_ids[root])
+    next_id = int(old_ids.max()) + 1 if K else 0
+    fresh = {}
+    labels = np.empty(m, dtype=int)
+    for i in range(m):
+        root = _find(parent, K + i)
+        if root < K:
+            labels[i] = old_ids[root]
+        else:
+            if root not in fresh:
+                fresh[root] = next_id; next_id += 1
+            labels[i] = fresh[root]
+    return labels, remap
+
+def split_clusters(X, labels, clusters, eps=EPS):
+    """
+    Relabel the members of the given clusters by the connected components of their
+    eps-neighbourhood graph. The largest component keeps the cluster id, the others get fresh
+    ids above labels.max(). Returns the new labels.
+    """
+    from sklearn.neighbors import radius_neighbors_graph
+    from scipy.sparse.csgraph import connected_components
+    labels = np.array(labels)
+    next_id = int(labels.max()) + 1 if len(labels) else 0
+    for c in sorted(clusters):
+        rows = np.nonzero(labels == c)[0]
+        if len(rows) < 2:
+            continue
+        n, comp = connected_components(radius_neighbors_graph(X[rows], eps), directed=False)
+        keep = np.bincount(comp).argmax()
+        for k in range(n):
+            if k != keep:
+                labels[rows[comp == k]] = next_id; next_id += 1
+    return labels
+
+def cluster(emb_dir, meta_csv, out_csv, rebuild=False):
+    with profiling.stage("load_embeddings"):
+        X, img_ids, faces = load_face_embeddings(emb_dir, meta_csv)
     if X is None:
+        # still write the (empty) csv: build_graph and the pipeline expect it
         print("No face embeddings found.")
+        pd.DataFrame(columns=['img_id', 'face', 'cluster', 'emb']).to_csv(out_csv, index=False)
         return
-    model = DBSCAN(eps=0.6, min_samples=1, metric='euclidean').fit(X)
-    labels = model.labels_
-    df = pd.DataFrame({'img_id': img_ids, 'cluster': labels})
-    df.to_csv(out_csv, index=False)
+    if rebuild or not os.path.exists(out_csv):
+        from sklearn.cluster import DBSCAN
+        with profiling.stage("dbscan", faces=len(img_ids)):
+            model = DBSCAN(eps=EPS, min_samples=1, metric='euclidean').fit(X)
+        labels = model.labels_
+        df = pd.DataFrame({'img_id': img_ids, 'face': faces, 'cluster': labels, 'emb': _digests(X)})
+    else:
+        prev = pd.read_csv(out_csv)
+        prev['img_id'] = prev['img_id'].astype(str)
+        if 'face' not in prev.columns:  # written before multi-face preprocessing: one face per image
+            prev['face'] = 0
+        prev['face'] = prev['face'].astype(int)
+        digests = _digests(X)
+        pos = {fid: i for i, fid in enumerate(_face_ids(img_ids, faces))}
+        prev_ids = _face_ids(prev['img_id'], prev['face'])
+        # drop faces that are gone, and faces re-encoded since their label was assigned (they are
+        # assigned again below); rows written before the emb column are taken as unchanged
+        if 'emb' not in prev.columns:
+            prev['emb'] = [digests[pos[fid]] if fid in pos else "" for fid in prev_ids]
+        known = [fid in pos and e == digests[pos[fid]] for fid, e in zip(prev_ids, prev['emb'])]
+        lost = set(prev['cluster'][[not k for k in known]].tolist())
+        prev, prev_ids = prev[known], [fid for fid, k in zip(prev_ids, known) if k]
+        if lost:
+            with profiling.stage("split_clusters", clusters=len(lost)):
+                split = split_clusters(X[[pos[fid] for fid in prev_ids]], prev['cluster'].to_numpy(), lost)
+            n_split = len(set(split.tolist())) - prev['cluster'].nunique()
+            if n_split:
+                print(f"Split {n_split} new clusters off clusters that lost faces")
+            prev = prev.assign(cluster=split)
+        seen = set(prev_ids)
+        new = [i for i, fid in enumerate(pos) if fid not in seen]
+        new_ids, new_faces, new_embs = [img_ids[i] for i in new], [faces[i] for i in new], [digests[i] for i in new]
+        old_rows = [pos[fid] for fid in prev_ids]
+        new_rows = new
+        with profiling.stage("assign_incremental", old=len(old_rows), new=len(new_rows)):
+            labels, remap = assign_incremental(X[old_rows], prev['cluster'].to_numpy(), X[new_rows])
+        if remap:
+            print(f"Merged {len(remap)} existing clusters bridged by new faces")
+            prev['cluster'] = prev['cluster'].replace(remap)
+        print(f"Assigned {len(new_ids)} new or changed faces ({len(prev)} already clustered)")
+        df = pd.concat([prev[['img_id', 'face', 'cluster', 'emb']],
+                        pd.DataFrame({'img_id': new_ids, 'face': new_faces, 'cluster': labels, 'emb': new_embs})],
+                       ignore_index=True)
+        df = df.astype({'face': int, 'cluster': int})
+    with profiling.stage("write_csv"):
+        df.to_csv(out_csv, index=False)
     print("Wrote clusters to", out_csv)
 
-if __name__ == "__main__":
+def main(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("--emb_dir", default="data/dataset/embeddings")
     p.add_argument("--meta", default="data/dataset/metadata.csv")
     p.add_argument("--out", default="data/dataset/face_clusters.csv")
-    args = p.parse_args()
-    cluster(args.emb_dir, args.meta, args.out)
+    p.add_argument("--rebuild", action="store_true", help="recluster everything with DBSCAN (renumbers clusters)")
+    profiling.add_trace_arg(p)
+    args = p.parse_args(argv)
+    profiling.init(args.trace, "face_cluster", args.trace_top)
+    cluster(args.emb_dir, args.meta, args.out, args.rebuild)
+
+if __name__ == "__main__":
+    main()
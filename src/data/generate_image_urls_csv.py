@@ -1,5 +1,6 @@
 import csv
 import random
+import argparse
 
 # ✅ Categories matching your project
 categories = [
@@ -35,26 +36,33 @@ unsplash_ids = [
     "1506744038136-46273834b3fb", "1526948128573-703ee1aeb6fa", "1507537297725-24a1c029d3ca"
 ]
 
-# ✅ Generate a list of image URLs
-urls = []
-id_counter = 1
-
-# Mix Pexels & Unsplash
-for _ in range(50):  # repeat to generate ~500 entries
-    for pid in random.sample(pexels_ids, len(pexels_ids)):
-        urls.append((id_counter, f"{pexels_base}{pid}/pexels-photo-{pid}.jpeg"))
-        id_counter += 1
-    for uid in random.sample(unsplash_ids, len(unsplash_ids)):
-        urls.append((id_counter, f"{unsplash_base}{uid}?auto=format&fit=crop&w=1200&q=80"))
-        id_counter += 1
-    if len(urls) >= 500:
-        break
-
-# ✅ Save as CSV
-out_path = "data/image_urls.csv"
-with open(out_path, "w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    writer.writerow(["id", "url"])
-    writer.writerows(urls)
-
-print(f"✅ Generated {len(urls)} image URLs at {out_path}")
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--out", default="data/image_urls.csv")
+    out_path = p.parse_args(argv).out
+
+    # ✅ Generate a list of image URLs
+    urls = []
+    id_counter = 1
+
+    # Mix Pexels & Unsplash
+    for _ in range(50):  # repeat to generate ~500 entries
+        for pid in random.sample(pexels_ids, len(pexels_ids)):
+            urls.append((id_counter, f"{pexels_base}{pid}/pexels-photo-{pid}.jpeg"))
+            id_counter += 1
+        for uid in random.sample(unsplash_ids, len(unsplash_ids)):
+            urls.append((id_counter, f"{unsplash_base}{uid}?auto=format&fit=crop&w=1200&q=80"))
+            id_counter += 1
+        if len(urls) >= 500:
+            break
+
+    # ✅ Save as CSV
+    with open(out_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "url"])
+        writer.writerows(urls)
+
+    print(f"✅ Generated {len(urls)} image URLs at {out_path}")
+
+if __name__ == "__main__":
+    main()
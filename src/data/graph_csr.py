@@ -0,0 +1,230 @@
+# src/data/graph_csr.py
+"""
+Compact on-disk CSR format for the multimodal graph, written by build_graph next to the gpickle.
+
+Layout of data/dataset/multimodal_graph.csr/ (<g> = meta['generation']):
+  meta.json            node/edge type vocabularies, counts, generation of the files below
+  node_ids.<g>.npy     node names (fixed-width unicode), row order = networkx node order
+  node_type.<g>.npy    int8 code into meta['node_types']
+  indptr.<g>.npy       int64, len = num_nodes+1
+  indices.<g>.npy      int32 neighbour rows (both directions of every undirected edge)
+  weight.<g>.npy       float32 edge weight (NaN where the edge had no 'weight' attribute)
+  edge_type.<g>.npy    int8 code into meta['edge_types'] (-1 = no 'type' attribute)
+  edge_face.<g>.npy    int32 'face' attribute of contains edges (-1 = none; absent in older directories)
+  node_attrs.<g>.json  remaining node attributes (image file/title), only read by to_networkx
+Arrays are opened with mmap_mode='r', so loading costs a few page faults, not a full unpickle.
+Rewriting a directory never touches files a reader may have mapped: the new generation is written
+next to the old one and switched to by atomically replacing meta.json; the previous generation is
+kept for readers that read meta.json just before the switch, older ones are deleted.
+Directories written before generations existed (meta.json without one) use <name>.npy.
+Usage:
+  python graph_csr.py --graph data/dataset/multimodal_graph.gpickle   (convert an existing pickle)
+"""
+import os, sys, json, argparse, pickle
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import profiling
+
+def csr_path_for(graph_path):
+    return os.path.splitext(graph_path)[0] + ".csr"
+
+ARRAYS = ('node_ids', 'node_type', 'indptr', 'indices', 'weight', 'edge_type')
+OPTIONAL_ARRAYS = ('edge_face',)
+
+def is_csr(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, "meta.json"))
+
+def read_meta(path):
+    with open(os.path.join(path, "meta.json"), encoding='utf-8') as f:
+        return json.load(f)
+
+def generation_file(path, name, generation, ext=".npy"):
+    """File of one array (or node_attrs) of a generation; generation 0 is the unversioned layout."""
+    return os.path.join(path, f"{name}.{generation}{ext}" if generation else f"{name}{ext}")
+
+class CSRGraph:
+    def __init__(self, path, mmap=True):
+        self.path = path
+        mode = 'r' if mmap else None
+        self.meta = read_meta(path)
+        self.generation = self.meta.get('generation', 0)
+        load = lambda name: np.load(generation_file(path, name, self.generation), mmap_mode=mode)
+        self.node_ids = load("node_ids")
+        self.node_type = load("node_type")
+        self.indptr = load("indptr")
+        self.indices = load("indices")
+        self.weight = load("weight")
+        self.edge_type = load("edge_type")
+        face_file = generation_file(path, "edge_face", self.generation)
+        self.edge_face = np.load(face_file, mmap_mode=mode) if os.path.exists(face_file) else None
+        self.node_types = self.meta['node_types']
+        self.edge_types = self.meta['edge_types']
+        self._index = None
+
+    @property
+    def num_nodes(self):
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self):
+        return self.meta['num_edges']
+
+    @property
+    def index(self):
+        """node name -> row (built on first use)."""
+        if self._index is None:
+            self._index = {str(n): i for i, n in enumerate(self.node_ids)}
+        return self._index
+
+    def degree(self):
+        return np.diff(self.indptr)
+
+    def rows_of_type(self, t):
+        if t not in self.node_types:
+            return np.zeros(0, dtype=np.int64)
+        return np.nonzero(self.node_type == self.node_types.index(t))[0]
+
+    def neighbors(self, node):
+        i = self.index[node]
+        return [str(self.node_ids[j]) for j in self.indices[self.indptr[i]:self.indptr[i+1]]]
+
+    def adjacency(self, weighted=False, edge_types=None):
+        """scipy CSR adjacency (binary unless weighted; missing weights count as 1), optionally restricted to edge types."""
+        from scipy import sparse
+        n = self.num_nodes
+        if weighted:
+            data = np.nan_to_num(np.asarray(self.weight), nan=1.0).astype(np.float32)
+        else:
+            data = np.ones(len(self.indices), dtype=np.float32)
+        if edge_types is not None:
+            codes = [self.edge_types.index(t) for t in edge_types if t in self.edge_types]
+            data = data * np.isin(self.edge_type, codes)
+            A = sparse.csr_matrix((data, self.indices, self.indptr), shape=(n, n))
+            A.eliminate_zeros()
+            return A
+        return sparse.csr_matrix((data, self.indices, self.indptr), shape=(n, n))
+
+def generation_files(path):
+    """(stable name, file) of the current generation's arrays and node attributes, e.g. to fingerprint the graph."""
+    generation = read_meta(path).get('generation', 0)
+    optional = [name for name in OPTIONAL_ARRAYS if os.path.exists(generation_file(path, name, generation))]
+    return ([(f"{name}.npy", generation_file(path, name, generation)) for name in ARRAYS + tuple(optional)]
+            + [("node_attrs.json", generation_file(path, "node_attrs", generation, ".json"))])
+
+def _write_atomic(path, write):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+def _remove_generations_before(path, generation):
+    """Delete the files of generations older than generation (unlinking keeps existing memmaps valid)."""
+    names = ARRAYS + OPTIONAL_ARRAYS + ('node_attrs',)
+    for fname in os.listdir(path):
+        stem, ext = os.path.splitext(fname)
+        if ext not in ('.npy', '.json'):
+            continue
+        name, _, g = stem.rpartition('.')
+        if name in names and g.isdigit():
+            old = int(g)
+        elif stem in names:
+            old = 0
+        else:
+            continue
+        if old < generation:
+            try:
+                os.remove(os.path.join(path, fname))
+            except OSError:
+                pass
+
+def save_csr(G, path):
+    """networkx -> CSR directory, as a new generation that readers of the old one never see half-written."""
+    os.makedirs(path, exist_ok=True)
+    generation = (read_meta(path).get('generation', 0) if is_csr(path) else 0) + 1
+    nodes = list(G.nodes())
+    idx = {n: i for i, n in enumerate(nodes)}
+    node_types = sorted({d.get('type') for _, d in G.nodes(data=True) if d.get('type') is not None})
+    edge_types = sorted({d.get('type') for _, _, d in G.edges(data=True) if d.get('type') is not None})
+    nt = np.array([node_types.index(d['type']) if d.get('type') is not None else -1 for _, d in G.nodes(data=True)], dtype=np.int8)
+    rows, cols, w, et, fc = [], [], [], [], []
+    for a, b, d in G.edges(data=True):
+        code = edge_types.index(d['type']) if d.get('type') is not None else -1
+        wt = float(d['weight']) if 'weight' in d else np.nan
+        face = int(d['face']) if d.get('face') is not None else -1
+        rows.append(idx[a]); cols.append(idx[b]); w.append(wt); et.append(code); fc.append(face)
+        if a != b:
+            rows.append(idx[b]); cols.append(idx[a]); w.append(wt); et.append(code); fc.append(face)
+    rows = np.array(rows, dtype=np.int64); cols = np.array(cols, dtype=np.int64)
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(len(nodes)+1, dtype=np.int64)
+    np.add.at(indptr, rows+1, 1)
+    indptr = np.cumsum(indptr)
+    arrays = {'node_ids': np.array([str(n) for n in nodes]), 'node_type': nt, 'indptr': indptr,
+              'indices': cols[order].astype(np.int32), 'weight': np.array(w, dtype=np.float32)[order],
+              'edge_type': np.array(et, dtype=np.int8)[order], 'edge_face': np.array(fc, dtype=np.int32)[order]}
+    for name, arr in arrays.items():
+        _write_atomic(generation_file(path, name, generation), lambda f: np.save(f, arr))
+    attrs = {}
+    for i, (_, d) in enumerate(G.nodes(data=True)):
+        extra = {k: v for k, v in d.items() if k != 'type'}
+        if extra:
+            attrs[i] = extra
+    _write_atomic(generation_file(path, "node_attrs", generation, ".json"), lambda f: f.write(json.dumps(attrs).encode('utf-8')))
+    meta = {'node_types': node_types, 'edge_types': edge_types, 'num_nodes': len(nodes),
+            'num_edges': G.number_of_edges(), 'generation': generation}
+    _write_atomic(os.path.join(path, "meta.json"), lambda f: f.write(json.dumps(meta).encode('utf-8')))
+    _remove_generations_before(path, generation - 1)
+
+def to_networkx(csr):
+    """CSRGraph (or CSR directory path) -> networkx.Graph with the original node/edge attributes."""
+    import networkx as nx
+    if isinstance(csr, str):
+        csr = CSRGraph(csr)
+    with open(generation_file(csr.path, "node_attrs", csr.generation, ".json"), encoding='utf-8') as f:
+        attrs = json.load(f)
+    names = [str(n) for n in csr.node_ids]
+    G = nx.Graph()
+    nt = np.asarray(csr.node_type)
+    for i, n in enumerate(names):
+        d = {'type': csr.node_types[nt[i]]} if nt[i] >= 0 else {}
+        d.update(attrs.get(str(i), {}))
+        G.add_node(n, **d)
+    indptr, indices = np.asarray(csr.indptr), np.asarray(csr.indices)
+    weight, etype = np.asarray(csr.weight), np.asarray(csr.edge_type)
+    face = np.asarray(csr.edge_face) if csr.edge_face is not None else np.full(len(indices), -1, dtype=np.int32)
+    src = np.repeat(np.arange(csr.num_nodes), np.diff(indptr))
+    keep = src <= indices  # each undirected edge once
+    edges = []
+    for a, b, w, t, k in zip(src[keep], indices[keep], weight[keep], etype[keep], face[keep]):
+        d = {}
+        if not np.isnan(w):
+            d['weight'] = int(w) if float(w).is_integer() else float(w)
+        if t >= 0:
+            d['type'] = csr.edge_types[t]
+        if k >= 0:
+            d['face'] = int(k)
+        edges.append((names[a], names[b], d))
+    G.add_edges_from(edges)
+    return G
+
+def load_graph(path):
+    """Load a networkx graph from either a gpickle or a CSR directory."""
+    with profiling.stage("load_graph", path=path):
+        if is_csr(path):
+            return to_networkx(path)
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--graph", default="data/dataset/multimodal_graph.gpickle")
+    p.add_argument("--out", default=None, help="CSR directory (default: <graph>.csr)")
+    profiling.add_trace_arg(p)
+    args = p.parse_args(argv)
+    profiling.init(args.trace, "graph_csr", args.trace_top)
+    out = args.out or csr_path_for(args.graph)
+    save_csr(load_graph(args.graph), out)
+    print("Wrote", out)
+
+if __name__ == "__main__":
+    main()
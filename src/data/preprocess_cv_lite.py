@@ -4,79 +4,375 @@ Process images and save lightweight CV metadata and small embeddings.
 
 Outputs:
   data/dataset/cv_metadata_lite.csv
-  data/dataset/embeddings/*.pkl  (face embedding and tiny visual embedding per image)
+  data/dataset/face_boxes.csv  (img_id, face, top, right, bottom, left in full-resolution pixels)
+  data/dataset/embeddings/{face,vis}_*.npy + *_index.csv  (sharded store, see embedding_store.py;
+      one face vector per detected face, keyed "<id>:<k>")
+  data/dataset/cv_manifest.sqlite  (content hash + finished stages per image; reruns only do new work)
 Usage:
   python preprocess_cv_lite.py --meta data/dataset/metadata.csv --out data/dataset
+  python preprocess_cv_lite.py --meta data/dataset/metadata.csv --out data/dataset --workers 4
+  python preprocess_cv_lite.py --meta data/dataset/metadata.csv --out data/dataset --dedup data/dataset/dedup_map.csv
+  python preprocess_cv_lite.py --meta data/dataset/metadata.csv --out data/dataset --cascade face,ocr
+  python preprocess_cv_lite.py --meta data/dataset/metadata.csv --out data/dataset --face_max_side 1280 --face_upsample 2
+Faces are detected on a copy downscaled to --face_max_side pixels (detection cost grows with
+megapixels), the boxes are mapped back to full resolution and all faces of an image are encoded in
+one call; every face is kept, so one image can link several person clusters.
+--cascade runs the expensive models only when a cheap signal says they can find something:
+face encoding needs a YOLO 'person' box, Tesseract needs text lines from an OpenCV prefilter.
+Skipped calls are counted and printed; the gate config is part of the manifest version.
 """
-import os, argparse, pandas as pd
+import os, sys, time, argparse, pandas as pd
+from multiprocessing import Pool
 from tqdm import tqdm
 from PIL import Image
 import numpy as np
-import joblib
-import face_recognition
-from ultralytics import YOLO
-import pytesseract
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.embedding_store import face_key, open_store, stale_face_keys
+from data.cv_manifest import CVManifest, PIPELINE_VERSION, file_hash, file_stat
+from data.dedup_images import load_dedup_map
+from utils import profiling
+
+CV_COLUMNS = ['id', 'file', 'num_faces', 'yolo_labels', 'ocr']
+BOX_COLUMNS = ['img_id', 'face', 'top', 'right', 'bottom', 'left']  # face_boxes.csv, from each row's 'face_boxes'
+FACE_MAX_SIDE = 800  # longest side of the face detection copy (0 = detect at full resolution)
+CASCADE_GATES = ('face', 'ocr')
+PERSON_CLASS = '0'  # COCO class id of 'person' in yolo_labels
+STAGE_NAMES = {'face': 'face encoding', 'ocr': 'OCR'}
+
+# per-process model cache; filled once by init_models() in the parent or in each pool worker
+_models = {}
+
+def init_models(cascade=None):
+    # the CV libraries are imported here and in process_image, not at module level, so --help,
+    # the unified CLI and no-op reruns do not pay for loading torch/dlib
+    from ultralytics import YOLO
+    if 'yolo' not in _models:
+        _models['yolo'] = YOLO('yolov8n.pt')  # nano model, CPU-friendly
+    _models['cascade'] = cascade or {}
+
+def cascade_config(gates=(), text_min_regions=1, face_max_side=FACE_MAX_SIDE, face_upsample=1):
+    """
+    Cascade and face detection settings shared with the workers. Gated stages store an empty
+    result and the detection size changes which faces are found, so non-default settings are
+    part of the manifest version: changing them reprocesses the images.
+    """
+    gates = tuple(sorted(g for g in gates if g in CASCADE_GATES))
+    version = PIPELINE_VERSION
+    if gates:
+        version += f"+cascade({','.join(gates)};text_regions>={text_min_regions})"
+    if (face_max_side, face_upsample) != (FACE_MAX_SIDE, 1):
+        version += f"+faces(max_side={face_max_side};upsample={face_upsample})"
+    return {'gates': gates, 'text_min_regions': text_min_regions, 'face_max_side': face_max_side,
+            'face_upsample': face_upsample, 'version': version}
+
+def has_text_regions(img_path, min_regions=1, max_side=800, min_contrast=40):
+    """
+    Cheap OCR prefilter: morphological gradient, threshold (Otsu, at least min_contrast), join
+    characters with a horizontal closing, then count wide, well-filled boxes shaped like text
+    lines. Unreadable images return True so OCR still gets its chance.
+    """
+    import cv2
+    gray = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return True
+    scale = max_side / max(gray.shape)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    t, bw = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    if t < min_contrast:
+        _, bw = cv2.threshold(grad, min_contrast, 255, cv2.THRESH_BINARY)
+    joined = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+    contours = cv2.findContours(joined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+    n = 0
+    for c in contours:
+        x, y, w, h = cv2.boundingRect(c)
+        if h < 8 or h > 0.2 * gray.shape[0] or w < 2 * h:
+            continue
+        if cv2.countNonZero(bw[y:y+h, x:x+w]) / (w * h) > 0.3:
+            n += 1
+            if n >= min_regions:
+                return True
+    return False
+
+def detect_faces(img, max_side=FACE_MAX_SIDE, upsample=1):
+    """
+    HOG face boxes (top, right, bottom, left) in full-resolution pixels, detected on a copy of the
+    RGB array img whose longest side is at most max_side.
+    """
+    import face_recognition
+    h, w = img.shape[:2]
+    scale = min(1.0, max_side / max(h, w)) if max_side else 1.0
+    small = img if scale == 1 else np.asarray(
+        Image.fromarray(img).resize((max(1, round(w*scale)), max(1, round(h*scale))), Image.BILINEAR))
+    return [(max(0, round(t/scale)), min(w, round(r/scale)), min(h, round(b/scale)), max(0, round(l/scale)))
+            for t, r, b, l in face_recognition.face_locations(small, number_of_times_to_upsample=upsample)]
 
 def tiny_visual_embedding(img_path):
     im = Image.open(img_path).convert('L').resize((64,64))
     arr = np.asarray(im).astype('float32') / 255.0
     return arr.flatten()[:4096]
 
-def process(meta_csv, out_dir):
-    os.makedirs(out_dir, exist_ok=True)
-    emb_dir = os.path.join(out_dir, "embeddings")
-    os.makedirs(emb_dir, exist_ok=True)
-    meta = pd.read_csv(meta_csv)
-    yolo = YOLO('yolov8n.pt')  # nano model, CPU-friendly
-    rows=[]
-    for _, r in tqdm(meta.iterrows(), total=len(meta)):
-        imgfile = r.get('file') or r.get('filepath') or None
-        if not imgfile or not os.path.exists(imgfile):
-            # if file doesn't exist, skip
-            rows.append({'id': r['id'], 'file': None, 'num_faces':0, 'yolo_labels':"", 'ocr':""})
-            continue
-        # face embedding
-        try:
-            img = face_recognition.load_image_file(imgfile)
-            encs = face_recognition.face_encodings(img)
-            if len(encs)>0:
-                face_emb = encs[0]
-                joblib.dump(face_emb, os.path.join(emb_dir, f"{r['id']}_face.pkl"))
-                num_faces = len(encs)
-            else:
-                num_faces = 0
-        except Exception as e:
-            num_faces = 0
-        # yolo labels
+def process_image(r, prev=None):
+    """
+    Run the CV stages on one metadata row (dict).
+    prev is the image's manifest entry (or None); stages it already finished for the same
+    content hash and PIPELINE_VERSION are reused from its row instead of being rerun.
+    Returns (cv_metadata_lite row, face embeddings (one per row['face_boxes'] entry), visual
+    embedding or None, manifest info); embeddings are written by the parent so only one process
+    appends to the store.
+    info['seconds'] holds the time spent per stage that actually ran (for --trace); info['gated']
+    lists the stages the cascade skipped (recorded as done, with an empty result).
+    """
+    import face_recognition, pytesseract
+    vis = None
+    face_embs, boxes = [], []
+    imgfile = r.get('file') or r.get('filepath') or None
+    if not imgfile or not os.path.exists(imgfile):
+        # if file doesn't exist, skip
+        return {'id': r['id'], 'file': None, 'num_faces':0, 'yolo_labels':"", 'ocr':"", 'face_boxes': []}, [], None, None
+    size, mtime_ns = file_stat(imgfile)
+    if prev and (prev['size'], prev['mtime_ns']) == (size, mtime_ns):
+        h = prev['hash']
+    else:
+        h = file_hash(imgfile)
+    version = _models.get('cascade', {}).get('version', PIPELINE_VERSION)
+    reuse = prev if prev and prev['hash'] == h and prev['version'] == version else None
+    done = set(reuse['stages']) if reuse else set()
+    old = reuse['row'] if reuse else {}
+    stages = []
+    seconds = {}
+    gated = []
+    cascade = _models.get('cascade', {})
+    t = time.perf_counter()
+    # yolo labels (first: in cascade mode its person detections gate face encoding)
+    if 'yolo' in done:
+        ylabels = old['yolo_labels']; stages.append('yolo')
+    else:
         try:
-            res = yolo.predict(source=imgfile, imgsz=640, device='cpu', conf=0.35, verbose=False)
+            res = _models['yolo'].predict(source=imgfile, imgsz=640, device='cpu', conf=0.35, verbose=False)
             labels=set()
             for r0 in res:
                 for box in r0.boxes.data.tolist():
                     labels.add(int(box[5]))
             ylabels = ",".join(map(str, labels))
+            stages.append('yolo')
         except Exception as e:
             ylabels = ""
-        # tiny visual embedding
+        seconds['yolo'] = time.perf_counter() - t; t = time.perf_counter()
+    # face embeddings: detect on a downscaled copy, encode every face at full resolution
+    if 'face' in done:
+        num_faces = old['num_faces']; boxes = old.get('face_boxes', []); stages.append('face')
+    elif 'face' in cascade.get('gates', ()) and 'yolo' in stages and PERSON_CLASS not in ylabels.split(','):
+        num_faces = 0; stages.append('face'); gated.append('face')
+    else:
+        try:
+            img = face_recognition.load_image_file(imgfile)
+            boxes = detect_faces(img, cascade.get('face_max_side', FACE_MAX_SIDE), cascade.get('face_upsample', 1))
+            seconds['face_detect'] = time.perf_counter() - t; t = time.perf_counter()
+            face_embs = face_recognition.face_encodings(img, known_face_locations=boxes) if boxes else []
+            seconds['face_encode'] = time.perf_counter() - t
+            num_faces = len(face_embs)
+            stages.append('face')
+        except Exception as e:
+            num_faces = 0; face_embs, boxes = [], []
+        t = time.perf_counter()
+    # tiny visual embedding
+    if 'vis' in done:
+        stages.append('vis')
+    else:
         try:
             vis = tiny_visual_embedding(imgfile)
-            joblib.dump(vis, os.path.join(emb_dir, f"{r['id']}_vis.pkl"))
+            stages.append('vis')
         except:
-            pass
-        # OCR
+            vis = None
+        seconds['vis'] = time.perf_counter() - t; t = time.perf_counter()
+    # OCR
+    if 'ocr' in done:
+        txt = old['ocr']; stages.append('ocr')
+    elif 'ocr' in cascade.get('gates', ()) and not has_text_regions(imgfile, cascade.get('text_min_regions', 1)):
+        txt = ""; stages.append('ocr'); gated.append('ocr')
+        seconds['text_prefilter'] = time.perf_counter() - t
+    else:
         try:
             txt = pytesseract.image_to_string(Image.open(imgfile))
             txt = txt[:300]
+            stages.append('ocr')
         except:
             txt = ""
-        rows.append({'id': r['id'], 'file': imgfile, 'num_faces': num_faces, 'yolo_labels': ylabels, 'ocr': txt})
+        seconds['ocr'] = time.perf_counter() - t
+    info = {'hash': h, 'size': size, 'mtime_ns': mtime_ns, 'stages': stages, 'seconds': seconds, 'gated': gated}
+    row = {'id': r['id'], 'file': imgfile, 'num_faces': num_faces, 'yolo_labels': ylabels, 'ocr': txt,
+           'face_boxes': [list(b) for b in boxes]}
+    return row, face_embs, vis, info
+
+def _process_star(args):
+    return process_image(*args)
+
+def box_rows(rows):
+    """face_boxes.csv rows (BOX_COLUMNS) of cv rows; rows from before multi-face preprocessing have none."""
+    return [(r['id'], k, *box) for r in rows for k, box in enumerate(r.get('face_boxes') or [])]
+
+def write_cv_csv(manifest, ids, out_csv, chunk=10000, columns=CV_COLUMNS, id_col='id', to_rows=None):
+    """
+    Write rows for ids from the manifest in chunks, then keep rows of an existing
+    cv_metadata_lite.csv whose ids are not part of this metadata file (merge, not overwrite).
+    to_rows turns a chunk of manifest rows into output rows (face_boxes.csv: box_rows).
+    """
+    keep = None
+    if os.path.exists(out_csv):
+        old = pd.read_csv(out_csv)
+        keep = old[~old[id_col].astype(str).isin(set(map(str, ids)))]
+    tmp = out_csv + ".tmp"
+    first = True
+    for start in range(0, len(ids), chunk):
+        rows = list(manifest.rows(ids[start:start+chunk]))
+        df = pd.DataFrame(to_rows(rows) if to_rows else rows, columns=columns)
+        df.to_csv(tmp, index=False, mode='w' if first else 'a', header=first)
+        first = False
+    if first:
+        pd.DataFrame(columns=columns).to_csv(tmp, index=False)
+    if keep is not None and len(keep):
+        keep.reindex(columns=columns).to_csv(tmp, index=False, mode='a', header=False)
+    os.replace(tmp, out_csv)
+
+def reuse_canonical(manifest, records, canonical_of, stores):
+    """
+    Record duplicate images (see dedup_images.py) with their canonical image's cv row and
+    finished stages, and alias its embeddings (every face in the face store) in each store
+    instead of running the CV stages. Faces beyond the canonical image's count are removed.
+    """
+    aliases = {id(s): [] for s in stores}
+    stale = {id(s): [] for s in stores}
+    for r in records:
+        img_id, path = str(r['id']), r.get('file') or r.get('filepath')
+        canon = canonical_of[img_id]
+        entry = manifest.get(canon)
+        info = None
+        if entry and path and os.path.exists(path):
+            size, mtime_ns = file_stat(path)
+            prev = manifest.get(img_id)
+            h = prev['hash'] if prev and (prev['size'], prev['mtime_ns']) == (size, mtime_ns) else file_hash(path)
+            info = {'hash': h, 'size': size, 'mtime_ns': mtime_ns, 'stages': entry['stages']}
+        row = dict(entry['row'] if entry else {}, id=r['id'], file=path)
+        manifest.record(img_id, info, row)
+        n_faces = len(row.get('face_boxes') or [])
+        for s in stores:
+            pairs = [(face_key(img_id, k), face_key(canon, k)) for k in range(n_faces)] if s.name == 'face' else [(img_id, canon)]
+            if s.name == 'face':
+                stale[id(s)] += stale_face_keys(s, img_id, n_faces)
+            for key, target in pairs:
+                if s.index.get(target) is not None and s.index.get(key) != s.index[target]:
+                    aliases[id(s)].append((key, target))
+    for s in stores:
+        s.alias(aliases[id(s)])
+        s.remove(stale[id(s)])
+    manifest.commit()
+
+def process(meta_csv, out_dir, workers=1, chunksize=8, checkpoint_every=500, dedup_csv=None, cascade=None):
+    cascade = cascade or cascade_config()
+    os.makedirs(out_dir, exist_ok=True)
+    emb_dir = os.path.join(out_dir, "embeddings")
+    os.makedirs(emb_dir, exist_ok=True)
+    with profiling.stage("load_manifest"):
+        meta = pd.read_csv(meta_csv)
+        records = meta.to_dict('records')
+        face_store = open_store(emb_dir, 'face')  # imports legacy *.pkl embeddings on first use
+        vis_store = open_store(emb_dir, 'vis')
+        manifest = CVManifest(os.path.join(out_dir, "cv_manifest.sqlite"), version=cascade['version'])
+        canonical_of = {}
+        if dedup_csv:
+            ids = {str(r['id']) for r in records}
+            canonical_of = {d: c for d, c in load_dedup_map(dedup_csv).items() if c in ids}
+        jobs, dups = [], []
+        for r in records:
+            if str(r['id']) in canonical_of:
+                dups.append(r)
+                continue
+            prev = manifest.get(r['id'])
+            if not manifest.is_complete(r['id'], r.get('file') or r.get('filepath'), prev):
+                jobs.append((r, prev))
+    print(f"{len(records)-len(jobs)-len(dups)} images up to date, processing {len(jobs)}"
+          + (f", {len(dups)} duplicates reuse their canonical image" if dups else ""))
+    pool = None
+    if workers <= 1 or len(jobs) == 0:
+        if jobs:
+            with profiling.stage("load_models"):
+                init_models(cascade)
+        results = map(_process_star, jobs)
+    else:
+        # each worker loads its models once; imap keeps results in input order
+        pool = Pool(processes=workers, initializer=init_models, initargs=(cascade,))
+        results = pool.imap(_process_star, jobs, chunksize=chunksize)
+    try:
+        with profiling.stage("process_images", images=len(jobs), workers=workers):
+            skipped = {g: 0 for g in cascade['gates']}
+            n_faces = 0
+            for n, (row, face_embs, vis, info) in enumerate(tqdm(results, total=len(jobs)), 1):
+                if info:
+                    for g in info['gated']:
+                        skipped[g] += 1
+                    if profiling.enabled():
+                        for st, secs in info['seconds'].items():
+                            profiling.add_item(st, row['id'], secs)
+                for k, emb in enumerate(face_embs):
+                    face_store.add(face_key(row['id'], k), emb)
+                # an image that now has fewer faces must not keep the extra ones from an earlier run
+                face_store.remove(stale_face_keys(face_store, row['id'], len(row['face_boxes'])))
+                n_faces += len(face_embs)
+                if vis is not None:
+                    vis_store.add(row['id'], vis)
+                manifest.record(row['id'], info, row)
+                if n % checkpoint_every == 0:
+                    # embeddings first so the manifest never claims a stage whose output was lost
+                    face_store.flush(); vis_store.flush(); manifest.commit()
+            if pool is not None:
+                pool.close(); pool.join()
+            face_store.flush(); vis_store.flush(); manifest.commit()
+    finally:
+        if pool is not None:
+            pool.terminate()  # no-op after close/join; stops the workers if processing raised
+    if jobs:
+        print(f"Encoded {n_faces} faces in {len(jobs)} images")
+    if skipped and jobs:
+        print("Cascade skipped " + ", ".join(f"{STAGE_NAMES[g]} on {c}/{len(jobs)}" for g, c in skipped.items()))
+    if dups:
+        with profiling.stage("reuse_duplicates", images=len(dups)):
+            reuse_canonical(manifest, dups, canonical_of, (face_store, vis_store))
     out_csv = os.path.join(out_dir, "cv_metadata_lite.csv")
-    pd.DataFrame(rows).to_csv(out_csv, index=False)
-    print("Wrote", out_csv)
+    boxes_csv = os.path.join(out_dir, "face_boxes.csv")
+    with profiling.stage("write_csv"):
+        ids = [r['id'] for r in records]
+        write_cv_csv(manifest, ids, out_csv)
+        write_cv_csv(manifest, ids, boxes_csv, columns=BOX_COLUMNS, id_col='img_id', to_rows=box_rows)
+    manifest.close()
+    print("Wrote", out_csv, "and", boxes_csv)
 
-if __name__ == "__main__":
+def main(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("--meta", default="data/dataset/metadata.csv")
     p.add_argument("--out", default="data/dataset")
-    args = p.parse_args()
-    process(args.meta, args.out)
+    p.add_argument("--workers", type=int, default=1, help="worker processes (1 = serial)")
+    p.add_argument("--chunksize", type=int, default=8, help="images handed to a worker per batch")
+    p.add_argument("--checkpoint_every", type=int, default=500, help="commit manifest + embeddings every N images")
+    p.add_argument("--dedup", default=None, help="dedup_map.csv from dedup_images.py; duplicates reuse the canonical image's results")
+    p.add_argument("--cascade", default="", help="comma separated gates: 'face' (only encode faces when YOLO sees a person), "
+                                                 "'ocr' (only run Tesseract when the text prefilter finds text lines)")
+    p.add_argument("--text_min_regions", type=int, default=1, help="text-line boxes the OCR prefilter needs to see")
+    p.add_argument("--face_max_side", type=int, default=FACE_MAX_SIDE,
+                   help="detect faces on a copy at most this many pixels on its longest side (0 = full resolution)")
+    p.add_argument("--face_upsample", type=int, default=1, help="HOG detector upsampling passes (finds smaller faces, slower)")
+    profiling.add_trace_arg(p)
+    args = p.parse_args(argv)
+    profiling.init(args.trace, "preprocess_cv_lite", args.trace_top)
+    gates = [g for g in args.cascade.split(',') if g]
+    unknown = set(gates) - set(CASCADE_GATES)
+    if unknown:
+        p.error(f"unknown cascade gates {sorted(unknown)}, choose from {','.join(CASCADE_GATES)}")
+    if args.face_max_side < 0 or args.face_upsample < 0:
+        p.error("--face_max_side and --face_upsample must be >= 0")
+    process(args.meta, args.out, args.workers, args.chunksize, args.checkpoint_every, args.dedup,
+            cascade_config(gates, args.text_min_regions, args.face_max_side, args.face_upsample))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+# src/models/bulk_score.py
+"""
+Bulk scoring of all user pairs (or a filtered subset) with a saved link model, top-k per user.
+
+The U x U score matrix is never materialised. Query users are split into blocks of --tile rows,
+each block is scored against the target users one --tile x --tile tile at a time, and only a
+running top-k per row is kept (merged with argpartition), so memory per worker is O(tile^2 + tile*k)
+whatever U is. Blocks run in a process pool (each worker loads the model once) and are appended to
+the CSV in order as they finish. The user itself and users already linked to it are skipped unless
+--include_linked.
+Models (picked by file extension):
+  .joblib  LogisticRegression from link_prediction_baseline.py --save_model; the features of a tile
+           come from one sparse product (common neighbours = A_I A_J^T), same values as pair_features
+  .pt      LinkMLP head from train_gnn_lite.py --save_model over the saved user embeddings
+--variant int8 (dynamic int8 quantisation of the head's Linear layers) or torchscript (traced and
+frozen) runs the GNN head through that CPU path instead of fp32. --compare N rescored N sampled users
+with fp32 and the variant: max/mean |score delta|, top-k overlap and pairs/sec of both.
+Outputs:
+  --out       CSV with columns user, rank, candidate, score
+  --report    JSON with pairs scored, pairs/sec, peak RSS and the variant comparison
+Usage:
+  python bulk_score.py --graph data/dataset/multimodal_graph.csr --model data/dataset/link_model.joblib --out data/dataset/bulk_top10.csv
+  python bulk_score.py --graph data/dataset/multimodal_graph.gpickle --model data/dataset/gnn_model.pt --workers 4 --tile 1024 --k 20 --out data/dataset/bulk_gnn.csv
+  python bulk_score.py --graph data/dataset/multimodal_graph.gpickle --model data/dataset/gnn_model.pt --variant int8 --compare 200 --report data/bench/bulk_int8.json
+  python bulk_score.py --graph data/dataset/multimodal_graph.csr --model data/dataset/link_model.joblib --users data/dataset/active_users.txt --targets data/dataset/new_users.txt
+  (--users / --targets: one user node per line, restricting the query rows / the scored columns)
+"""
+import os, sys, csv, json, time, argparse
+import numpy as np
+from multiprocessing import Pool
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.candidates import load_graph_arrays
+from utils import profiling
+
+VARIANTS = ('fp32', 'int8', 'torchscript')
+
+def is_gnn(model_path):
+    return model_path.endswith(('.pt', '.pth'))
+
+class LRScorer:
+    """Baseline LogisticRegression on a tile, features from sparse products instead of per-pair rows."""
+    def __init__(self, clf, A, user_rows):
+        self.w = clf.coef_.ravel().astype(np.float64)
+        self.b = float(clf.intercept_[0])
+        self.A = A[user_rows].tocsr()  # user x all nodes
+        self.deg = np.asarray(A.sum(axis=1)).ravel()[user_rows].astype(np.float64)
+
+    def __call__(self, I, J):
+        cn = (self.A[I] @ self.A[J].T).toarray().astype(np.float64)
+        di, dj = self.deg[I][:, None], self.deg[J][None, :]
+        union = di + dj - cn
+        jac = np.divide(cn, union, out=np.zeros_like(cn), where=union > 0)
+        z = self.w[0]*cn + self.w[1]*(di*dj) + self.w[2]*jac + self.b
+        return 1.0 / (1.0 + np.exp(-z))  # predict_proba[:, 1]
+
+class GNNScorer:
+    """LinkMLP head on every (I, J) pair of saved user embeddings."""
+    def __init__(self, head, H):
+        import torch
+        self.torch = torch
+        self.head = head
+        self.H = torch.from_numpy(np.ascontiguousarray(H, dtype=np.float32))
+
+    def __call__(self, I, J):
+        a, b = self.H[I], self.H[J]
+        with self.torch.no_grad():
+            s = self.head(a.repeat_interleave(len(J), dim=0), b.repeat(len(I), 1))
+        return s.reshape(len(I), len(J)).numpy().astype(np.float64)
+
+def make_variant(head, variant, H):
+    """The fp32 head, its dynamic int8 quantisation or a traced + frozen TorchScript module."""
+    import torch
+    if variant == 'int8':
+        return torch.ao.quantization.quantize_dynamic(head, {torch.nn.Linear}, dtype=torch.qint8)
+    if variant == 'torchscript':
+        x = torch.from_numpy(np.ascontiguousarray(H[:2], dtype=np.float32))
+        with torch.no_grad():
+            return torch.jit.freeze(torch.jit.trace(head, (x, x)))
+    return head
+
+def build_scorer(model_path, A, names, user_rows, variant='fp32'):
+    if is_gnn(model_path):
+        from models.train_gnn_lite import load_head
+        head, user_nodes, H = load_head(model_path)
+        pos = {n: i for i, n in enumerate(user_nodes)}
+        missing = [n for n in names[user_rows] if n not in pos]
+        if missing:
+            raise ValueError(f"{len(missing)} users (e.g. {missing[0]}) have no embedding in {model_path}; "
+                             f"retrain with train_gnn_lite.py --save_model on this graph")
+        H = H[[pos[n] for n in names[user_rows]]]
+        return GNNScorer(make_variant(head, variant, H), H)
+    if variant != 'fp32':
+        raise ValueError(f"--variant {variant} applies to the GNN head (.pt) only")
+    from models.link_prediction_baseline import load_model
+    return LRScorer(load_model(model_path), A, user_rows)
+
+def excluded_pairs(U, I, col_of):
+    """(row in block, column index) of the pairs skipped for block I: itself and linked users, sorted by column."""
+    sub = U[I].tocoo()
+    r = np.concatenate([sub.row, np.arange(len(I))])
+    c = col_of[np.concatenate([sub.col, I])]
+    keep = c >= 0
+    order = np.argsort(c[keep], kind='stable')
+    return r[keep][order], c[keep][order]
+
+def merge_topk(best_s, best_j, S, J, k):
+    """Keep the k highest of the running top-k and a new tile, per row (unordered)."""
+    s = np.hstack([best_s, S])
+    j = np.hstack([best_j, np.broadcast_to(J, S.shape)])
+    if s.shape[1] <= k:
+        return s, j
+    part = np.argpartition(-s, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(s, part, axis=1), np.take_along_axis(j, part, axis=1)
+
+def score_block(scorer, U, I, cols, col_of, k, tile, include_linked=False):
+    """Top-k (column indices, scores) per row of block I, best first; -inf marks missing slots."""
+    best_s = np.full((len(I), 0), -np.inf)
+    best_j = np.zeros((len(I), 0), dtype=np.int64)
+    r, c = excluded_pairs(U, I, col_of)
+    if include_linked:  # still skip the user itself
+        self_pair = cols[c] == I[r]
+        r, c = r[self_pair], c[self_pair]
+    for s in range(0, len(cols), tile):
+        e = min(len(cols), s + tile)
+        S = scorer(I, cols[s:e])
+        lo, hi = np.searchsorted(c, [s, e])
+        S[r[lo:hi], c[lo:hi] - s] = -np.inf
+        best_s, best_j = merge_topk(best_s, best_j, S, np.arange(s, e), k)
+    order = np.argsort(-best_s, axis=1, kind='stable')
+    return np.take_along_axis(best_j, order, axis=1), np.take_along_axis(best_s, order, axis=1)
+
+_state = {}
+
+def init_worker(model_path, graph_path, variant, cols, k, tile, include_linked, threads=1, arrays=None):
+    """Load the graph and model once per worker process (arrays: preloaded load_graph_arrays, in-process runs)."""
+    A, names, types = arrays if arrays is not None else load_graph_arrays(graph_path)
+    if threads and is_gnn(model_path):
+        import torch
+        torch.set_num_threads(threads)
+    user_rows = np.nonzero(types == 'user')[0]
+    col_of = np.full(len(user_rows), -1, dtype=np.int64)
+    col_of[cols] = np.arange(len(cols))
+    _state.update(scorer=build_scorer(model_path, A, names, user_rows, variant),
+                  U=A[user_rows][:, user_rows].tocsr(), cols=cols, col_of=col_of, k=k, tile=tile,
+                  include_linked=include_linked)
+
+def _score_task(I):
+    st = _state
+    t = time.perf_counter()
+    top, scores = score_block(st['scorer'], st['U'], I, st['cols'], st['col_of'], st['k'], st['tile'], st['include_linked'])
+    return I, top, scores, time.perf_counter() - t
+
+def compare_variant(model_path, arrays, variant, rows, cols, k, tile, include_linked=False):
+    """Score rows with the fp32 head and the variant: |delta| over all pairs, top-k overlap and pairs/sec of both."""
+    A, names, types = arrays
+    user_rows = np.nonzero(types == 'user')[0]
+    U = A[user_rows][:, user_rows].tocsr()
+    col_of = np.full(len(user_rows), -1, dtype=np.int64)
+    col_of[cols] = np.arange(len(cols))
+    ref = build_scorer(model_path, A, names, user_rows, 'fp32')
+    var = build_scorer(model_path, A, names, user_rows, variant)
+    seconds = {'fp32': 0.0, variant: 0.0}
+    max_d = sum_d = 0.0
+    n = overlap = slots = same_top1 = 0
+    for b in range(0, len(rows), tile):
+        I = rows[b:b+tile]
+        for s in range(0, len(cols), tile):
+            J = cols[s:s+tile]
+            t = time.perf_counter(); S_ref = ref(I, J); seconds['fp32'] += time.perf_counter() - t
+            t = time.perf_counter(); S_var = var(I, J); seconds[variant] += time.perf_counter() - t
+            d = np.abs(S_ref - S_var)
+            max_d = max(max_d, float(d.max())); sum_d += float(d.sum()); n += d.size
+        j_ref, s_ref = score_block(ref, U, I, cols, col_of, k, tile, include_linked)
+        j_var, _ = score_block(var, U, I, cols, col_of, k, tile, include_linked)
+        for a, v, sc in zip(j_ref, j_var, s_ref):
+            valid = np.isfinite(sc)
+            overlap += len(set(a[valid].tolist()) & set(v[valid].tolist())); slots += int(valid.sum())
+            same_top1 += int(valid.any() and a[0] == v[0])
+    return {'variant': variant, 'users': len(rows), 'pairs': n,
+            'max_abs_delta': round(max_d, 6), 'mean_abs_delta': round(sum_d / n, 8) if n else None,
+            'topk_overlap': round(overlap / slots, 4) if slots else None,
+            'top1_agreement': round(same_top1 / len(rows), 4) if len(rows) else None,
+            'pairs_per_s': {name: round(n / sec) if sec else None for name, sec in seconds.items()}}
+
+def read_users(path, names, user_rows):
+    """Positions (into the user rows) of the users listed one per line in path; unknown names are reported."""
+    pos = {n: i for i, n in enumerate(names[user_rows])}
+    with open(path, encoding='utf-8') as f:
+        wanted = [line.strip() for line in f if line.strip()]
+    missing = [u for u in wanted if u not in pos]
+    if missing:
+        print(f"{len(missing)} of {len(wanted)} users in {path} are not users of the graph (e.g. {missing[0]})")
+    return np.unique([pos[u] for u in wanted if u in pos]).astype(np.int64)
+
+def run(graph_path, model_path, out_csv=None, k=10, tile=512, workers=1, variant='fp32', users=None, targets=None,
+        include_linked=False, n_compare=0, report_path=None, seed=0):
+    with profiling.stage("load_graph"):
+        arrays = load_graph_arrays(graph_path)
+    A, names, types = arrays
+    user_rows = np.nonzero(types == 'user')[0]
+    user_names = names[user_rows]
+    rows = read_users(users, names, user_rows) if users else np.arange(len(user_rows))
+    cols = read_users(targets, names, user_rows) if targets else np.arange(len(user_rows))
+    blocks = [rows[s:s+tile] for s in range(0, len(rows), tile)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(blocks) or 1))
+    print(f"Scoring {len(rows)} x {len(cols)} user pairs ({variant}) in {len(blocks)} blocks of {tile}, "
+          f"{workers} worker(s), top {k} per user")
+    initargs = (model_path, graph_path, variant, cols, k, tile, include_linked, 1 if workers > 1 else None)
+    writer = f = None
+    if out_csv:
+        os.makedirs(os.path.dirname(os.path.abspath(out_csv)), exist_ok=True)
+        f = open(out_csv, 'w', newline='', encoding='utf-8')
+        writer = csv.writer(f)
+        writer.writerow(['user', 'rank', 'candidate', 'score'])
+    n_written = 0
+    t0 = time.perf_counter()
+    with profiling.stage("score", users=len(rows), pairs=len(rows)*len(cols)):
+        if workers > 1:
+            pool = Pool(workers, initializer=init_worker, initargs=initargs)
+            results = pool.imap(_score_task, blocks)
+        else:
+            pool = None
+            init_worker(*initargs, arrays=arrays)
+            results = map(_score_task, blocks)
+        for I, top, scores, sec in results:
+            profiling.add_item("score", int(I[0]), sec)
+            for u, js, ss in zip(I, top, scores):
+                valid = np.isfinite(ss)
+                if writer:
+                    writer.writerows((user_names[u], r, user_names[cols[j]], round(float(s), 6))
+                                     for r, (j, s) in enumerate(zip(js[valid], ss[valid]), 1))
+                n_written += int(valid.sum())
+        if pool:
+            pool.close(); pool.join()
+    wall = time.perf_counter() - t0
+    if f:
+        f.close()
+        print("Wrote", out_csv)
+    pairs = len(rows) * len(cols)
+    report = {'graph': graph_path, 'model': model_path, 'variant': variant, 'users': len(rows), 'targets': len(cols),
+              'pairs': pairs, 'k': k, 'tile': tile, 'workers': workers, 'include_linked': include_linked,
+              'rows_written': n_written, 'seconds': round(wall, 3), 'pairs_per_s': round(pairs / wall) if wall else None,
+              'peak_rss_mb': round(profiling.peak_rss_mb() or 0, 1)}
+    print(f"{pairs} pairs in {wall:.1f}s ({report['pairs_per_s']} pairs/s), {n_written} recommendations, "
+          f"peak RSS {report['peak_rss_mb']} MB")
+    if n_compare:
+        if not is_gnn(model_path):
+            print("--compare needs a GNN model (.pt); the LR scorer has no quantised variants")
+        else:
+            other = variant if variant != 'fp32' else 'int8'
+            sample = np.sort(np.random.default_rng(seed).permutation(rows)[:n_compare])
+            with profiling.stage("compare", users=len(sample)):
+                report['compare'] = cmp = compare_variant(model_path, arrays, other, sample, cols, k, tile, include_linked)
+            print(f"{other} vs fp32 on {cmp['users']} users: max |delta| {cmp['max_abs_delta']}, mean |delta| "
+                  f"{cmp['mean_abs_delta']}, top-{k} overlap {cmp['topk_overlap']}, top-1 agreement "
+                  f"{cmp['top1_agreement']}, pairs/s {cmp['pairs_per_s']}")
+    if report_path:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as fr:
+            json.dump(report, fr, indent=2)
+        print("Wrote", report_path)
+    return report
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--graph", default="data/dataset/multimodal_graph.csr", help="gpickle or .csr directory")
+    p.add_argument("--model", default="data/dataset/link_model.joblib",
+                   help=".joblib from link_prediction_baseline --save_model or .pt from train_gnn_lite --save_model")
+    p.add_argument("--out", default=None, help="top-k CSV (user, rank, candidate, score)")
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--tile", type=int, default=512, help="users per row block / column tile")
+    p.add_argument("--workers", type=int, default=1, help="processes scoring row blocks (0 = all cores)")
+    p.add_argument("--variant", choices=VARIANTS, default="fp32", help="GNN head: fp32, dynamic int8 or TorchScript")
+    p.add_argument("--users", default=None, help="file with the users to recommend for (one per line)")
+    p.add_argument("--targets", default=None, help="file with the users that may be recommended (one per line)")
+    p.add_argument("--include_linked", action="store_true", help="also score users already linked to the user")
+    p.add_argument("--compare", type=int, default=0,
+                   help="users rescored with fp32 and --variant (int8 if fp32) for the accuracy-delta report")
+    p.add_argument("--report", default=None, help="JSON report")
+    p.add_argument("--seed", type=int, default=0)
+    profiling.add_trace_arg(p)
+    args = p.parse_args(argv)
+    if args.tile < 1 or args.k < 1:
+        p.error("--tile and --k must be positive")
+    if args.variant != 'fp32' and not is_gnn(args.model):
+        p.error("--variant int8/torchscript applies to the GNN head (.pt) only")
+    profiling.init(args.trace, "bulk_score", args.trace_top)
+    run(args.graph, args.model, args.out, args.k, args.tile, args.workers, args.variant, args.users, args.targets,
+        args.include_linked, args.compare, args.report, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# src/models/candidates.py
+"""
+Candidate generation for top-k link recommendation ("who is user X most likely to co-appear with?").
+
+Scoring every user pair is O(U^2). Instead each query user gets a few hundred candidates from
+three cheap sources, and only those are scored by the trained model:
+  ann      nearest users by embedding: mean visual and mean face embedding of the user's posted
+           images, L2-normalised and concatenated, searched with an IVF index (MiniBatchKMeans
+           centroids; the n_probe closest inverted lists are scanned exactly)
+  hop      2-hop neighbours in the user co-appearance graph (friends of friends), most paths first
+  popular  the highest-degree users (preferential attachment ranks them high for everyone)
+The query user and the users it is already linked to are never candidates.
+The IVF lists (k-means centroids and each user's list) are cached per graph content
+(analysis/result_cache.py), so a rerun on the same graph skips the k-means. The user embeddings
+themselves are not cached: they are rebuilt from the memory-mapped embedding stores, which keeps
+a U x dim matrix out of the size-bounded cache.
+"""
+import os, sys
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.pair_features import graph_adjacency, pair_features
+from data.graph_csr import CSRGraph, is_csr, load_graph
+from data.embedding_store import face_keys_by_image, open_store
+from analysis.result_cache import cached
+
+SOURCES = ('ann', 'hop', 'popular')
+
+def load_graph_arrays(graph_path):
+    """(binary adjacency, node names, node type per row) from the CSR arrays when available, else via networkx."""
+    if is_csr(graph_path):
+        g = CSRGraph(graph_path)
+        return g.adjacency(), np.asarray(g.node_ids).astype(str), np.asarray(g.node_types, dtype=object)[g.node_type]
+    G = load_graph(graph_path)
+    A, nodes, _ = graph_adjacency(G)
+    return A, np.array(nodes, dtype=str), np.array([G.nodes[n].get('type') for n in nodes], dtype=object)
+
+def _normalize(X):
+    norm = np.linalg.norm(X, axis=1, keepdims=True)
+    return np.divide(X, norm, out=np.zeros_like(X), where=norm > 0)
+
+def user_embeddings(A, names, types, user_rows, emb_dir):
+    """Per user: [mean vis, mean face] over its posted images (every face of each), each part L2-normalised (zeros when missing)."""
+    img_rows = np.nonzero(types == 'image')[0]
+    P = A[user_rows][:, img_rows].tocsr()  # user x image (posted)
+    keys = [n[len('img_'):] for n in names[img_rows]]
+    parts = []
+    for name in ('vis', 'face'):
+        store = open_store(emb_dir, name)
+        if name == 'face':
+            by_img = face_keys_by_image(store)
+            have = [(j, key) for j, k in enumerate(keys) for _, key in by_img.get(k, ())]
+        else:
+            have = [(j, k) for j, k in enumerate(keys) if k in store]
+        if not have:
+            continue
+        _, V = store.matrix([key for _, key in have])
+        S = P[:, [j for j, _ in have]]
+        counts = np.asarray(S.sum(axis=1)).ravel()
+        M = np.asarray(S @ np.asarray(V, dtype=np.float32))
+        M = np.divide(M, counts[:, None], out=np.zeros_like(M), where=counts[:, None] > 0)
+        parts.append(_normalize(M.astype(np.float32)))
+    X = np.hstack(parts) if parts else np.zeros((len(user_rows), 1), dtype=np.float32)
+    return _normalize(X)
+
+def _emb_stat(emb_dir):
+    return [[f, os.stat(os.path.join(emb_dir, f)).st_size, os.stat(os.path.join(emb_dir, f)).st_mtime_ns]
+            for f in (f"{n}_index.csv" for n in ('vis', 'face')) if os.path.exists(os.path.join(emb_dir, f))]
+
+class IVFIndex:
+    """Inverted-file index for inner-product search over L2-normalised rows of X."""
+    def __init__(self, X, centroids, assign):
+        self.X = np.ascontiguousarray(X, dtype=np.float32)
+        self.centroids = centroids
+        self.members = np.argsort(assign, kind='stable')
+        self.offsets = np.searchsorted(assign[self.members], np.arange(len(self.centroids) + 1))
+
+    @staticmethod
+    def train(X, n_lists=None, seed=0):
+        """(centroids, list of each row) from MiniBatchKMeans, ~4 sqrt(n) lists by default."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n = len(X)
+        n_lists = min(n, n_lists or max(1, int(4 * np.sqrt(n))))
+        if n_lists > 1:
+            from sklearn.cluster import MiniBatchKMeans
+            km = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, batch_size=4096, n_init=3).fit(X)
+            return km.cluster_centers_.astype(np.float32), km.labels_.astype(np.int32)
+        return X.mean(axis=0, keepdims=True), np.zeros(n, dtype=np.int32)
+
+    def search(self, q, k, n_probe=8):
+        """(rows, similarities) of the ~k most similar rows among the n_probe lists closest to q."""
+        c = self.centroids @ q
+        probe = np.argsort(-c)[:n_probe]
+        cand = np.concatenate([self.members[self.offsets[l]:self.offsets[l+1]] for l in probe])
+        sims = self.X[cand] @ q
+        top = np.argsort(-sims)[:k] if len(cand) > k else np.argsort(-sims)
+        return cand[top], sims[top]
+
+class CandidateIndex:
+    """Users of one graph with their embeddings, IVF index and co-appearance block; positions index user_rows."""
+    def __init__(self, A, names, user_rows, X, ivf, n_probe=8, n_popular=50):
+        self.A = A.tocsr()
+        self.names = names
+        self.user_rows = np.asarray(user_rows, dtype=np.int64)
+        self.X = X
+        self.ivf = ivf
+        self.n_probe = n_probe
+        self.deg = np.asarray(self.A.sum(axis=1)).ravel()
+        self.U = self.A[self.user_rows][:, self.user_rows].tocsr()  # user-user (co-appearance) block
+        self.popular = np.argsort(-np.diff(self.U.indptr), kind='stable')[:n_popular]
+
+    @classmethod
+    def from_graph(cls, graph_path, emb_dir, n_lists=None, n_probe=8, n_popular=50, seed=0):
+        A, names, types = load_graph_arrays(graph_path)
+        user_rows = np.nonzero(types == 'user')[0]
+        X = user_embeddings(A, names, types, user_rows, emb_dir)
+        centroids, assign = cached(graph_path, "user_ivf_lists", {'emb': _emb_stat(emb_dir), 'n_lists': n_lists, 'seed': seed},
+                                   lambda: IVFIndex.train(X, n_lists, seed))
+        return cls(A, names, user_rows, X, IVFIndex(X, centroids, assign), n_probe, n_popular)
+
+    def __len__(self):
+        return len(self.user_rows)
+
+    def excluded(self, u):
+        """The user itself plus the users it is already linked to (positions into user_rows)."""
+        return np.append(self.U.indices[self.U.indptr[u]:self.U.indptr[u+1]], u)
+
+    def candidates(self, u, n_ann=200, n_hop=100):
+        """(candidate positions, source index into SOURCES) for user position u, deduplicated in source order."""
+        skip = self.excluded(u)
+        hop = np.zeros(0, dtype=np.int64)
+        nbrs = self.U.indices[self.U.indptr[u]:self.U.indptr[u+1]]
+        if len(nbrs) and n_hop:
+            paths = np.asarray(self.U[nbrs].sum(axis=0)).ravel()
+            paths[skip] = 0
+            hop = np.nonzero(paths)[0]
+            if len(hop) > n_hop:
+                hop = hop[np.argsort(-paths[hop], kind='stable')[:n_hop]]
+        ann = self.ivf.search(self.X[u], n_ann + len(skip), self.n_probe)[0] if n_ann else np.zeros(0, dtype=np.int64)
+        out, src = [], []
+        seen = set(skip.tolist())
+        for s, (rows, cap) in enumerate(((ann, n_ann), (hop, n_hop), (self.popular, len(self.popular)))):
+            taken = 0
+            for r in rows.tolist():
+                if taken == cap:
+                    break
+                if r not in seen:
+                    seen.add(r); out.append(r); src.append(s); taken += 1
+        return np.array(out, dtype=np.int64), np.array(src, dtype=np.int8)
+
+    def score(self, model, u, cand):
+        """Model probability of a link between user u and every candidate (same features as training)."""
+        if len(cand) == 0:
+            return np.zeros(0)
+        rows = self.user_rows[cand]
+        X = pair_features(self.A, np.full(len(rows), self.user_rows[u]), rows, deg=self.deg)
+        return model.predict_proba(X)[:, 1]
+
+    def recommend(self, model, u, k=10, n_ann=200, n_hop=100):
+        """(top-k candidate positions, scores, number of candidates scored)."""
+        cand, _ = self.candidates(u, n_ann, n_hop)
+        scores = self.score(model, u, cand)
+        top = np.argsort(-scores, kind='stable')[:k]
+        return cand[top], scores[top], len(cand)
+
+    def exhaustive(self, model, u, k=10):
+        """Top-k over every user not excluded for u: the reference the candidates are measured against."""
+        mask = np.ones(len(self.user_rows), dtype=bool)
+        mask[self.excluded(u)] = False
+        cand = np.nonzero(mask)[0]
+        scores = self.score(model, u, cand)
+        top = np.argsort(-scores, kind='stable')[:k]
+        return cand[top], scores[top]
@@ -0,0 +1,41 @@
+# src/models/gnn_modules.py
+"""
+torch modules of train_gnn_lite.py: per-type input encoders, GraphSAGE mean-aggregation layers
+over sampled blocks, and the LinkMLP pair scorer. Kept apart so importing train_gnn_lite (for
+--help or the unified CLI) does not load torch.
+"""
+import torch, torch.nn as nn
+
+class LinkMLP(nn.Module):
+    """Scores a pair from its two node embeddings."""
+    def __init__(self, in_dim=10, hid=32):
+        super().__init__()
+        self.net = nn.Sequential(nn.Linear(in_dim*2, hid), nn.ReLU(), nn.Linear(hid,1), nn.Sigmoid())
+    def forward(self, a, b):
+        x = torch.cat([a*b, (a-b).abs()], dim=1)
+        return self.net(x).squeeze(-1)
+
+class SAGELayer(nn.Module):
+    def __init__(self, in_dim, out_dim):
+        super().__init__()
+        self.self_lin = nn.Linear(in_dim, out_dim)
+        self.nei_lin = nn.Linear(in_dim, out_dim, bias=False)
+    def forward(self, h_src, adj, dst_pos):
+        # adj: sparse (dst x src) row-normalised sampled adjacency -> neighbour mean
+        return self.self_lin(h_src[dst_pos]) + self.nei_lin(torch.sparse.mm(adj, h_src))
+
+class MultimodalSAGE(nn.Module):
+    def __init__(self, in_dims, hid=64, layers=2):
+        super().__init__()
+        self.hid = hid
+        self.encoders = nn.ModuleDict({t: nn.Linear(d, hid) for t, d in in_dims.items()})
+        self.layers = nn.ModuleList([SAGELayer(hid, hid) for _ in range(layers)])
+    def forward(self, feats, n_input, blocks):
+        h = torch.zeros(n_input, self.hid)
+        for t, (pos, x) in feats.items():
+            h = h.index_copy(0, pos, self.encoders[t](x))
+        for k, (layer, (adj, dst_pos)) in enumerate(zip(self.layers, blocks)):
+            h = layer(h, adj, dst_pos)
+            if k < len(self.layers) - 1:
+                h = torch.relu(h)
+        return h
@@ -5,50 +5,71 @@ Run simple link-prediction baseline on the multimodal graph.
 Outputs metrics printed to console.
 Usage:
   python link_prediction_baseline.py --graph data/dataset/multimodal_graph.gpickle
+  python link_prediction_baseline.py --graph data/dataset/multimodal_graph.csr   (memory-mapped, no unpickle)
+  python link_prediction_baseline.py --graph data/dataset/multimodal_graph.csr --save_model data/dataset/link_model.joblib
+  (the saved model scores recommendation candidates, see recommend.py)
 """
-import argparse, random
-import networkx as nx
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import roc_auc_score, average_precision_score
+import argparse, os, sys
 import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.pair_features import graph_adjacency, pair_features, sample_user_pairs
+from data.graph_csr import CSRGraph, is_csr, load_graph
+from utils import profiling
 
-def feature_vec(G, u, v):
-    cn = len(list(nx.common_neighbors(G, u, v)))
-    pa = G.degree(u) * G.degree(v)
-    try:
-        j = next(nx.jaccard_coefficient(G, [(u,v)]))[2]
-    except StopIteration:
-        j = 0.0
-    return [cn, pa, j]
-
-def run(graph_path, sample_size=500):
-    import pickle
-    with open(graph_path, "rb") as f:
-        G = pickle.load(f)
-    users = [n for n,d in G.nodes(data=True) if d.get('type')=='user']
-    pos=[]; neg=[]
-    # collect positives/negatives among user-user pairs
-    for i in range(len(users)):
-        for j in range(i+1, len(users)):
-            u, v = users[i], users[j]
-            if G.has_edge(u,v):
-                pos.append((u,v))
-            else:
-                neg.append((u,v))
-    random.shuffle(pos); random.shuffle(neg)
-    npos = min(sample_size, len(pos))
-    nneg = npos
-    pos_s = pos[:npos]; neg_s = neg[:nneg]
-    X = [feature_vec(G,u,v) for u,v in (pos_s+neg_s)]
-    y = [1]*len(pos_s) + [0]*len(neg_s)
-    clf = LogisticRegression(max_iter=1000).fit(X,y)
+def load_user_adjacency(graph_path):
+    """(binary adjacency, user rows) straight from the CSR arrays when available, else via networkx."""
+    if is_csr(graph_path):
+        g = CSRGraph(graph_path)
+        return g.adjacency(), g.rows_of_type('user')
+    G = load_graph(graph_path)
+    A, nodes, idx = graph_adjacency(G)
+    return A, np.array([idx[n] for n,d in G.nodes(data=True) if d.get('type')=='user'], dtype=np.int64)
+
+FEATURES = ['common_neighbors', 'preferential_attachment', 'jaccard']  # columns of pair_features
+
+def save_model(clf, path):
+    import joblib
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    joblib.dump({'model': clf, 'features': FEATURES}, path)
+
+def load_model(path):
+    import joblib
+    saved = joblib.load(path)
+    if saved.get('features') != FEATURES:
+        raise ValueError(f"{path} was trained on features {saved.get('features')}, expected {FEATURES}")
+    return saved['model']
+
+def run(graph_path, sample_size=500, model_path=None):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import roc_auc_score, average_precision_score
+    with profiling.stage("load_adjacency"):
+        A, user_rows = load_user_adjacency(graph_path)
+    # sample positives/negatives among user-user pairs without enumerating all of them
+    with profiling.stage("sample_pairs"):
+        pos, neg = sample_user_pairs(A, user_rows, sample_size)
+        pairs = np.vstack([pos, neg])
+    with profiling.stage("pair_features", pairs=len(pairs)):
+        X = pair_features(A, user_rows[pairs[:,0]], user_rows[pairs[:,1]])
+    y = [1]*len(pos) + [0]*len(neg)
+    with profiling.stage("fit"):
+        clf = LogisticRegression(max_iter=1000).fit(X,y)
     probs = clf.predict_proba(X)[:,1]
     print("AUC:", roc_auc_score(y, probs))
     print("AP:", average_precision_score(y, probs))
+    if model_path:
+        save_model(clf, model_path)
+        print("Saved model to", model_path)
+    return clf
 
-if __name__=="__main__":
+def main(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("--graph", default="data/dataset/multimodal_graph.gpickle")
     p.add_argument("--sample", type=int, default=500)
-    args = p.parse_args()
-    run(args.graph, args.sample)
+    p.add_argument("--save_model", default=None, help="write the fitted model here (joblib) for recommend.py")
+    profiling.add_trace_arg(p)
+    args = p.parse_args(argv)
+    profiling.init(args.trace, "link_prediction_baseline", args.trace_top)
+    run(args.graph, args.sample, args.save_model)
+
+if __name__ == "__main__":
+    main()
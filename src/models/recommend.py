@@ -0,0 +1,127 @@
+# src/models/recommend.py
+"""
+Per-user top-k co-appearance recommendations from candidate retrieval + the saved link model.
+
+Each user's candidates (ANN over user embeddings, 2-hop neighbours, popular users; see
+candidates.py) are scored by the link_prediction_baseline model; the k best become the
+recommendations. Latency per user is bounded by the candidate budget, not by the number of users.
+--eval N compares N sampled users against exhaustive scoring of every other user. Recall@k counts
+the recommended users that score at least as high as the exhaustive k-th best (ties count as hits).
+Outputs:
+  --out       CSV with columns user, rank, candidate, score
+  --report    JSON with candidates per user, latency p50/p99 and recall@k vs exhaustive
+Usage:
+  python link_prediction_baseline.py --graph data/dataset/multimodal_graph.csr --save_model data/dataset/link_model.joblib
+  python recommend.py --graph data/dataset/multimodal_graph.csr --model data/dataset/link_model.joblib --out data/dataset/recommendations.csv
+  python recommend.py --graph data/dataset/multimodal_graph.csr --model data/dataset/link_model.joblib --eval 500 --n_ann 100 --n_hop 50
+"""
+import os, sys, csv, json, time, argparse
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.candidates import CandidateIndex, SOURCES
+from models.link_prediction_baseline import load_model, run as train_baseline
+from utils import profiling
+
+def _ms_stats(seconds):
+    if not seconds:
+        return {}
+    p50, p99 = np.percentile(np.asarray(seconds) * 1e3, [50, 99])
+    return {'p50_ms': round(float(p50), 3), 'p99_ms': round(float(p99), 3),
+            'mean_ms': round(float(np.mean(seconds)) * 1e3, 3)}
+
+def evaluate(index, model, users, k=10, n_ann=200, n_hop=100):
+    """Recall@k of candidate scoring vs exhaustive scoring, plus both latencies and per-source hit counts."""
+    hits = total = 0
+    fast, slow = [], []
+    from_source = np.zeros(len(SOURCES), dtype=np.int64)
+    for u in users:
+        t = time.perf_counter()
+        cand, src = index.candidates(u, n_ann, n_hop)
+        scores = index.score(model, u, cand)
+        top = np.argsort(-scores, kind='stable')[:k]
+        fast.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        _, best = index.exhaustive(model, u, k)
+        slow.append(time.perf_counter() - t)
+        if len(best) == 0:
+            continue
+        hit = scores[top] >= best[-1] - 1e-12
+        hits += int(hit.sum()); total += len(best)
+        np.add.at(from_source, src[top][hit], 1)
+    return {'users': len(users), 'recall_at_k': round(hits / total, 4) if total else None,
+            'candidate_latency': _ms_stats(fast), 'exhaustive_latency': _ms_stats(slow),
+            'hits_by_source': dict(zip(SOURCES, from_source.tolist()))}
+
+def run(graph_path, emb_dir, model_path, k=10, n_ann=200, n_hop=100, n_popular=50, n_lists=None, n_probe=8,
+        out_csv=None, report_path=None, n_eval=200, seed=0):
+    if os.path.exists(model_path):
+        model = load_model(model_path)
+    else:
+        print(f"No model at {model_path}, training the baseline first")
+        model = train_baseline(graph_path, model_path=model_path)
+    with profiling.stage("candidate_index"):
+        index = CandidateIndex.from_graph(graph_path, emb_dir, n_lists, n_probe, n_popular, seed)
+    print(f"{len(index)} users, {len(index.ivf.centroids)} IVF lists (probing {n_probe}), "
+          f"{len(index.popular)} popular users")
+    latency, n_cand = [], []
+    writer = f = None
+    if out_csv:
+        f = open(out_csv, 'w', newline='', encoding='utf-8')
+        writer = csv.writer(f)
+        writer.writerow(['user', 'rank', 'candidate', 'score'])
+    with profiling.stage("recommend", users=len(index)):
+        for u in range(len(index)):
+            t = time.perf_counter()
+            top, scores, n = index.recommend(model, u, k, n_ann, n_hop)
+            latency.append(time.perf_counter() - t); n_cand.append(n)
+            profiling.add_item("recommend", index.names[index.user_rows[u]], latency[-1])
+            if writer:
+                user = index.names[index.user_rows[u]]
+                writer.writerows((user, r, index.names[index.user_rows[c]], round(float(s), 6))
+                                 for r, (c, s) in enumerate(zip(top, scores), 1))
+    if f:
+        f.close()
+        print("Wrote", out_csv)
+    report = {'users': len(index), 'k': k, 'n_ann': n_ann, 'n_hop': n_hop, 'n_popular': n_popular,
+              'n_lists': len(index.ivf.centroids), 'n_probe': n_probe,
+              'candidates_per_user': round(float(np.mean(n_cand)), 1) if n_cand else 0,
+              'latency': _ms_stats(latency)}
+    if n_eval and len(index):
+        users = np.random.default_rng(seed).permutation(len(index))[:n_eval]
+        with profiling.stage("evaluate", users=len(users)):
+            report['eval'] = evaluate(index, model, users, k, n_ann, n_hop)
+        ev = report['eval']
+        print(f"Recall@{k} vs exhaustive on {ev['users']} users: {ev['recall_at_k']} "
+              f"(candidates {ev['candidate_latency'].get('p50_ms')} ms p50 / {ev['candidate_latency'].get('p99_ms')} ms p99, "
+              f"exhaustive {ev['exhaustive_latency'].get('p50_ms')} ms p50); hits by source {ev['hits_by_source']}")
+    print(f"{report['candidates_per_user']} candidates/user, latency {report['latency'].get('p50_ms')} ms p50, "
+          f"{report['latency'].get('p99_ms')} ms p99")
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as fr:
+            json.dump(report, fr, indent=2)
+        print("Wrote", report_path)
+    return report
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--graph", default="data/dataset/multimodal_graph.csr", help="gpickle or .csr directory")
+    p.add_argument("--emb_dir", default="data/dataset/embeddings")
+    p.add_argument("--model", default="data/dataset/link_model.joblib", help="from link_prediction_baseline --save_model (trained if missing)")
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--n_ann", type=int, default=200, help="embedding nearest neighbours per user")
+    p.add_argument("--n_hop", type=int, default=100, help="2-hop neighbours per user")
+    p.add_argument("--n_popular", type=int, default=50, help="highest-degree users added for everyone")
+    p.add_argument("--n_lists", type=int, default=None, help="IVF lists (default 4*sqrt(users))")
+    p.add_argument("--n_probe", type=int, default=8, help="IVF lists scanned per query")
+    p.add_argument("--out", default=None, help="recommendations CSV")
+    p.add_argument("--report", default=None, help="JSON report")
+    p.add_argument("--eval", type=int, default=200, help="users compared against exhaustive scoring (0 = skip)")
+    p.add_argument("--seed", type=int, default=0)
+    profiling.add_trace_arg(p)
+    args = p.parse_args(argv)
+    profiling.init(args.trace, "recommend", args.trace_top)
+    run(args.graph, args.emb_dir, args.model, args.k, args.n_ann, args.n_hop, args.n_popular, args.n_lists,
+        args.n_probe, args.out, args.report, args.eval, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -1,92 +1,278 @@
 # src/models/train_gnn_lite.py
 """
-Lightweight link predictor (MLP) on sampled user-user pairs.
+Mini-batch GraphSAGE-style link predictor for user-user co-appearance.
+
+Message passing runs over the multimodal user-image-person graph (posted / contains edges; the
+co-appearance edges being predicted are left out so they cannot leak into the inputs). Input
+features per node type: image = tiny visual embedding ("vis" store), person cluster = mean of its
+faces ("face" store, the face on each contains edge), user = log(1 + #posted images). The graph is
+read from its CSR copy (written next to a gpickle on first use). Each batch samples a fixed fanout
+of neighbours per layer, computes only the features of the sampled nodes (user/person features
+are kept in a bounded LRU cache, --feature_cache) and aggregates with sparse mean matrices, so
+time and memory grow with batch size, not graph size.
+Runs on CPU; --threads sets torch's intra-op threads. Reports held-out AUC/AP and pairs/sec.
+The torch modules live in gnn_modules.py; torch is only imported once training or scoring starts.
 Usage:
-  python train_gnn_lite.py --graph data/dataset/multimodal_graph.gpickle --emb_dir data/dataset/embeddings
+  python train_gnn_lite.py --graph data/dataset/multimodal_graph.csr --emb_dir data/dataset/embeddings
+  python train_gnn_lite.py --graph data/dataset/multimodal_graph.gpickle --epochs 20 --batch_size 512 --fanouts 15,10 --threads 4
+  python train_gnn_lite.py --graph data/dataset/multimodal_graph.gpickle --save_model data/dataset/gnn_model.pt   (for bulk_score.py)
 """
-import argparse, networkx as nx, numpy as np, torch, torch.nn as nn, torch.optim as optim
-from sklearn.metrics import roc_auc_score, average_precision_score
-import random, joblib
-
-class LinkMLP(nn.Module):
-    def __init__(self, in_dim=10, hid=32):
-        super().__init__()
-        self.net = nn.Sequential(nn.Linear(in_dim*2, hid), nn.ReLU(), nn.Linear(hid,1), nn.Sigmoid())
-    def forward(self, a, b):
-        x = torch.cat([a,b], dim=1)
-        return self.net(x).squeeze()
-
-def load_node_features(G, emb_dir):
-    users = [n for n,d in G.nodes(data=True) if d.get('type')=='user']
-    idx = {u:i for i,u in enumerate(users)}
-    X = []
-    for u in users:
-        deg = G.degree(u)
-        # average visual embeddings of user's images if present
-        vis_feats=[]
-        for nb in G[u]:
-            if G.nodes[nb].get('type')=='image':
-                file_tag = G.nodes[nb].get('file')
-                if file_tag:
-                    # filename id extraction
-                    # embeddings saved as <id>_vis.pkl
-                    fname = file_tag
-                    base = None
-                    try:
-                        base = int(str(os.path.basename(fname)).split('.')[0])
-                    except:
-                        pass
-                # try to load vis embedding by id if exists
-        # For Lite we only use degree + random small vector
-        vec = np.concatenate(([deg], np.random.normal(size=9)))
-        X.append(vec.astype('float32'))
-    return np.array(X), users, idx
-
-import os
-def run(graph_path, emb_dir, epochs=200):
-    import pickle
-    with open(graph_path, "rb") as f:
-        G = pickle.load(f)
-
-    X, users, idx = load_node_features(G, emb_dir)
-    N = X.shape[0]
-    # prepare pairs
-    pos=[]; neg=[]
-    for i in range(N):
-        for j in range(i+1,N):
-            if G.has_edge(users[i], users[j]):
-                pos.append((i,j,1))
+import argparse, time, numpy as np
+import os, sys
+from collections import OrderedDict
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.pair_features import sample_user_pairs
+from data.embedding_store import open_store, face_key
+from data.graph_csr import CSRGraph, csr_path_for, is_csr, load_graph, save_csr
+from utils import profiling
+
+NODE_TYPES = ('user', 'image', 'person_cluster')
+
+class NodeFeatures:
+    """
+    Per-type raw input features, computed on demand from the CSR arrays for the nodes of a sampled
+    batch. User and person-cluster features need a pass over the node's neighbours (and, for
+    persons, a face-embedding mean), so they are kept in an LRU cache of cache_size nodes.
+    """
+    def __init__(self, g, emb_dir, cache_size=100000):
+        self.indptr, self.indices = g.indptr, g.indices
+        self.edge_face = g.edge_face
+        codes = np.array([NODE_TYPES.index(t) if t in NODE_TYPES else 0 for t in g.node_types] + [0], dtype=np.int8)
+        self.type_code = codes[np.asarray(g.node_type)]  # code -1 (no type) picks the trailing 0
+        self.node_ids = g.node_ids
+        self.vis = open_store(emb_dir, 'vis')
+        self.face = open_store(emb_dir, 'face')
+        self.vis_dim = self.vis.get(next(iter(self.vis.index))).shape[0] if len(self.vis.index) else 1
+        self.face_dim = self.face.get(next(iter(self.face.index))).shape[0] if len(self.face.index) else 1
+        self.dims = {'user': 1, 'image': self.vis_dim, 'person_cluster': self.face_dim}
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    def _image_key(self, i):
+        return str(self.node_ids[i])[len('img_'):]
+
+    def _images_of(self, i):
+        """(image rows, edge positions) among the neighbours of row i."""
+        lo, hi = self.indptr[i], self.indptr[i+1]
+        nb = np.asarray(self.indices[lo:hi])
+        keep = np.nonzero(self.type_code[nb] == 1)[0]
+        return nb[keep], lo + keep
+
+    def _user_x(self, i):
+        # log(1 + #posted images)
+        return np.array([np.log1p(len(self._images_of(i)[0]))], dtype='float32')
+
+    def _person_x(self, i):
+        # mean embedding of the cluster's face in each image it appears in
+        keys = []
+        for img, e in zip(*self._images_of(i)):
+            k = int(self.edge_face[e]) if self.edge_face is not None else -1
+            key, img_key = face_key(self._image_key(img), max(k, 0)), self._image_key(img)
+            key = key if key in self.face else img_key  # legacy stores: one face per image id
+            if key in self.face:
+                keys.append(key)
+        return self.face.matrix(keys)[1].mean(axis=0).astype('float32') if keys else np.zeros(self.face_dim, dtype='float32')
+
+    def _cached(self, i, compute):
+        x = self.cache.get(i)
+        if x is None:
+            x = self.cache[i] = compute(i)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(i)
+        return x
+
+    def batch(self, rows):
+        import torch
+        out = {}
+        codes = self.type_code[rows]
+        for c, t in enumerate(NODE_TYPES):
+            pos = np.nonzero(codes == c)[0]
+            if len(pos) == 0:
+                continue
+            r = rows[pos]
+            if t == 'user':
+                x = np.vstack([self._cached(int(i), self._user_x) for i in r])
+            elif t == 'person_cluster':
+                x = np.vstack([self._cached(int(i), self._person_x) for i in r])
             else:
-                neg.append((i,j,0))
-    random.shuffle(pos); random.shuffle(neg)
-    npos = min(500, len(pos))
-    pairs = pos[:npos] + neg[:npos]
-    random.shuffle(pairs)
-    a_idx = torch.tensor([p[0] for p in pairs], dtype=torch.long)
-    b_idx = torch.tensor([p[1] for p in pairs], dtype=torch.long)
-    y = torch.tensor([p[2] for p in pairs], dtype=torch.float32)
-    X_t = torch.tensor(X, dtype=torch.float32)
-    model = LinkMLP(in_dim=X.shape[1])
-    opt = optim.Adam(model.parameters(), lr=1e-3)
-    for epoch in range(epochs):
-        model.train()
-        opt.zero_grad()
-        preds = model(X_t[a_idx], X_t[b_idx])
-        loss = nn.BCELoss()(preds, y)
-        loss.backward(); opt.step()
-        if epoch%50==0:
-            with torch.no_grad():
-                auc = roc_auc_score(y.numpy(), preds.detach().numpy())
-                print(f"Epoch {epoch} loss {loss.item():.4f} auc {auc:.4f}")
+                keys = [self._image_key(i) for i in r]
+                x = np.zeros((len(r), self.vis_dim), dtype='float32')
+                have = [k for k, key in enumerate(keys) if key in self.vis]
+                if have:
+                    x[have] = self.vis.matrix([keys[k] for k in have])[1]
+            out[t] = (torch.from_numpy(pos), torch.from_numpy(x))
+        return out
+
+def open_csr(graph_path):
+    """CSRGraph of graph_path, or of the .csr directory next to a gpickle (written from the pickle if missing)."""
+    csr = graph_path if is_csr(graph_path) else csr_path_for(graph_path)
+    if not is_csr(csr):
+        save_csr(load_graph(graph_path), csr)
+        print("Wrote CSR copy of", graph_path, "to", csr)
+    return CSRGraph(csr)
+
+def message_passing_csr(g):
+    """CSR (indptr, indices) over all edges except the co-appearance edges being predicted (and self loops)."""
+    indptr, indices = np.asarray(g.indptr), np.asarray(g.indices)
+    src = np.repeat(np.arange(g.num_nodes), np.diff(indptr))
+    keep = src != indices
+    if 'coappearance' in g.edge_types:
+        keep &= np.asarray(g.edge_type) != g.edge_types.index('coappearance')
+    counts = np.bincount(src[keep], minlength=g.num_nodes)
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64), indices[keep].astype(np.int64)
+
+def sample_blocks(indptr, indices, seeds, fanouts, rng):
+    """
+    Layer-wise uniform neighbour sampling (with replacement, `fanout` draws per node).
+    Returns (input node rows, [(sparse mean adj dst x src, dst positions in src)] from input to output).
+    """
+    import torch
+    blocks = []
+    nodes = np.asarray(seeds)
+    for f in reversed(fanouts):
+        deg = indptr[nodes+1] - indptr[nodes]
+        has = np.nonzero(deg > 0)[0]
+        e_dst = np.repeat(has, f)
+        off = (rng.random(len(e_dst)) * np.repeat(deg[has], f)).astype(np.int64)
+        nb = indices[np.repeat(indptr[nodes[has]], f) + off]
+        src, inv = np.unique(np.concatenate([nodes, nb]), return_inverse=True)
+        dst_pos, e_src = inv[:len(nodes)], inv[len(nodes):]
+        adj = torch.sparse_coo_tensor(torch.from_numpy(np.vstack([e_dst, e_src])), torch.full((len(e_dst),), 1.0/f),
+                                      (len(nodes), len(src)), check_invariants=False).coalesce()
+        blocks.append((adj, torch.from_numpy(dst_pos)))
+        nodes = src
+    return nodes, blocks[::-1]
+
+def embed_pairs(model, feats, mp, pairs_rows, fanouts, rng):
+    """Run the sampled GNN for the users in a batch of (a, b) graph rows; returns (h_a, h_b)."""
+    import torch
+    seeds, inv = np.unique(pairs_rows.ravel(), return_inverse=True)
+    inv = inv.reshape(pairs_rows.shape)
+    inputs, blocks = sample_blocks(mp[0], mp[1], seeds, fanouts, rng)
+    h = model(feats.batch(inputs), len(inputs), blocks)
+    return h[torch.from_numpy(inv[:,0])], h[torch.from_numpy(inv[:,1])]
+
+def embed_users(model, feats, mp, user_rows, fanouts, batch_size=1024, seed=0):
+    """Output embeddings of the given (sorted, unique) user rows in eval mode, one sampled neighbourhood each."""
+    import torch
+    rng = np.random.default_rng(seed)
+    model.eval()
+    out = []
     with torch.no_grad():
-        preds = model(X_t[a_idx], X_t[b_idx]).numpy()
-        print("Final AUC:", roc_auc_score(y.numpy(), preds))
-        print("Final AP:", average_precision_score(y.numpy(), preds))
+        for s in range(0, len(user_rows), batch_size):
+            inputs, blocks = sample_blocks(mp[0], mp[1], user_rows[s:s+batch_size], fanouts, rng)
+            out.append(model(feats.batch(inputs), len(inputs), blocks).numpy())
+    return np.vstack(out) if out else np.zeros((0, model.hid), dtype='float32')
 
-if __name__ == "__main__":
+def save_model(path, model, head, user_nodes, user_h, fanouts):
+    """Weights plus the users' output embeddings, so bulk scoring only needs the LinkMLP head (see bulk_score.py)."""
+    import torch
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    torch.save({'head': head.state_dict(), 'model': model.state_dict(), 'hid': model.hid, 'layers': len(model.layers),
+                'in_dims': {t: enc.in_features for t, enc in model.encoders.items()}, 'fanouts': list(fanouts),
+                'user_nodes': [str(n) for n in user_nodes], 'user_h': torch.from_numpy(np.asarray(user_h, dtype='float32'))}, path)
+
+def load_head(path):
+    """(LinkMLP head in eval mode, user node names, their embeddings as float32 array) from save_model."""
+    import torch
+    from models.gnn_modules import LinkMLP
+    saved = torch.load(path, map_location='cpu')
+    head = LinkMLP(in_dim=saved['hid'], hid=saved['hid'])
+    head.load_state_dict(saved['head'])
+    return head.eval(), saved['user_nodes'], saved['user_h'].numpy()
+
+def evaluate(model, head, feats, mp, pairs_rows, labels, fanouts, batch_size, seed=0):
+    import torch
+    from sklearn.metrics import roc_auc_score, average_precision_score
+    rng = np.random.default_rng(seed)
+    model.eval(); head.eval()
+    preds = []
+    with torch.no_grad():
+        for s in range(0, len(pairs_rows), batch_size):
+            ha, hb = embed_pairs(model, feats, mp, pairs_rows[s:s+batch_size], fanouts, rng)
+            preds.append(head(ha, hb).numpy())
+    preds = np.concatenate(preds) if preds else np.zeros(0)
+    return roc_auc_score(labels, preds), average_precision_score(labels, preds)
+
+def run(graph_path, emb_dir, epochs=20, batch_size=256, fanouts=(10, 10), hid=64, lr=1e-3,
+        n_pairs=5000, threads=None, seed=0, model_path=None, cache_size=100000):
+    import torch, torch.nn as nn, torch.optim as optim
+    from models.gnn_modules import LinkMLP, MultimodalSAGE
+    if threads:
+        torch.set_num_threads(threads)
+    torch.manual_seed(seed)
+    rng = np.random.default_rng(seed)
+    with profiling.stage("prepare"):
+        g = open_csr(graph_path)
+        A = g.adjacency()
+        mp = message_passing_csr(g)
+        feats = NodeFeatures(g, emb_dir, cache_size)
+    user_rows = g.rows_of_type('user').astype(np.int64)
+    # prepare pairs (sampled directly, no all-pairs loop), then an 80/20 train/test split
+    pos, neg = sample_user_pairs(A, user_rows, n_pairs, rng)
+    pairs = user_rows[np.vstack([pos, neg])]
+    labels = np.concatenate([np.ones(len(pos)), np.zeros(len(neg))]).astype('float32')
+    perm = rng.permutation(len(pairs))
+    pairs, labels = pairs[perm], labels[perm]
+    n_test = max(1, len(pairs)//5)
+    test_p, test_y, train_p, train_y = pairs[:n_test], labels[:n_test], pairs[n_test:], labels[n_test:]
+    print(f"{g.num_nodes} nodes, {len(mp[1])//2} message-passing edges, {len(train_p)} train / {len(test_p)} test pairs")
+
+    model = MultimodalSAGE(feats.dims, hid=hid, layers=len(fanouts))
+    head = LinkMLP(in_dim=hid, hid=hid)
+    opt = optim.Adam(list(model.parameters()) + list(head.parameters()), lr=lr)
+    loss_fn = nn.BCELoss()
+    seen = 0; t0 = time.time()
+    for epoch in range(epochs):
+        model.train(); head.train()
+        order = rng.permutation(len(train_p))
+        total = 0.0
+        with profiling.item("epoch", epoch):
+            for s in range(0, len(order), batch_size):
+                b = order[s:s+batch_size]
+                with profiling.item("batch", (epoch, s//batch_size)):
+                    ha, hb = embed_pairs(model, feats, mp, train_p[b], fanouts, rng)
+                    loss = loss_fn(head(ha, hb), torch.from_numpy(train_y[b]))
+                    opt.zero_grad(); loss.backward(); opt.step()
+                total += loss.item()*len(b); seen += len(b)
+        if epoch % max(1, epochs//4) == 0:
+            auc, _ = evaluate(model, head, feats, mp, test_p, test_y, fanouts, batch_size)
+            print(f"Epoch {epoch} loss {total/max(1,len(order)):.4f} test auc {auc:.4f} ({seen/(time.time()-t0):.0f} edges/sec)")
+    train_time = time.time() - t0
+    with profiling.stage("evaluate"):
+        auc, ap = evaluate(model, head, feats, mp, test_p, test_y, fanouts, batch_size)
+    print("Final AUC:", auc)
+    print("Final AP:", ap)
+    print(f"Throughput: {seen/max(train_time,1e-9):.0f} training edges/sec on {torch.get_num_threads()} threads")
+    if model_path:
+        with profiling.stage("save_model", users=len(user_rows)):
+            user_rows = np.sort(user_rows)
+            save_model(model_path, model, head, [str(g.node_ids[i]) for i in user_rows],
+                       embed_users(model, feats, mp, user_rows, fanouts, seed=seed), fanouts)
+        print("Saved model and", len(user_rows), "user embeddings to", model_path)
+    return model, head
+
+def main(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("--graph", default="data/dataset/multimodal_graph.gpickle")
     p.add_argument("--emb_dir", default="data/dataset/embeddings")
-    p.add_argument("--epochs", type=int, default=200)
-    args = p.parse_args()
-    run(args.graph, args.emb_dir, args.epochs)
+    p.add_argument("--epochs", type=int, default=20)
+    p.add_argument("--batch_size", type=int, default=256, help="user pairs per step")
+    p.add_argument("--fanouts", default="10,10", help="neighbours sampled per layer, comma separated")
+    p.add_argument("--hid", type=int, default=64)
+    p.add_argument("--lr", type=float, default=1e-3)
+    p.add_argument("--pairs", type=int, default=5000, help="positive pairs to sample (same number of negatives)")
+    p.add_argument("--threads", type=int, default=None, help="torch intra-op CPU threads")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--save_model", default=None, help="write weights + user embeddings here (.pt) for bulk_score.py")
+    p.add_argument("--feature_cache", type=int, default=100000, help="user/person input features kept in memory")
+    profiling.add_trace_arg(p)
+    args = p.parse_args(argv)
+    profiling.init(args.trace, "train_gnn_lite", args.trace_top)
+    run(args.graph, args.emb_dir, args.epochs, args.batch_size, tuple(int(x) for x in args.fanouts.split(',')),
+        args.hid, args.lr, args.pairs, args.threads, args.seed, args.save_model, args.feature_cache)
+
+if __name__ == "__main__":
+    main()
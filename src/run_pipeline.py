@@ -0,0 +1,251 @@
+# src/run_pipeline.py
+"""
+Run the whole pipeline (the commands in commands.txt) as a stage DAG.
+
+  prepare -> dedup -> preprocess -> face_cluster -> build_graph -> {baseline -> recommend, gnn, metrics, influence}
+
+Every stage declares its input and output files; a stage is skipped when it is up to date:
+  --check mtime  all outputs exist and none is older than the newest input (outputs are touched after
+                 a successful run, since incremental stages may not rewrite all of them)
+  --check hash   all outputs exist and the inputs' content hashes (plus the stage's command line)
+                 match the last successful run, recorded in <data>/.pipeline_state.json
+Directories (the image folder, embeddings, the .csr graph) are fingerprinted by their file names,
+sizes and mtimes, files by sha1 (memoised by size/mtime, so unchanged files are not rehashed).
+Stages whose dependencies are done run concurrently (--jobs), e.g. the baseline, GNN, metrics
+and influence stages after build_graph. Each stage runs its script in a subprocess; its output
+goes to <data>/logs/<stage>.log. A failed stage stops its dependents but not independent stages.
+Usage:
+  python src/run_pipeline.py --images data/images --data data/dataset
+  python src/run_pipeline.py --data data/dataset --jobs 4 --check hash --skip gnn
+  python src/run_pipeline.py --data data/dataset --force face_cluster --dry_run
+"""
+import os, sys, json, time, hashlib, argparse, subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+
+class Stage:
+    def __init__(self, name, script, args, deps=(), inputs=(), outputs=()):
+        self.name, self.script, self.args = name, script, list(args)
+        self.deps, self.inputs, self.outputs = list(deps), list(inputs), list(outputs)
+
+    def command(self):
+        return [sys.executable, os.path.join(SRC, self.script)] + [str(a) for a in self.args]
+
+def build_stages(data, images=None, vg_json=None, workers=1, gnn_epochs=20, metrics_workers=1, dedup=True, cascade=""):
+    """The pipeline of commands.txt as Stage objects; paths follow the data/dataset layout."""
+    p = lambda *x: os.path.join(data, *x)
+    meta, cv, faces = p("metadata.csv"), p("cv_metadata_lite.csv"), p("face_clusters.csv")
+    graph, csr, emb = p("multimodal_graph.gpickle"), p("multimodal_graph.csr"), p("embeddings")
+    dmap, model = p("dedup_map.csv"), p("link_model.joblib")
+    log = lambda name: p("logs", f"{name}.log")
+    stages = []
+    if vg_json:
+        stages.append(Stage("prepare", "data/dataset_prepare_visualgenome.py",
+                            ["--mode", "vg", "--vg_json", vg_json, "--out", data] + (["--img_dir", images] if images else []),
+                            inputs=[vg_json] + ([images] if images else []), outputs=[meta]))
+    elif images:
+        stages.append(Stage("prepare", "data/dataset_prepare_visualgenome.py",
+                            ["--mode", "local", "--img_dir", images, "--out", data], inputs=[images], outputs=[meta]))
+    prep = ["prepare"] if stages else []
+    if dedup:
+        stages.append(Stage("dedup", "data/dedup_images.py", ["--meta", meta, "--out", dmap, "--workers", workers],
+                            deps=prep, inputs=[meta] + ([images] if images else []), outputs=[dmap]))
+        prep = ["dedup"]
+    with_dedup = lambda args: args + ["--dedup", dmap] if dedup else args
+    stages += [
+        Stage("preprocess", "data/preprocess_cv_lite.py", with_dedup(["--meta", meta, "--out", data, "--workers", workers]
+                                                                     + (["--cascade", cascade] if cascade else [])),
+              deps=prep, inputs=[meta] + ([images] if images else []) + ([dmap] if dedup else []),
+              outputs=[cv, p("face_boxes.csv"), os.path.join(emb, "face_index.csv"), os.path.join(emb, "vis_index.csv")]),
+        Stage("face_cluster", "data/face_cluster.py", ["--emb_dir", emb, "--meta", meta, "--out", faces],
+              deps=["preprocess"], inputs=[meta, os.path.join(emb, "face_index.csv")], outputs=[faces]),
+        Stage("build_graph", "data/build_graph.py", with_dedup(["--meta", meta, "--cv", cv, "--faces", faces, "--out", graph]),
+              deps=["face_cluster"], inputs=[meta, cv, faces] + ([dmap] if dedup else []),
+              outputs=[graph, os.path.join(csr, "meta.json")]),
+        Stage("baseline", "models/link_prediction_baseline.py", ["--graph", csr, "--sample", 500, "--save_model", model],
+              deps=["build_graph"], inputs=[csr], outputs=[log("baseline"), model]),
+        Stage("recommend", "models/recommend.py",
+              ["--graph", csr, "--emb_dir", emb, "--model", model, "--out", p("recommendations.csv"),
+               "--report", p("recommendations_report.json")],
+              deps=["baseline"], inputs=[csr, emb, model], outputs=[p("recommendations.csv")]),
+        Stage("gnn", "models/train_gnn_lite.py",
+              ["--graph", csr, "--emb_dir", emb, "--epochs", gnn_epochs, "--save_model", p("gnn_model.pt")],
+              deps=["build_graph"], inputs=[csr, emb], outputs=[log("gnn"), p("gnn_model.pt")]),
+        Stage("metrics", "visualize/graph_metrics_summary.py",
+              ["--graph", csr, "--mode", "scalable", "--workers", metrics_workers, "--out", p("graph_metrics.json")],
+              deps=["build_graph"], inputs=[csr], outputs=[p("graph_metrics.json")]),
+        Stage("influence", "analysis/influence_analysis.py", ["--graph", csr, "--k", 10],
+              deps=["build_graph"], inputs=[csr], outputs=[log("influence")]),
+    ]
+    return stages
+
+def _dir_fingerprint(path):
+    h = hashlib.sha1()
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for f in sorted(files):
+            st = os.stat(os.path.join(root, f))
+            h.update(f"{os.path.relpath(os.path.join(root, f), path)}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+class StateFile:
+    """Per-stage input digests of the last successful run, plus a stat-keyed sha1 memo of input files."""
+    def __init__(self, path):
+        self.path = path
+        self.state = {'stages': {}, 'files': {}}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.state = json.load(f)
+
+    def file_digest(self, path):
+        if os.path.isdir(path):
+            return _dir_fingerprint(path)
+        st = os.stat(path)
+        key, stat = os.path.abspath(path), [st.st_size, st.st_mtime_ns]
+        memo = self.state['files'].get(key)
+        if memo and memo['stat'] == stat:
+            return memo['sha1']
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1<<20), b''):
+                h.update(chunk)
+        self.state['files'][key] = {'stat': stat, 'sha1': h.hexdigest()}
+        return h.hexdigest()
+
+    def stage_digest(self, stage):
+        h = hashlib.sha1(json.dumps(stage.command()[1:]).encode())
+        for path in stage.inputs:
+            h.update(f"{path}={self.file_digest(path) if os.path.exists(path) else 'missing'}\n".encode())
+        return h.hexdigest()
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp, self.path)
+
+def _mtime(path):
+    if os.path.isdir(path):
+        return max([os.stat(os.path.join(r, f)).st_mtime for r, _, fs in os.walk(path) for f in fs] or [os.stat(path).st_mtime])
+    return os.stat(path).st_mtime
+
+def touch(paths):
+    """Mark outputs as current: incremental stages may leave an output they had nothing to add to untouched."""
+    now = time.time()
+    for path in paths:
+        os.utime(path, (now, now))
+
+def is_up_to_date(stage, check, state):
+    if not all(os.path.exists(o) for o in stage.outputs):
+        return False
+    if check == 'hash':
+        return state.state['stages'].get(stage.name) == state.stage_digest(stage)
+    inputs = [i for i in stage.inputs if os.path.exists(i)]
+    if len(inputs) < len(stage.inputs):
+        return False
+    return not inputs or min(_mtime(o) for o in stage.outputs) >= max(_mtime(i) for i in inputs)
+
+def run_stage(stage, log_dir, env):
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"{stage.name}.log")
+    failed_path = os.path.join(log_dir, f"{stage.name}.failed.log")
+    t = time.time()
+    with open(log_path + ".tmp", 'w', encoding='utf-8') as log:
+        rc = subprocess.call(stage.command(), stdout=log, stderr=subprocess.STDOUT, env=env)
+    if rc == 0:
+        os.replace(log_path + ".tmp", log_path)
+        if os.path.exists(failed_path):
+            os.remove(failed_path)
+        return rc, time.time() - t, log_path
+    # logs double as outputs of the report stages, so a failed run must not leave one behind
+    if os.path.exists(log_path):
+        os.remove(log_path)
+    os.replace(log_path + ".tmp", failed_path)
+    return rc, time.time() - t, failed_path
+
+def run(stages, data, check='mtime', jobs=2, force=(), skip=(), dry_run=False, trace=None):
+    stages = [s for s in stages if s.name not in skip]
+    active = {s.name for s in stages}
+    state = StateFile(os.path.join(data, ".pipeline_state.json"))
+    log_dir = os.path.join(data, "logs")
+    env = dict(os.environ)
+    if trace:
+        env['PIPELINE_TRACE'] = os.path.join(trace, "")  # each stage writes <trace>/<script>.trace.json
+    status = {}   # name -> 'ok' | 'skipped' | 'failed' | 'blocked'
+    planned = set()  # dry run: stages that would run, so their dependents would too
+    pending = {s.name: s for s in stages}
+    running = {}
+    t0 = time.time()
+
+    def ready(s):  # dependencies left out with --skip (or not part of this pipeline) count as done
+        return all(d not in active or status.get(d) in ('ok', 'skipped') for d in s.deps)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while pending or running:
+            for name in list(pending):
+                s = pending[name]
+                if any(status.get(d) in ('failed', 'blocked') for d in s.deps):
+                    status[name] = 'blocked'; del pending[name]
+                    print(f"[{name}] not run: a dependency failed")
+                    continue
+                if not ready(s):
+                    continue
+                del pending[name]
+                if name not in force and not planned & set(s.deps) and is_up_to_date(s, check, state):
+                    status[name] = 'skipped'
+                    print(f"[{name}] up to date")
+                    continue
+                if dry_run:
+                    status[name] = 'ok'; planned.add(name)
+                    print(f"[{name}] would run: {' '.join(s.command()[1:])}")
+                    continue
+                print(f"[{name}] running")
+                running[pool.submit(run_stage, s, log_dir, env)] = s
+            if not running:
+                if pending and not any(ready(s) for s in pending.values()):
+                    raise RuntimeError(f"unsatisfiable dependencies: {sorted(pending)}")
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fu in done:
+                s = running.pop(fu)
+                rc, secs, log_path = fu.result()
+                if rc == 0 and all(os.path.exists(o) for o in s.outputs):
+                    status[s.name] = 'ok'
+                    touch(s.outputs)
+                    state.state['stages'][s.name] = state.stage_digest(s)
+                    state.save()
+                    print(f"[{s.name}] done in {secs:.1f}s (log: {log_path})")
+                else:
+                    status[s.name] = 'failed'
+                    state.state['stages'].pop(s.name, None)
+                    print(f"[{s.name}] FAILED (exit {rc}) after {secs:.1f}s, see {log_path}")
+    print(f"Pipeline finished in {time.time()-t0:.1f}s: " +
+          ", ".join(f"{k}={sum(v == k for v in status.values())}" for k in ('ok', 'skipped', 'failed', 'blocked')))
+    return status
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--data", default="data/dataset", help="dataset dir (metadata.csv, embeddings, graph, ...)")
+    p.add_argument("--images", default=None, help="image dir; adds the prepare stage (local mode)")
+    p.add_argument("--vg_json", default=None, help="Visual Genome image_data.json; prepare in vg mode")
+    p.add_argument("--check", choices=['mtime', 'hash'], default='mtime', help="how up-to-date stages are detected")
+    p.add_argument("--jobs", type=int, default=2, help="stages run concurrently")
+    p.add_argument("--workers", type=int, default=1, help="preprocess worker processes")
+    p.add_argument("--metrics_workers", type=int, default=1)
+    p.add_argument("--gnn_epochs", type=int, default=20)
+    p.add_argument("--no_dedup", action="store_true", help="run CV on every image instead of reusing near-duplicates")
+    p.add_argument("--cascade", default="", help="preprocess model gates, e.g. face,ocr (see preprocess_cv_lite.py)")
+    p.add_argument("--force", default="", help="stages to rerun regardless, comma separated")
+    p.add_argument("--skip", default="", help="stages to leave out, comma separated (e.g. gnn)")
+    p.add_argument("--dry_run", action="store_true", help="only print what would run")
+    p.add_argument("--trace", default=None, help="directory for per-stage Chrome traces (see utils/profiling.py)")
+    args = p.parse_args(argv)
+    split = lambda s: {x for x in s.split(',') if x}
+    stages = build_stages(args.data, args.images, args.vg_json, args.workers, args.gnn_epochs, args.metrics_workers,
+                          not args.no_dedup, args.cascade)
+    status = run(stages, args.data, args.check, args.jobs, split(args.force), split(args.skip), args.dry_run, args.trace)
+    sys.exit(1 if any(v == 'failed' for v in status.values()) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# src/utils/profiling.py
+"""
+Stage / item tracing shared by the pipeline scripts.
+
+Off by default. Enable it with --trace PATH on a script or with PIPELINE_TRACE=PATH in the
+environment. If PATH is a directory (or ends with a separator) the file is <PATH>/<script>.trace.json.
+The file is Chrome trace JSON, so it opens in chrome://tracing or ui.perfetto.dev:
+  - one complete event per stage, with the peak RSS at its end as a counter
+  - one event per slow item (the --trace_top slowest per stage, e.g. the image Tesseract spent 30s on)
+  - otherData.summary: per stage wall time and peak RSS, plus per-item count, total, mean,
+    p50/p95/p99/max, throughput and the slowest items
+When tracing is off, stage()/item() return one shared no-op context manager and add_item() returns
+at once, so instrumented loops pay a function call and a None check per item.
+Usage inside a script:
+  from utils import profiling
+  profiling.init(args.trace, "build_graph")
+  with profiling.stage("coappearance"): ...
+  with profiling.item("ocr", img_id): ...
+  profiling.add_item("face", img_id, seconds)   (timed elsewhere, e.g. in a pool worker)
+"""
+import os, sys, json, time, heapq, atexit, threading
+from array import array
+import numpy as np
+
+ENV_VAR = "PIPELINE_TRACE"
+
+class _Null:
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+
+_NULL = _Null()
+_tracer = None
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where the resource module is missing, e.g. Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb / 1024 / (1024 if sys.platform == 'darwin' else 1)  # macOS reports bytes
+
+class _Span:
+    def __init__(self, tracer, name, args):
+        self.tracer, self.name, self.args = tracer, name, args
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    def __exit__(self, *exc):
+        self.tracer.add_stage(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+class _Item:
+    def __init__(self, tracer, stage, key):
+        self.tracer, self.stage, self.key = tracer, stage, key
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.tracer.add_item(self.stage, self.key, end - self.start, end)
+        return False
+
+class Tracer:
+    def __init__(self, path, name, top=20):
+        self.path, self.name, self.top = path, name, top
+        self.t0 = time.perf_counter()
+        self.pid = os.getpid()
+        self.events = []
+        self.stages = {}   # stage -> {'seconds', 'calls', 'peak_rss_mb'}
+        self.items = {}    # stage -> {'dur': array, 'first', 'last', 'slow': min-heap of (secs, n, key, end)}
+        self.lock = threading.Lock()
+
+    def _us(self, t):
+        return round((t - self.t0) * 1e6, 1)
+
+    def add_stage(self, name, start, end, args=None):
+        rss = peak_rss_mb()
+        with self.lock:
+            self.events.append({'name': name, 'cat': 'stage', 'ph': 'X', 'ts': self._us(start),
+                                'dur': self._us(end) - self._us(start), 'pid': self.pid,
+                                'tid': threading.get_ident(), 'args': args or {}})
+            if rss is not None:
+                self.events.append({'name': 'peak_rss_mb', 'ph': 'C', 'ts': self._us(end), 'pid': self.pid,
+                                    'args': {'rss': round(rss, 1)}})
+            s = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0, 'peak_rss_mb': None})
+            s['seconds'] += end - start; s['calls'] += 1; s['peak_rss_mb'] = rss
+
+    def add_item(self, stage, key, seconds, end=None):
+        end = time.perf_counter() if end is None else end
+        with self.lock:
+            it = self.items.get(stage)
+            if it is None:
+                it = self.items[stage] = {'dur': array('d'), 'first': end - seconds, 'last': end, 'slow': []}
+            it['dur'].append(seconds)
+            it['first'] = min(it['first'], end - seconds); it['last'] = max(it['last'], end)
+            entry = (seconds, len(it['dur']), str(key), end)
+            if len(it['slow']) < self.top:
+                heapq.heappush(it['slow'], entry)
+            elif seconds > it['slow'][0][0]:
+                heapq.heapreplace(it['slow'], entry)
+
+    def summary(self):
+        out = {'script': self.name, 'wall_s': round(time.perf_counter() - self.t0, 4),
+               'peak_rss_mb': peak_rss_mb(), 'stages': {}, 'items': {}}
+        for name, s in self.stages.items():
+            out['stages'][name] = {'seconds': round(s['seconds'], 4), 'calls': s['calls'], 'peak_rss_mb': s['peak_rss_mb']}
+        for stage, it in self.items.items():
+            d = np.frombuffer(it['dur'], dtype=np.float64)
+            span = max(it['last'] - it['first'], 1e-9)
+            p50, p95, p99 = np.percentile(d, [50, 95, 99])
+            out['items'][stage] = {
+                'count': len(d), 'total_s': round(float(d.sum()), 4), 'mean_ms': round(float(d.mean()) * 1e3, 3),
+                'p50_ms': round(p50 * 1e3, 3), 'p95_ms': round(p95 * 1e3, 3), 'p99_ms': round(p99 * 1e3, 3),
+                'max_ms': round(float(d.max()) * 1e3, 3), 'items_per_s': round(len(d) / span, 2),
+                'slowest': [{'key': k, 'seconds': round(s, 4)} for s, _, k, _ in sorted(it['slow'], reverse=True)]}
+        return out
+
+    def write(self):
+        summary = self.summary()
+        events = list(self.events)
+        for stage, it in self.items.items():
+            for secs, _, key, end in it['slow']:
+                events.append({'name': f"{stage}:{key}", 'cat': 'slow_item', 'ph': 'X', 'ts': self._us(end - secs),
+                               'dur': round(secs * 1e6, 1), 'pid': self.pid, 'tid': 0, 'args': {'stage': stage, 'key': key}})
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'args': {'name': self.name}})
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'summary': summary}}, f)
+        os.replace(tmp, self.path)
+        slow = [f"{s} {v['total_s']:.2f}s/{v['count']}" for s, v in summary['items'].items()]
+        print(f"Trace written to {self.path} ({summary['wall_s']:.2f}s"
+              + (f"; items: {', '.join(slow)}" if slow else "") + ")", file=sys.stderr)
+
+def init(path=None, name=None, top=20):
+    """Start tracing if path (or $PIPELINE_TRACE) is set; the trace is written at exit. Returns the tracer or None."""
+    global _tracer
+    path = path or os.environ.get(ENV_VAR)
+    if not path:
+        return None
+    name = name or os.path.splitext(os.path.basename(sys.argv[0]))[0] or "pipeline"
+    if os.path.isdir(path) or path.endswith(('/', os.sep)):
+        path = os.path.join(path, f"{name}.trace.json")
+    _tracer = Tracer(path, name, top)
+    atexit.register(_tracer.write)
+    return _tracer
+
+def enabled():
+    return _tracer is not None
+
+def stage(name, **args):
+    """Context manager timing one pipeline stage."""
+    return _NULL if _tracer is None else _Span(_tracer, name, args)
+
+def item(stage, key):
+    """Context manager timing one item (image, url, pair batch, epoch) of a stage."""
+    return _NULL if _tracer is None else _Item(_tracer, stage, key)
+
+def add_item(stage, key, seconds):
+    """Record an item timed elsewhere (e.g. returned by a pool worker)."""
+    if _tracer is not None:
+        _tracer.add_item(stage, key, seconds)
+
+def add_trace_arg(parser):
+    parser.add_argument("--trace", default=None,
+                        help=f"write a Chrome-trace JSON of stage/item timings here (or set {ENV_VAR}); a directory gets <script>.trace.json")
+    parser.add_argument("--trace_top", type=int, default=20, help="slowest items kept per stage in the trace")
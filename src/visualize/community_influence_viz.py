@@ -1,57 +1,94 @@
+# src/visualize/community_influence_viz.py
+"""
+Community + influence visualization of the multimodal graph.
+
+Nodes are coloured by community (shared seeded Louvain engine) and sized by degree centrality;
+the top influencers are labelled. With --out the figure is rendered headless to PNG/SVG,
+--lod draws one super-node per community instead of every node.
+Usage:
+  python community_influence_viz.py --graph data/dataset/multimodal_graph.gpickle
+  python community_influence_viz.py --graph data/dataset/multimodal_graph.csr --out figures/communities.png
+  python community_influence_viz.py --graph data/dataset/multimodal_graph.csr --lod --out figures/communities_lod.svg
+"""
+import argparse
 import networkx as nx
-import pickle
-import matplotlib.pyplot as plt
-from networkx.algorithms import community
-
-# === Load Graph ===
-with open("data/dataset/multimodal_graph.gpickle", "rb") as f:
-    G = pickle.load(f)
-
-# === Compute Communities using the Greedy Modularity Algorithm ===
-communities = community.greedy_modularity_communities(G)
-print(f"Detected {len(communities)} communities.")
-
-# Assign community ID to each node
-community_map = {}
-for i, comm in enumerate(communities):
-    for node in comm:
-        community_map[node] = i
-
-# === Compute Influence (Degree Centrality) ===
-centrality = nx.degree_centrality(G)
-top_influencers = sorted(centrality.items(), key=lambda x: x[1], reverse=True)[:10]
-
-print("\nTop 10 Influential Nodes:")
-for node, score in top_influencers:
-    print(f"{node}: {score:.4f}")
-
-# === Visualization ===
-plt.figure(figsize=(12, 10))
-pos = nx.spring_layout(G, seed=42)
-
-# Draw nodes with community colors and size proportional to influence
-node_colors = [community_map.get(n, 0) for n in G.nodes()]
-node_sizes = [centrality[n] * 6000 for n in G.nodes()]
-
-nx.draw_networkx_nodes(
-    G,
-    pos,
-    node_color=node_colors,
-    node_size=node_sizes,
-    cmap=plt.cm.tab20,
-    alpha=0.8,
-)
-
-nx.draw_networkx_edges(G, pos, alpha=0.2)
-nx.draw_networkx_labels(
-    G,
-    pos,
-    labels={n: n for n, _ in top_influencers},
-    font_size=8,
-    font_color="black",
-)
-
-plt.title("Community + Influence Visualization of the Multimodal Graph", fontsize=14)
-plt.axis("off")
-plt.tight_layout()
-plt.show()
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.graph_csr import load_graph
+from analysis.communities import detect_communities, community_map as build_community_map
+from analysis.result_cache import cached
+from visualize.graph_render import setup_backend, compute_layout, draw_lod, finish
+
+def run(graph_path, out=None, layout='multilevel', lod=False, top=10, seed=42):
+    setup_backend(out)
+    import matplotlib.pyplot as plt
+
+    # === Load Graph ===
+    G = load_graph(graph_path)
+
+    # === Compute Communities (seeded Louvain, shared engine; results cached per graph content) ===
+    communities = cached(graph_path, "communities", {'method': 'louvain', 'seed': seed}, lambda: detect_communities(G, seed=seed))
+    print(f"Detected {len(communities)} communities.")
+
+    # Assign community ID to each node
+    community_map = build_community_map(communities)
+
+    # === Compute Influence (Degree Centrality) ===
+    centrality = cached(graph_path, "degree_centrality", {}, lambda: nx.degree_centrality(G))
+    top_influencers = sorted(centrality.items(), key=lambda x: x[1], reverse=True)[:top]
+
+    print(f"\nTop {top} Influential Nodes:")
+    for node, score in top_influencers:
+        print(f"{node}: {score:.4f}")
+
+    # === Visualization ===
+    fig, ax = plt.subplots(figsize=(12, 10))
+    if lod:
+        draw_lod(G, communities, ax, seed=seed)
+        plt.title("Community Overview (one node per community, sized by members)", fontsize=14)
+        finish(out)
+        return
+
+    pos = cached(graph_path, "layout", {'algo': layout, 'seed': seed},
+                 lambda: compute_layout(G, communities, layout, seed=seed))
+
+    # Draw nodes with community colors and size proportional to influence
+    node_colors = [community_map.get(n, 0) for n in G.nodes()]
+    node_sizes = [centrality[n] * 6000 for n in G.nodes()]
+
+    nx.draw_networkx_nodes(
+        G,
+        pos,
+        ax=ax,
+        node_color=node_colors,
+        node_size=node_sizes,
+        cmap=plt.cm.tab20,
+        alpha=0.8,
+    )
+
+    nx.draw_networkx_edges(G, pos, ax=ax, alpha=0.2)
+    nx.draw_networkx_labels(
+        G,
+        pos,
+        ax=ax,
+        labels={n: n for n, _ in top_influencers},
+        font_size=8,
+        font_color="black",
+    )
+
+    plt.title("Community + Influence Visualization of the Multimodal Graph", fontsize=14)
+    finish(out)
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--graph", default="data/dataset/multimodal_graph.gpickle", help="gpickle or .csr directory")
+    p.add_argument("--out", default=None, help="write PNG/SVG here instead of opening a window")
+    p.add_argument("--layout", choices=['multilevel', 'spring'], default='multilevel')
+    p.add_argument("--lod", action="store_true", help="collapse each community into a super-node")
+    p.add_argument("--top", type=int, default=10, help="influencers to label")
+    p.add_argument("--seed", type=int, default=42)
+    args = p.parse_args(argv)
+    run(args.graph, args.out, args.layout, args.lod, args.top, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,48 @@
+# src/visualize/community_viz.py
+"""
+Draw the detected communities of the multimodal graph, one colour per community.
+Usage:
+  python community_viz.py --graph data/dataset/multimodal_graph.gpickle
+  python community_viz.py --graph data/dataset/multimodal_graph.csr --out figures/community_map.png
+  python community_viz.py --graph data/dataset/multimodal_graph.csr --lod --out figures/community_map_lod.png
+"""
+import argparse
 import networkx as nx
-import pickle
-import matplotlib.pyplot as plt
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.graph_csr import load_graph
+from analysis.communities import detect_communities, community_map as build_community_map
+from analysis.result_cache import cached
+from visualize.graph_render import setup_backend, compute_layout, draw_lod, finish
 
+def run(graph_path, out=None, layout='multilevel', lod=False, seed=42):
+    setup_backend(out)
+    import matplotlib.pyplot as plt
 
-with open("data/dataset/multimodal_graph.gpickle", "rb") as f:
-    G = pickle.load(f)
-communities = nx.algorithms.community.greedy_modularity_communities(G)
+    G = load_graph(graph_path)
+    communities = cached(graph_path, "communities", {'method': 'louvain', 'seed': seed}, lambda: detect_communities(G, seed=seed))
+    community_map = build_community_map(communities)
 
-plt.figure(figsize=(10,10))
-pos = nx.spring_layout(G, k=0.15)
-nx.draw_networkx_nodes(G, pos, node_size=50, node_color='skyblue')
-nx.draw_networkx_edges(G, pos, alpha=0.2)
-plt.title("Detected Communities in Multimodal Social Graph")
-plt.show()
\ No newline at end of file
+    fig, ax = plt.subplots(figsize=(10,10))
+    if lod:
+        draw_lod(G, communities, ax, seed=seed)
+    else:
+        pos = cached(graph_path, "layout", {'algo': layout, 'k': 0.15, 'seed': seed},
+                     lambda: compute_layout(G, communities, layout, seed=seed, k=0.15))
+        nx.draw_networkx_nodes(G, pos, ax=ax, node_size=50, node_color=[community_map.get(n, 0) for n in G.nodes()], cmap=plt.cm.tab20)
+        nx.draw_networkx_edges(G, pos, ax=ax, alpha=0.2)
+    plt.title("Detected Communities in Multimodal Social Graph")
+    finish(out)
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--graph", default="data/dataset/multimodal_graph.gpickle", help="gpickle or .csr directory")
+    p.add_argument("--out", default=None, help="write PNG/SVG here instead of opening a window")
+    p.add_argument("--layout", choices=['multilevel', 'spring'], default='multilevel')
+    p.add_argument("--lod", action="store_true", help="collapse each community into a super-node")
+    p.add_argument("--seed", type=int, default=42)
+    args = p.parse_args(argv)
+    run(args.graph, args.out, args.layout, args.lod, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,253 @@
+# src/visualize/graph_metrics_summary.py
+"""
+Graph metrics summary as JSON.
+
+--mode exact     networkx betweenness / closeness / diameter / average clustering (small graphs)
+--mode scalable  estimates that finish on large graphs, each under its own --budget seconds:
+                 k-pivot Brandes betweenness (with per-node standard errors), pivot-sampled closeness
+                 (Eppstein-Wang additive bound on average distance), double-sweep diameter bounds and
+                 sampled clustering; pivot batches are spread over --workers processes. Communities
+                 come from label propagation on the CSR adjacency (also under --budget), so
+                 no networkx graph is built for a .csr input.
+Usage:
+  python graph_metrics_summary.py --graph data/dataset/multimodal_graph.gpickle
+  python graph_metrics_summary.py --graph data/dataset/multimodal_graph.csr --mode scalable --k 512 --budget 60 --workers 4 --out metrics.json
+"""
+import argparse, json, math, time
+import numpy as np
 import networkx as nx
-import pickle
-from networkx.algorithms import community
-
-# === Load Graph ===
-with open("data/dataset/multimodal_graph.gpickle", "rb") as f:
-    G = pickle.load(f)
-
-print("\n=== GRAPH METRICS SUMMARY ===")
-
-# --- Basic Stats ---
-num_nodes = G.number_of_nodes()
-num_edges = G.number_of_edges()
-density = nx.density(G)
-avg_degree = sum(dict(G.degree()).values()) / num_nodes
-avg_clustering = nx.average_clustering(G)
-
-print(f"Total Nodes: {num_nodes}")
-print(f"Total Edges: {num_edges}")
-print(f"Graph Density: {density:.4f}")
-print(f"Average Degree: {avg_degree:.2f}")
-print(f"Average Clustering Coefficient: {avg_clustering:.4f}")
-
-# --- Connectivity ---
-if nx.is_connected(G):
-    diameter = nx.diameter(G)
-    print(f"Graph Diameter: {diameter}")
-else:
-    largest_cc = max(nx.connected_components(G), key=len)
-    subG = G.subgraph(largest_cc)
-    diameter = nx.diameter(subG)
-    print(f"Graph not fully connected — diameter of largest component: {diameter}")
-
-# --- Centrality Metrics ---
-degree_centrality = nx.degree_centrality(G)
-betweenness_centrality = nx.betweenness_centrality(G)
-closeness_centrality = nx.closeness_centrality(G)
-
-# Top influential nodes by degree
-top_degree = sorted(degree_centrality.items(), key=lambda x: x[1], reverse=True)[:5]
-print("\nTop 5 Influential Nodes (Degree Centrality):")
-for node, val in top_degree:
-    print(f"  {node}: {val:.4f}")
-
-# --- Community Detection ---
-communities = community.greedy_modularity_communities(G)
-modularity = community.modularity(G, communities)
-
-print(f"\nDetected Communities: {len(communities)}")
-print(f"Modularity Score: {modularity:.4f}")
-
-# --- Summary Conclusion ---
-print("\n=== SUMMARY ===")
-print("High modularity → distinct communities exist.")
-print("High clustering coefficient → localized influence pockets.")
-print("Top central nodes represent potential 'key influencers' across modalities.")
-print("=============================\n")
+from scipy import sparse
+from scipy.sparse import csgraph
+from concurrent.futures import ProcessPoolExecutor
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.graph_csr import CSRGraph, is_csr, load_graph
+from models.pair_features import graph_adjacency
+from analysis.communities import detect_communities, modularity, label_propagation, sparse_modularity
+from analysis.result_cache import cached
+from utils import profiling
+
+TOP = 5
+
+# --- pivot workers (module level so they can be pickled into a process pool) ---
+_W = {}
+
+def _init_worker(indptr, indices):
+    n = len(indptr) - 1
+    _W['A'] = sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr), shape=(n, n))
+    _W['adj'] = [indices[indptr[i]:indptr[i+1]].tolist() for i in range(n)]
+
+def _brandes_chunk(pivots):
+    """Sum and sum of squares of single-source dependencies delta_s(v) over the given pivots."""
+    adj = _W['adj']; n = len(adj)
+    s1 = np.zeros(n); s2 = np.zeros(n)
+    for s in pivots:
+        sigma = [0]*n; dist = [-1]*n; pred = {}
+        sigma[s] = 1; dist[s] = 0
+        order = [s]; head = 0
+        while head < len(order):
+            v = order[head]; head += 1
+            for w in adj[v]:
+                if dist[w] < 0:
+                    dist[w] = dist[v] + 1
+                    order.append(w)
+                if dist[w] == dist[v] + 1:
+                    sigma[w] += sigma[v]
+                    pred.setdefault(w, []).append(v)
+        delta = [0.0]*n
+        for w in reversed(order):
+            for v in pred.get(w, ()):
+                delta[v] += sigma[v] / sigma[w] * (1 + delta[w])
+        delta[s] = 0.0
+        d = np.array(delta)
+        s1 += d; s2 += d*d
+    return len(pivots), s1, s2
+
+def _distance_chunk(pivots):
+    """Per node: sum of finite distances from the pivots, number of pivots reaching it, max distance."""
+    D = csgraph.shortest_path(_W['A'], unweighted=True, directed=False, indices=list(pivots))
+    finite = np.isfinite(D) & (D > 0)
+    return len(pivots), np.where(finite, D, 0).sum(axis=0), finite.sum(axis=0), float(D[np.isfinite(D)].max(initial=0))
+
+def _run_pivots(fn, pivots, indptr, indices, workers, budget, chunk=8):
+    """Run fn over pivot chunks until done or the time budget is spent; returns completed results."""
+    chunks = [pivots[i:i+chunk] for i in range(0, len(pivots), chunk)]
+    start = time.time(); results = []
+    if workers <= 1:
+        _init_worker(indptr, indices)
+        for c in chunks:
+            if results and time.time() - start > budget:
+                break
+            results.append(fn(c))
+        return results, time.time() - start
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(indptr, indices)) as pool:
+        pending = [pool.submit(fn, c) for c in chunks[:workers*2]]
+        nxt = len(pending)
+        while pending:
+            fu = pending.pop(0)
+            results.append(fu.result())
+            if time.time() - start <= budget and nxt < len(chunks):
+                pending.append(pool.submit(fn, chunks[nxt])); nxt += 1
+        return results, time.time() - start
+
+# --- scalable estimators ---
+def sampled_betweenness(indptr, indices, names, k, workers, budget, rng):
+    n = len(names)
+    pivots = rng.permutation(n)[:min(k, n)].tolist()
+    res, secs = _run_pivots(_brandes_chunk, pivots, indptr, indices, workers, budget)
+    used = sum(r[0] for r in res)
+    s1 = sum(r[1] for r in res); s2 = sum(r[2] for r in res)
+    scale = n / ((n-1)*(n-2)) if n > 2 else 0.0  # matches nx normalized=True for undirected graphs
+    mean = s1 / max(used, 1)
+    var = np.maximum(s2/max(used, 1) - mean**2, 0)
+    est = scale * mean
+    se = scale * np.sqrt(var / max(used, 1)) * math.sqrt(max(0.0, 1 - used/n))
+    top = np.argsort(-est)[:TOP]
+    return {'pivots': used, 'seconds': round(secs, 3), 'max_stderr': float(se.max(initial=0)),
+            'top': [{'node': names[i], 'estimate': float(est[i]), 'stderr': float(se[i])} for i in top]}
+
+def sampled_closeness(indptr, indices, names, comp_size, k, workers, budget, rng):
+    n = len(names)
+    pivots = rng.permutation(n)[:min(k, n)].tolist()
+    res, secs = _run_pivots(_distance_chunk, pivots, indptr, indices, workers, budget)
+    used = sum(r[0] for r in res)
+    sumd = sum(r[1] for r in res); cnt = sum(r[2] for r in res)
+    maxd = max((r[3] for r in res), default=0)
+    avg = np.divide(sumd, cnt, out=np.full(n, np.nan), where=cnt > 0)
+    # Wasserman-Faust scaling, as nx.closeness_centrality does for disconnected graphs
+    est = np.where(avg > 0, (comp_size-1)/(n-1) / np.where(avg > 0, avg, 1), 0.0)
+    est[np.isnan(avg)] = np.nan
+    top = np.argsort(-np.nan_to_num(est, nan=-1))[:TOP]
+    bound = 2*maxd*math.sqrt(math.log(max(n, 2)) / max(used, 1))  # Eppstein-Wang: |avg err| <= eps*Delta w.h.p.
+    return {'pivots': used, 'seconds': round(secs, 3), 'nodes_without_estimate': int(np.isnan(est).sum()),
+            'avg_distance_abs_error_bound': bound,
+            'top': [{'node': names[i], 'estimate': float(est[i])} for i in top]}
+
+def double_sweep_diameter(A, labels, sweeps, budget, rng):
+    """Lower/upper bounds on the diameter of the largest component via repeated BFS double sweeps."""
+    start = time.time()
+    big = np.bincount(labels).argmax()
+    members = np.nonzero(labels == big)[0]
+    lower, upper, done = 0, math.inf, 0
+    for _ in range(sweeps):
+        if done and time.time() - start > budget:
+            break
+        r = int(rng.choice(members))
+        d = csgraph.shortest_path(A, unweighted=True, directed=False, indices=[r])[0]
+        d[~np.isfinite(d)] = -1
+        upper = min(upper, 2*d.max())
+        u = int(d.argmax())
+        d2 = csgraph.shortest_path(A, unweighted=True, directed=False, indices=[u])[0]
+        d2[~np.isfinite(d2)] = -1
+        lower = max(lower, d2.max())
+        done += 1
+    return {'lower_bound': int(lower), 'upper_bound': int(upper), 'exact': bool(lower == upper),
+            'sweeps': done, 'component_nodes': int(len(members)), 'seconds': round(time.time()-start, 3)}
+
+def sampled_clustering(A, k, budget, rng, chunk=2048):
+    """Average local clustering (zeros included, like nx.average_clustering) over sampled nodes."""
+    start = time.time()
+    n = A.shape[0]
+    sample = rng.permutation(n)[:min(k, n)]
+    deg = np.asarray(A.sum(axis=1)).ravel()
+    vals = []
+    for s in range(0, len(sample), chunk):
+        if vals and time.time() - start > budget:
+            break
+        S = sample[s:s+chunk]
+        tri = np.asarray((A[S] @ A).multiply(A[S]).sum(axis=1)).ravel() / 2
+        d = deg[S]
+        vals.append(np.divide(2*tri, d*(d-1), out=np.zeros(len(S)), where=d > 1))
+    vals = np.concatenate(vals) if vals else np.zeros(0)
+    return {'value': float(vals.mean()) if len(vals) else 0.0,
+            'stderr': float(vals.std(ddof=1)/math.sqrt(len(vals))) if len(vals) > 1 else 0.0,
+            'sampled_nodes': int(len(vals)), 'seconds': round(time.time()-start, 3)}
+
+# --- report ---
+def load_arrays(graph_path):
+    """
+    (binary CSR adjacency, weighted CSR adjacency, node names, networkx graph or None); no networkx
+    graph is built when a CSR directory is given.
+    """
+    if is_csr(graph_path):
+        g = CSRGraph(graph_path)
+        return g.adjacency(), g.adjacency(weighted=True), [str(x) for x in g.node_ids], None
+    G = load_graph(graph_path)
+    A, nodes, _ = graph_adjacency(G)
+    W = nx.to_scipy_sparse_array(G, nodelist=nodes, weight='weight', format='csr')
+    return A, sparse.csr_matrix(W), [str(x) for x in nodes], G
+
+def summarize(graph_path, mode='exact', k=256, budget=60.0, workers=1, sweeps=4, seed=42):
+    rng = np.random.default_rng(seed)
+    with profiling.stage("load_arrays"):
+        A, W, names, G = load_arrays(graph_path)
+    n = A.shape[0]; m = int(A.nnz // 2)
+    deg = np.asarray(A.sum(axis=1)).ravel()
+    top_deg = np.argsort(-deg, kind='stable')[:TOP]
+    out = {'graph': graph_path, 'mode': mode, 'nodes': n, 'edges': m,
+           'density': 2*m/(n*(n-1)) if n > 1 else 0.0, 'avg_degree': 2*m/n if n else 0.0,
+           'top_degree': [{'node': names[i], 'value': float(deg[i]/(n-1)) if n > 1 else 0.0} for i in top_deg]}
+    n_comp, labels = csgraph.connected_components(A, directed=False)
+    out['connected_components'] = int(n_comp)
+    if mode == 'exact':
+        G = G if G is not None else load_graph(graph_path)
+        t = time.time(); out['avg_clustering'] = {'value': nx.average_clustering(G), 'seconds': round(time.time()-t, 3)}
+        t = time.time()
+        sub = G if nx.is_connected(G) else G.subgraph(max(nx.connected_components(G), key=len))
+        out['diameter'] = {'value': nx.diameter(sub), 'largest_component_only': sub is not G, 'seconds': round(time.time()-t, 3)}
+        t = time.time(); bc = cached(graph_path, "betweenness", {'exact': True}, lambda: nx.betweenness_centrality(G))
+        out['betweenness'] = {'seconds': round(time.time()-t, 3),
+                              'top': [{'node': u, 'value': v} for u, v in sorted(bc.items(), key=lambda x: x[1], reverse=True)[:TOP]]}
+        t = time.time(); cc = cached(graph_path, "closeness", {'exact': True}, lambda: nx.closeness_centrality(G))
+        out['closeness'] = {'seconds': round(time.time()-t, 3),
+                            'top': [{'node': u, 'value': v} for u, v in sorted(cc.items(), key=lambda x: x[1], reverse=True)[:TOP]]}
+    else:
+        indptr = np.asarray(A.indptr, dtype=np.int64); indices = np.asarray(A.indices, dtype=np.int64)
+        comp_size = np.bincount(labels)[labels]
+        with profiling.stage("clustering"):
+            out['avg_clustering'] = sampled_clustering(A, k*16, budget, rng)
+        with profiling.stage("diameter"):
+            out['diameter'] = double_sweep_diameter(A, labels, sweeps, budget, rng)
+        with profiling.stage("betweenness", k=k, workers=workers):
+            out['betweenness'] = sampled_betweenness(indptr, indices, names, k, workers, budget, rng)
+        with profiling.stage("closeness", k=k, workers=workers):
+            out['closeness'] = sampled_closeness(indptr, indices, names, comp_size, k, workers, budget, rng)
+        t = time.time()
+        with profiling.stage("communities"):
+            community, lp_sweeps = cached(graph_path, "label_propagation", {'seed': seed, 'budget': budget},
+                                          lambda: label_propagation(W, seed=seed, budget=budget))
+        out['communities'] = {'method': 'label_propagation', 'count': int(community.max()+1) if n else 0,
+                              'modularity': sparse_modularity(W, community) if n else 0.0, 'sweeps': lp_sweeps,
+                              'seconds': round(time.time()-t, 3)}
+        return out
+    t = time.time()
+    with profiling.stage("communities"):
+        communities = cached(graph_path, "communities", {'method': 'louvain', 'seed': seed}, lambda: detect_communities(G, seed=seed))
+    out['communities'] = {'method': 'louvain', 'count': len(communities), 'modularity': modularity(G, communities),
+                          'seconds': round(time.time()-t, 3)}
+    return out
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--graph", default="data/dataset/multimodal_graph.gpickle", help="gpickle or .csr directory")
+    p.add_argument("--mode", choices=['exact', 'scalable'], default='exact')
+    p.add_argument("--k", type=int, default=256, help="pivots for sampled betweenness/closeness")
+    p.add_argument("--budget", type=float, default=60.0, help="seconds per metric (scalable mode)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--sweeps", type=int, default=4, help="double sweeps for the diameter bounds")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", default=None, help="write JSON here instead of stdout")
+    profiling.add_trace_arg(p)
+    args = p.parse_args(argv)
+    profiling.init(args.trace, "graph_metrics_summary", args.trace_top)
+    report = summarize(args.graph, args.mode, args.k, args.budget, args.workers, args.sweeps, args.seed)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print("Wrote", args.out)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
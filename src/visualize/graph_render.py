@@ -0,0 +1,108 @@
+# src/visualize/graph_render.py
+"""
+Rendering helpers shared by community_viz.py and community_influence_viz.py.
+
+- headless output: passing an --out path (.png / .svg / .pdf) switches matplotlib to Agg and saves
+  the figure instead of opening a window
+- multilevel layout: lay out the community quotient graph first, then each community around
+  its centre (spring layout for communities up to `max_spring` nodes; beyond that a spring layout
+  of the `max_spring` best-connected members, with every other node placed breadth-first at the
+  centroid of its placed neighbours), so cost grows with the largest community instead of
+  O(n^2) over the whole graph
+- level of detail: collapse every community into one super-node sized by member count
+"""
+import math
+import numpy as np
+import networkx as nx
+
+def setup_backend(out):
+    """Select the non-interactive backend before pyplot is imported when rendering to a file."""
+    import matplotlib
+    if out:
+        matplotlib.use("Agg")
+
+def community_graph(G, communities):
+    """Quotient graph: one node per community (attr size), edge weight = number of inter-community edges."""
+    cmap = {n: i for i, c in enumerate(communities) for n in c}
+    Q = nx.Graph()
+    Q.add_nodes_from((i, {'size': len(c)}) for i, c in enumerate(communities))
+    for a, b in G.edges():
+        ca, cb = cmap.get(a), cmap.get(b)
+        if ca is None or cb is None or ca == cb:
+            continue
+        w = Q[ca][cb]['weight'] + 1 if Q.has_edge(ca, cb) else 1
+        Q.add_edge(ca, cb, weight=w)
+    return Q
+
+def sampled_spring_layout(H, seed=42, max_spring=500):
+    """Spring layout of the max_spring highest-degree nodes of H; the others go breadth-first to the
+    centroid of their already placed neighbours (plus a little jitter), or a seeded disk if unreachable."""
+    rng = np.random.default_rng(seed)
+    anchors = sorted(H.nodes(), key=H.degree, reverse=True)[:max_spring]
+    pos = nx.spring_layout(H.subgraph(anchors), seed=seed)
+    jitter = 0.5 / math.sqrt(len(anchors))
+    frontier = anchors
+    while frontier:
+        level = list(dict.fromkeys(v for u in frontier for v in H[u] if v not in pos))
+        placed = [np.mean([pos[w] for w in H[v] if w in pos], axis=0) for v in level]
+        for v, p, d in zip(level, placed, rng.normal(scale=jitter, size=(len(level), 2))):
+            pos[v] = p + d
+        frontier = level
+    rest = [n for n in H if n not in pos]
+    if rest:
+        r = np.sqrt(rng.random(len(rest))); th = rng.random(len(rest)) * 2 * math.pi
+        pos.update(zip(rest, np.column_stack([r * np.cos(th), r * np.sin(th)])))
+    return pos
+
+def multilevel_layout(G, communities, seed=42, max_spring=500):
+    Q = community_graph(G, communities)
+    centres = nx.spring_layout(Q, weight='weight', seed=seed, k=2/math.sqrt(max(len(Q), 1))) if len(Q) > 1 else {0: np.zeros(2)}
+    total = max(sum(len(c) for c in communities), 1)
+    pos = {}
+    for i, c in enumerate(communities):
+        radius = 0.5 * math.sqrt(len(c) / total)
+        members = list(c)
+        if len(members) == 1:
+            pts = np.zeros((1, 2))
+        else:
+            H = G.subgraph(members)
+            local = nx.spring_layout(H, seed=seed) if len(members) <= max_spring else sampled_spring_layout(H, seed, max_spring)
+            pts = np.array([local[n] for n in members])
+        pts = pts / max(np.abs(pts).max(), 1e-9) * radius
+        for n, p in zip(members, pts):
+            pos[n] = np.asarray(centres[i]) + p
+    # nodes outside any community (should not happen) go to the origin
+    for n in G.nodes():
+        pos.setdefault(n, np.zeros(2))
+    return pos
+
+def compute_layout(G, communities, method='multilevel', seed=42, k=None):
+    if method == 'spring':
+        return nx.spring_layout(G, k=k, seed=seed)
+    return multilevel_layout(G, communities, seed=seed)
+
+def draw_lod(G, communities, ax, seed=42, label_top=10):
+    """Draw only community super-nodes sized by member count, coloured like the full view."""
+    import matplotlib.pyplot as plt
+    Q = community_graph(G, communities)
+    pos = nx.spring_layout(Q, weight='weight', seed=seed) if len(Q) > 1 else {0: np.zeros(2)}
+    sizes = np.array([Q.nodes[i]['size'] for i in Q.nodes()], dtype=float)
+    weights = np.array([d['weight'] for _, _, d in Q.edges(data=True)], dtype=float)
+    nx.draw_networkx_nodes(Q, pos, ax=ax, node_size=60 + 3000 * sizes / sizes.max(),
+                           node_color=list(Q.nodes()), cmap=plt.cm.tab20, alpha=0.85)
+    if len(weights):
+        nx.draw_networkx_edges(Q, pos, ax=ax, width=0.5 + 4 * weights / weights.max(), alpha=0.3)
+    biggest = sorted(Q.nodes(), key=lambda i: -Q.nodes[i]['size'])[:label_top]
+    nx.draw_networkx_labels(Q, pos, ax=ax, labels={i: f"C{i}\n{Q.nodes[i]['size']}" for i in biggest}, font_size=7)
+    return Q
+
+def finish(out, dpi=150):
+    import matplotlib.pyplot as plt
+    plt.axis("off")
+    plt.tight_layout()
+    if out:
+        plt.savefig(out, dpi=dpi)
+        plt.close()
+        print("Saved", out)
+    else:
+        plt.show()
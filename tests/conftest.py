@@ -0,0 +1,59 @@
+import os, sys, types
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+def _fake_face_locations(img, number_of_times_to_upsample=1, model='hog'):
+    # 0-2 deterministic boxes depending on the pixels, so every image gets its own answer
+    h, w = img.shape[:2]
+    n = int(img.mean()) % 3
+    return [(0, w // 2, h // 2, 0), (h // 2, w, h, w // 2)][:n]
+
+
+def _fake_face_encodings(img, known_face_locations=None, num_jitters=1, model='small'):
+    locs = known_face_locations if known_face_locations is not None else _fake_face_locations(img)
+    return [np.resize(img[t:b, l:r].mean(axis=(0, 1)) / 255.0, 128) for t, r, b, l in locs]
+
+
+class _FakeYOLO:
+    def __init__(self, weights):
+        pass
+
+    def predict(self, source=None, **kw):
+        m = int(np.asarray(Image.open(source).convert('L')).mean())
+        boxes = types.SimpleNamespace(data=np.array([[0, 0, 10, 10, 0.9, m % 5], [0, 0, 5, 5, 0.8, 0]]))
+        return [types.SimpleNamespace(boxes=boxes)]
+
+
+@pytest.fixture
+def fake_cv(monkeypatch):
+    """Deterministic stand-ins for face_recognition, pytesseract and ultralytics (not needed to be installed)."""
+    face_recognition = types.ModuleType("face_recognition")
+    face_recognition.load_image_file = lambda p: np.asarray(Image.open(p).convert('RGB'))
+    face_recognition.face_locations = _fake_face_locations
+    face_recognition.face_encodings = _fake_face_encodings
+    pytesseract = types.ModuleType("pytesseract")
+    pytesseract.image_to_string = lambda im: f"text {im.size[0]}x{im.size[1]}"
+    ultralytics = types.ModuleType("ultralytics")
+    ultralytics.YOLO = _FakeYOLO
+    for m in (face_recognition, pytesseract, ultralytics):
+        monkeypatch.setitem(sys.modules, m.__name__, m)
+
+
+@pytest.fixture
+def make_images(tmp_path):
+    """make_images(n) writes n random RGB PNGs under tmp_path/images and returns their paths."""
+    def make(n, seed=0, size=(96, 64)):
+        rng = np.random.default_rng(seed)
+        directory = tmp_path / "images"
+        directory.mkdir(exist_ok=True)
+        paths = []
+        for i in range(n):
+            path = str(directory / f"{i}.png")
+            Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)).save(path)
+            paths.append(path)
+        return paths
+    return make
@@ -0,0 +1,73 @@
+import pickle
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from data.build_graph import build, coappearance_counts
+
+
+def _reference_build(meta_csv, faces_csv):
+    """The original row-by-row build (before the vectorized co-appearance step)."""
+    meta = pd.read_csv(meta_csv)
+    G = nx.Graph()
+    meta['user_anon'] = meta['owner'].apply(lambda x: f"user_{abs(hash(str(x)))%1000000}")
+    for _, r in meta.iterrows():
+        uid, iname = r['user_anon'], f"img_{r['id']}"
+        G.add_node(uid, type='user')
+        G.add_node(iname, type='image', file=r.get('file'), title=r.get('title'))
+        G.add_edge(uid, iname, type='posted')
+    faces = pd.read_csv(faces_csv)
+    for _, fr in faces.iterrows():
+        person_node = f"person_{int(fr['cluster'])}"
+        G.add_node(person_node, type='person_cluster')
+        img_node = f"img_{fr['img_id']}"
+        if G.has_node(img_node):
+            G.add_edge(img_node, person_node, type='contains')
+    for cluster, imgs in faces.groupby('cluster')['img_id'].apply(list).to_dict().items():
+        users = set()
+        for iid in imgs:
+            rows = meta[meta['id'] == int(iid)]
+            if len(rows) > 0:
+                users.add(rows.iloc[0]['user_anon'])
+        users = list(users)
+        for i in range(len(users)):
+            for j in range(i+1, len(users)):
+                if G.has_edge(users[i], users[j]):
+                    G[users[i]][users[j]]['weight'] = G[users[i]][users[j]].get('weight', 0)+1
+                else:
+                    G.add_edge(users[i], users[j], weight=1, type='coappearance')
+    return G
+
+
+def _edges(G, drop=()):
+    return {(frozenset((a, b)), tuple(sorted((k, v) for k, v in d.items() if k not in drop))) for a, b, d in G.edges(data=True)}
+
+
+def test_graph_matches_reference_build(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 400
+    meta_csv, faces_csv, cv_csv = tmp_path / "metadata.csv", tmp_path / "face_clusters.csv", tmp_path / "cv.csv"
+    pd.DataFrame({'id': range(n), 'file': [f"images/{i}.jpg" for i in range(n)], 'title': [f"t{i}" for i in range(n)],
+                  'owner': [f"owner_{u}" for u in rng.integers(0, 60, n)]}).to_csv(meta_csv, index=False)
+    # one face per image, a few images with the same cluster twice, some faces of images not in metadata
+    img_ids = np.concatenate([rng.choice(n, 300, replace=False), rng.choice(n, 20), [n + 1, n + 2]])
+    pd.DataFrame({'img_id': img_ids, 'cluster': rng.integers(0, 40, len(img_ids))}).to_csv(faces_csv, index=False)
+    out = tmp_path / "g.gpickle"
+
+    build(str(meta_csv), str(cv_csv), str(faces_csv), str(out))
+    with open(out, "rb") as f:
+        G = pickle.load(f)
+    ref = _reference_build(meta_csv, faces_csv)
+
+    assert list(G.nodes(data=True)) == list(ref.nodes(data=True))
+    assert _edges(G, drop=('face',)) == _edges(ref)
+    assert any(d.get('type') == 'coappearance' and d['weight'] > 1 for *_, d in G.edges(data=True))
+
+
+def test_coappearance_counts_with_string_image_ids():
+    owner = pd.Series({'a/b/c': 'user_1', 'a/b/d': 'user_2', 'x': 'user_3', 7: 'user_4'})
+    faces = pd.DataFrame({'img_id': ['a/b/c', 'a/b/d', 'x', 'a/b/c', '7', 'missing'], 'cluster': [0, 0, 0, 1, 1, 1]})
+    ua, ub, w = coappearance_counts(faces, owner)
+    assert {(a, b, int(x)) for a, b, x in zip(ua, ub, w)} == {
+        ('user_1', 'user_2', 1), ('user_1', 'user_3', 1), ('user_2', 'user_3', 1), ('user_1', 'user_4', 1)}
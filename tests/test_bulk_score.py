@@ -0,0 +1,69 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from data.graph_csr import save_csr
+from models import bulk_score
+from models.candidates import load_graph_arrays
+from models.link_prediction_baseline import save_model
+from models.pair_features import pair_features
+
+
+def _graph(path, n_users=60, seed=2):
+    rng = np.random.default_rng(seed)
+    G = nx.Graph()
+    for u in range(n_users):
+        G.add_node(f"user_{u}", type='user')
+        for i in range(int(rng.integers(1, 4))):
+            G.add_node(f"img_{u}_{i}", type='image')
+            G.add_edge(f"user_{u}", f"img_{u}_{i}", type='posted')
+    for a, b in rng.integers(0, n_users, (150, 2)):
+        if a != b:
+            G.add_edge(f"user_{a}", f"user_{b}", type='coappearance', weight=1)
+    save_csr(G, path)
+    return path
+
+
+def test_bulk_top_k_matches_exhaustive_scoring(tmp_path):
+    graph = _graph(str(tmp_path / "g.csr"))
+    A, names, types = load_graph_arrays(graph)
+    users = np.nonzero(types == 'user')[0]
+    rng = np.random.default_rng(0)
+    pairs = rng.choice(users, (400, 2))
+    X = pair_features(A, pairs[:, 0], pairs[:, 1])
+    clf = LogisticRegression().fit(X, (X[:, 0] + rng.normal(0, 0.5, len(X))) > 0.5)
+    save_model(clf, str(tmp_path / "m.joblib"))
+
+    out = str(tmp_path / "bulk.csv")
+    bulk_score.run(graph, str(tmp_path / "m.joblib"), out, k=5, tile=7)  # tiles that do not divide the user count
+    got = pd.read_csv(out)
+    U = A[users][:, users].tocsr()
+    for p, u in enumerate(users):
+        linked = set(U.indices[U.indptr[p]:U.indptr[p+1]].tolist()) | {p}
+        cand = np.array([q for q in range(len(users)) if q not in linked])
+        scores = clf.predict_proba(pair_features(A, np.full(len(cand), u), users[cand]))[:, 1]
+        expected = np.sort(scores)[::-1][:5]
+        mine = got[got['user'] == names[u]].sort_values('rank')
+        np.testing.assert_allclose(mine['score'], expected, atol=1e-6)
+        assert set(mine['candidate']) <= {names[users[q]] for q in cand}
+
+
+def test_int8_variant_stays_close_to_fp32(tmp_path):
+    torch = pytest.importorskip("torch")
+    from models.gnn_modules import LinkMLP, MultimodalSAGE
+    from models.train_gnn_lite import save_model as save_gnn
+    graph = _graph(str(tmp_path / "g.csr"))
+    arrays = load_graph_arrays(graph)
+    A, names, types = arrays
+    users = np.nonzero(types == 'user')[0]
+    torch.manual_seed(0)
+    H = np.random.default_rng(1).normal(size=(len(users), 16)).astype('float32')
+    model = MultimodalSAGE({'user': 1, 'image': 4, 'person_cluster': 4}, hid=16, layers=1)
+    save_gnn(str(tmp_path / "gnn.pt"), model, LinkMLP(in_dim=16, hid=16), names[users], H, (5,))
+
+    cols = np.arange(len(users))
+    cmp = bulk_score.compare_variant(str(tmp_path / "gnn.pt"), arrays, 'int8', cols[:20], cols, k=5, tile=8)
+    assert cmp['pairs'] == 20 * len(users)
+    assert cmp['max_abs_delta'] < 0.02 and cmp['topk_overlap'] >= 0.8
@@ -0,0 +1,16 @@
+import numpy as np
+
+from models.candidates import IVFIndex, _normalize
+
+
+def test_ivf_recall_against_exhaustive_search():
+    rng = np.random.default_rng(7)
+    centres = rng.normal(size=(40, 32))
+    X = _normalize((centres[rng.integers(0, 40, 4000)] + 0.3 * rng.normal(size=(4000, 32))).astype(np.float32))
+    ivf = IVFIndex(X, *IVFIndex.train(X, seed=0))
+    k, queries = 10, rng.choice(len(X), 100, replace=False)
+    exact = [set(np.argsort(-(X @ X[q]))[:k].tolist()) for q in queries]
+    recall = np.mean([len(set(ivf.search(X[q], k, n_probe=8)[0].tolist()) & e) / k for q, e in zip(queries, exact)])
+    assert recall >= 0.95
+    rows, sims = ivf.search(X[queries[0]], k, n_probe=len(ivf.centroids))  # probing every list is exhaustive
+    assert set(rows.tolist()) == exact[0] and np.all(np.diff(sims) <= 0)
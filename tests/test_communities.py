@@ -0,0 +1,20 @@
+import networkx as nx
+
+from analysis.communities import community_map, detect_communities, modularity
+
+
+def _graph():
+    G = nx.relaxed_caveman_graph(15, 12, 0.15, seed=4)
+    for a, b in G.edges():
+        G[a][b]['weight'] = 1 + (a * b) % 3
+    return G
+
+
+def test_louvain_is_deterministic_and_ordered():
+    G = _graph()
+    first = detect_communities(G, seed=42)
+    assert detect_communities(G.copy(), seed=42) == first
+    assert detect_communities(G, seed=42) == first
+    assert [len(c) for c in first] == sorted((len(c) for c in first), reverse=True)
+    assert set(community_map(first)) == set(G) and sum(map(len, first)) == len(G)
+    assert modularity(G, first) > 0.6
@@ -0,0 +1,33 @@
+import pandas as pd
+
+from data import preprocess_cv_lite
+from data.cv_manifest import CVManifest
+
+
+def _run(tmp_path, paths, monkeypatch):
+    """Preprocess the images in paths; returns the ids process_image ran on."""
+    ran = []
+    process_image = preprocess_cv_lite.process_image
+    def counting(r, prev=None):
+        ran.append(r['id'])
+        return process_image(r, prev)
+    monkeypatch.setattr(preprocess_cv_lite, "process_image", counting)
+    meta_csv = str(tmp_path / "metadata.csv")
+    pd.DataFrame({'id': range(len(paths)), 'file': paths}).to_csv(meta_csv, index=False)
+    preprocess_cv_lite.process(meta_csv, str(tmp_path / "out"))
+    return ran
+
+
+def test_resume_skips_done_images_until_the_version_changes(tmp_path, fake_cv, make_images, monkeypatch):
+    paths = make_images(10)
+    assert _run(tmp_path, paths[:6], monkeypatch) == list(range(6))  # a run cut short after 6 images
+    assert _run(tmp_path, paths, monkeypatch) == [6, 7, 8, 9]       # resumes with the rest
+    assert _run(tmp_path, paths, monkeypatch) == []
+    cv = pd.read_csv(tmp_path / "out" / "cv_metadata_lite.csv")
+    assert cv['id'].tolist() == list(range(10))
+
+    monkeypatch.setattr(preprocess_cv_lite, "PIPELINE_VERSION", "cv-lite-test")
+    assert _run(tmp_path, paths, monkeypatch) == list(range(10))
+    manifest = CVManifest(str(tmp_path / "out" / "cv_manifest.sqlite"))
+    assert {manifest.get(i)['version'] for i in range(10)} == {"cv-lite-test"}
+    manifest.close()
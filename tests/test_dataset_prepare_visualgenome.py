@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from data.dataset_prepare_visualgenome import iter_json_array, local_ids
+
+
+@pytest.mark.parametrize("read_size", range(1, 24))
+def test_iter_json_array_across_chunk_boundaries(tmp_path, read_size):
+    items = [1, 22222, 3, -1.5e10, "a, b", {"image_id": 7, "url": "u"}, None, True, [], [1, [2]]]
+    path = tmp_path / "image_data.json"
+    path.write_text(json.dumps(items))
+    assert list(iter_json_array(str(path), read_size)) == items
+
+
+def test_iter_json_array_truncated(tmp_path):
+    path = tmp_path / "image_data.json"
+    path.write_text("[1, 22")
+    with pytest.raises(ValueError):
+        list(iter_json_array(str(path), 3))
+
+
+def test_local_ids_do_not_collide():
+    paths = ["/r/a_b/c.jpg", "/r/a/b_c.jpg", "/r/x.jpg", "/r/x.png", "/r/y.png.jpg", "/r/y.png", "/r/z.jpg"]
+    ids = local_ids(paths, "/r")
+    assert ids == ["a_b/c", "a/b_c", "x.jpg", "x.png", "y.png.jpg", "y", "z"]
+    assert len(set(ids)) == len(ids)
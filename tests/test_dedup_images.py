@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from data.dedup_images import dedup, find_duplicates, load_dedup_map
+from data.embedding_store import EmbeddingStore
+from data.preprocess_cv_lite import process
+
+
+def _smooth(rng, size=(320, 240)):
+    """A smooth random picture (upscaled 8x6 noise): its dHash survives resizing and re-encoding."""
+    small = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    return Image.fromarray(small).resize(size, Image.BICUBIC)
+
+
+def _corpus(tmp_path, n_copies=30, n_unique=10):
+    """Image 0, then n_copies re-encoded/resized/brightened copies of it, then n_unique other images."""
+    rng = np.random.default_rng(0)
+    base = _smooth(rng)
+    d = tmp_path / "images"
+    d.mkdir()
+    paths = [str(d / "0.png")]
+    base.save(paths[0])
+    for i in range(1, n_copies + 1):
+        im = base.resize((320 - 4*i, 240 - 3*i)) if i % 3 == 0 else base
+        if i % 3 == 1:
+            im = Image.fromarray(np.clip(np.asarray(base, dtype=np.int16) + i, 0, 255).astype(np.uint8))
+        paths.append(str(d / f"{i}.jpg"))
+        im.save(paths[-1], quality=40 + i)
+    for i in range(n_copies + 1, n_copies + 1 + n_unique):
+        paths.append(str(d / f"{i}.png"))
+        _smooth(rng).save(paths[-1])
+    meta_csv = tmp_path / "metadata.csv"
+    pd.DataFrame({'id': range(len(paths)), 'file': paths, 'owner': [f"o{i % 7}" for i in range(len(paths))]}
+                 ).to_csv(meta_csv, index=False)
+    return str(meta_csv), len(paths)
+
+
+def test_thirty_copies_map_to_one_canonical(tmp_path):
+    meta_csv, n = _corpus(tmp_path)
+    df = dedup(meta_csv, str(tmp_path / "dedup_map.csv"))
+    assert len(df) == n
+    canonical_of = load_dedup_map(str(tmp_path / "dedup_map.csv"))
+    assert canonical_of == {str(i): "0" for i in range(1, 31)}
+
+
+def test_duplicates_reuse_canonical_results(tmp_path, fake_cv, capsys):
+    meta_csv, n = _corpus(tmp_path)
+    dedup_csv = str(tmp_path / "dedup_map.csv")
+    dedup(meta_csv, dedup_csv)
+    out = tmp_path / "out"
+    process(meta_csv, str(out), dedup_csv=dedup_csv)
+    assert f"processing {n - 30}, 30 duplicates reuse their canonical image" in capsys.readouterr().out
+
+    cv = pd.read_csv(out / "cv_metadata_lite.csv").set_index('id')
+    assert len(cv) == n
+    copies = cv.loc[1:30, ['num_faces', 'yolo_labels', 'ocr']]
+    assert (copies == cv.loc[0, ['num_faces', 'yolo_labels', 'ocr']]).all().all()
+    vis = EmbeddingStore(str(out / "embeddings"), 'vis')
+    for i in range(1, 31):
+        np.testing.assert_array_equal(vis.get(str(i)), vis.get("0"))
+
+
+def test_hamming_index_matches_brute_force():
+    rng = np.random.default_rng(1)
+    hashes = [int(x) for x in rng.integers(0, 2**63, 300, dtype=np.int64)]
+    # near copies: flip up to 5 bits of earlier hashes
+    for _ in range(200):
+        h = hashes[rng.integers(len(hashes))]
+        for b in rng.choice(64, rng.integers(0, 6), replace=False):
+            h ^= 1 << int(b)
+        hashes.append(h)
+    ids = [str(i) for i in range(len(hashes))]
+    got = find_duplicates(ids, hashes, max_dist=4)
+    canon = []
+    for i, h in enumerate(hashes):
+        best = min(((bin(h ^ hashes[j]).count('1'), j) for j in canon), default=None)
+        if best is None or best[0] > 4:
+            canon.append(i)
+            assert got[i] == (ids[i], ids[i], 0)
+        else:
+            assert got[i] == (ids[i], ids[best[1]], best[0])
@@ -0,0 +1,73 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+from data.download_images_from_urls import download
+
+BODY = os.urandom(200_000)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """/ok/<n>: an image body; /flaky/<n>: 503 on the first request, then the body; /missing/<n>: 404."""
+    hits = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            n = self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        if self.path.startswith("/missing/") or (self.path.startswith("/flaky/") and n == 1):
+            self.send_response(404 if self.path.startswith("/missing/") else 503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    _Handler.hits = {}
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _csv(tmp_path, urls):
+    path = tmp_path / "urls.csv"
+    pd.DataFrame({'id': range(len(urls)), 'url': urls}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_download_against_local_server(tmp_path, server):
+    urls = [f"{server}/ok/{i}" for i in range(20)] + [f"{server}/flaky/0", f"{server}/missing/0"]
+    out = tmp_path / "images"
+    summary = download(_csv(tmp_path, urls), str(out), workers=4, retries=2, backoff=0.01)
+
+    assert summary['ok'] == 21 and summary['failed'] == 1 and summary['existing'] == 0
+    assert summary['bytes'] == 21 * len(BODY)
+    assert summary['failures'] == [(f"{server}/missing/0", "HTTP 404")]
+    assert _Handler.hits["/flaky/0"] == 2 and _Handler.hits["/missing/0"] == 1  # 404 is not retried
+    files = sorted(os.listdir(out))
+    assert files == sorted(f"{i}.jpg" for i in range(21))  # no .part files left behind
+    assert all((out / f).read_bytes() == BODY for f in files)
+
+    again = download(_csv(tmp_path, urls[:21]), str(out), workers=4)
+    assert again['existing'] == 21 and again['ok'] == 0
+
+
+def test_download_stops_at_max(tmp_path, server):
+    urls = [f"{server}/ok/{i}" for i in range(30)]
+    summary = download(_csv(tmp_path, urls), str(tmp_path / "images"), max_images=5, workers=4)
+    assert summary['ok'] == 5 and len(os.listdir(tmp_path / "images")) == 5
@@ -0,0 +1,43 @@
+import joblib
+import numpy as np
+
+from data.embedding_store import EmbeddingStore, open_store
+
+
+def test_flushes_append_to_the_open_shard(tmp_path):
+    rng = np.random.default_rng(0)
+    store, ref = EmbeddingStore(str(tmp_path), 'vis', shard_size=100), {}
+    for b in range(37):  # a checkpoint every 7 vectors
+        for i in range(7):
+            ref[f"{b}_{i}"] = rng.random(16, dtype=np.float32)
+            store.add(f"{b}_{i}", ref[f"{b}_{i}"])
+        store.flush()
+        if b == 3:
+            early = EmbeddingStore(str(tmp_path), 'vis')
+            view, snapshot = early.matrix()[1], np.array(early.matrix()[1])
+    assert sorted(p.name for p in tmp_path.glob("vis_*.npy")) == ["vis_00000.npy", "vis_00001.npy", "vis_00002.npy"]
+    reopened = EmbeddingStore(str(tmp_path), 'vis')
+    assert len(reopened) == len(ref)
+    for k, v in ref.items():
+        np.testing.assert_array_equal(reopened.get(k), v)
+    np.testing.assert_array_equal(view, snapshot)  # a reader's earlier memmap is unaffected
+
+
+def test_partial_last_index_line_is_skipped_and_cut(tmp_path):
+    store = EmbeddingStore(str(tmp_path), 'face')
+    store.add("a", np.ones(4)); store.flush()
+    with open(store.index_path, 'a') as f:
+        f.write("b,0")  # interrupted append
+    store = EmbeddingStore(str(tmp_path), 'face')
+    assert store.ids() == ["a"]
+    store.add("c", np.zeros(4)); store.flush()
+    store = EmbeddingStore(str(tmp_path), 'face')
+    assert store.ids() == ["a", "c"] and store.get("c").sum() == 0
+
+
+def test_open_store_imports_legacy_pickles(tmp_path):
+    for i in range(3):
+        joblib.dump(np.full(8, i, dtype=np.float32), tmp_path / f"{i}_vis.pkl")
+    store = open_store(str(tmp_path), 'vis')
+    assert len(store) == 3 and store.get("2")[0] == 2
+    assert len(open_store(str(tmp_path), 'vis')) == 3
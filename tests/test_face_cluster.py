@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+from sklearn.cluster import DBSCAN
+from sklearn.metrics import adjusted_rand_score
+
+from data.embedding_store import EmbeddingStore, face_key
+from data.face_cluster import EPS, assign_incremental, cluster
+
+
+def _faces(n, seed=0, centres=30):
+    rng = np.random.default_rng(seed)
+    C = rng.normal(0, 0.15, (centres, 128))
+    return (C[rng.integers(0, centres, n)] + rng.normal(0, 0.025, (n, 128))).astype('float32')
+
+
+def _dbscan(X):
+    return DBSCAN(eps=EPS, min_samples=1).fit(X).labels_
+
+
+def test_incremental_from_empty_state_equals_dbscan():
+    X = _faces(500)
+    labels, remap = assign_incremental(np.zeros((0, 128), 'float32'), [], X)
+    assert remap == {}
+    np.testing.assert_array_equal(labels, _dbscan(X))
+
+
+def _write(tmp_path, X, n_img):
+    """Face k of image i is X[k*n_img + i]; returns X in the order faces are loaded (by image, then face)."""
+    store = EmbeddingStore(str(tmp_path / "embeddings"), 'face')
+    for i, v in enumerate(X):
+        store.add(face_key(i % n_img, i // n_img), v)
+    store.flush()
+    pd.DataFrame({'id': range(n_img)}).to_csv(tmp_path / "metadata.csv", index=False)
+    n_faces = len(X) // n_img
+    return X[[k*n_img + i for i in range(n_img) for k in range(n_faces)]]
+
+
+def _labels(df):
+    return df.sort_values(['img_id', 'face'])['cluster'].to_numpy()
+
+
+def test_rebuild_and_incremental_runs_match_dbscan(tmp_path):
+    X = _faces(600, seed=1)
+    emb, meta, out = str(tmp_path / "embeddings"), str(tmp_path / "metadata.csv"), str(tmp_path / "face_clusters.csv")
+    loaded = _write(tmp_path, X[:400], 200)  # faces 0 and 1 of 200 images
+    cluster(emb, meta, out, rebuild=True)
+    first = pd.read_csv(out)
+    np.testing.assert_array_equal(_labels(first), _dbscan(loaded))
+
+    loaded = _write(tmp_path, X, 200)  # a third face per image
+    cluster(emb, meta, out)
+    second = pd.read_csv(out)
+    assert len(second) == 600
+    # existing faces keep their ids unless a new face bridged their cluster into another one
+    kept = second.merge(first, on=['img_id', 'face'], suffixes=('', '_old'))
+    assert (kept['cluster'] == kept['cluster_old']).mean() > 0.9
+    assert adjusted_rand_score(_labels(second), _dbscan(loaded)) == 1.0
+
+    cluster(emb, meta, out, rebuild=True)
+    np.testing.assert_array_equal(_labels(pd.read_csv(out)), _dbscan(loaded))
+
+
+def test_incremental_run_splits_clusters_that_lost_their_bridge(tmp_path):
+    X = _faces(300, seed=2)
+    # images 0-2 form a chain 0 - 1 - 2 that only image 1 holds together
+    X[:3] = 0
+    X[:3, 0] = [5.0, 5.5, 6.0]
+    emb, meta, out = str(tmp_path / "embeddings"), str(tmp_path / "metadata.csv"), str(tmp_path / "face_clusters.csv")
+    _write(tmp_path, X, 300)
+    cluster(emb, meta, out, rebuild=True)
+    first = pd.read_csv(out)
+    assert first['cluster'][first['img_id'] < 3].nunique() == 1
+
+    pd.DataFrame({'id': [i for i in range(300) if i != 1]}).to_csv(meta, index=False)  # image 1 is removed
+    cluster(emb, meta, out)
+    second = pd.read_csv(out)
+    assert len(second) == 299
+    assert adjusted_rand_score(_labels(second), _dbscan(np.delete(X, 1, axis=0))) == 1.0
+    c = second.set_index('img_id')['cluster']
+    assert c[0] != c[2]
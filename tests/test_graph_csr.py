@@ -0,0 +1,56 @@
+import networkx as nx
+import numpy as np
+
+from data.graph_csr import CSRGraph, is_csr, read_meta, save_csr, to_networkx
+
+
+def _graph():
+    G = nx.Graph()
+    G.add_node("user_1", type='user')
+    G.add_node("img_1", type='image', file="images/1.jpg", title="one")
+    G.add_node("img_2", type='image', file=None, title="two")
+    G.add_node("person_0", type='person_cluster')
+    G.add_node("person_3", type='person_cluster')
+    G.add_node("orphan")  # no attributes at all
+    G.add_edge("user_1", "img_1", type='posted')
+    G.add_edge("user_1", "img_2", type='posted')
+    G.add_edge("img_1", "person_0", type='contains', face=0)
+    G.add_edge("img_1", "person_3", type='contains', face=2)
+    G.add_edge("img_2", "person_3", type='contains', face=1)
+    G.add_edge("user_1", "user_1", weight=2, type='coappearance')  # self loop
+    G.add_edge("orphan", "img_2", weight=0.25)
+    return G
+
+
+def _same(G, H):
+    assert list(G.nodes(data=True)) == list(H.nodes(data=True))
+    key = lambda e: (frozenset(e[:2]), sorted(e[2].items()))
+    assert sorted(map(key, G.edges(data=True)), key=str) == sorted(map(key, H.edges(data=True)), key=str)
+
+
+def test_roundtrip_preserves_node_and_edge_attributes(tmp_path):
+    G, path = _graph(), str(tmp_path / "g.csr")
+    save_csr(G, path)
+    assert is_csr(path)
+    _same(G, to_networkx(path))
+
+    csr = CSRGraph(path)
+    assert csr.num_nodes == 6 and csr.num_edges == G.number_of_edges()
+    assert sorted(csr.neighbors("img_1")) == ["person_0", "person_3", "user_1"]
+    np.testing.assert_array_equal(csr.rows_of_type('image'), [1, 2])
+    A = csr.adjacency(weighted=True)
+    assert A[csr.index["orphan"], csr.index["img_2"]] == 0.25
+    assert A[csr.index["user_1"], csr.index["img_1"]] == 1.0  # no weight attribute counts as 1
+
+
+def test_rewrite_is_a_new_generation(tmp_path):
+    G, path = _graph(), str(tmp_path / "g.csr")
+    save_csr(G, path)
+    old = CSRGraph(path)  # memory-mapped readers of the old generation stay valid
+    G.add_edge("img_2", "person_0", type='contains', face=3)
+    save_csr(G, path)
+    save_csr(G, path)
+    assert read_meta(path)['generation'] == 3
+    _same(G, to_networkx(path))
+    assert sorted(old.neighbors("img_2")) == ["orphan", "person_3", "user_1"]
+    assert not any(f.startswith("indptr.1.") for f in (p.name for p in (tmp_path / "g.csr").iterdir()))
@@ -0,0 +1,38 @@
+import networkx as nx
+import numpy as np
+
+from analysis.communities import sparse_modularity
+from data.graph_csr import save_csr
+from visualize import graph_metrics_summary
+
+
+def _caveman(tmp_path):
+    G = nx.connected_caveman_graph(12, 8)
+    nx.set_edge_attributes(G, 1, 'weight')
+    G = nx.relabel_nodes(G, {n: f"user_{n}" for n in G})
+    nx.set_node_attributes(G, 'user', 'type')
+    path = str(tmp_path / "g.csr")
+    save_csr(G, path)
+    return G, path
+
+
+def test_scalable_mode_never_builds_networkx(tmp_path, monkeypatch):
+    G, path = _caveman(tmp_path)
+    def no_networkx(*a, **kw):
+        raise AssertionError("scalable mode loaded the graph into networkx")
+    monkeypatch.setattr(graph_metrics_summary, "load_graph", no_networkx)
+    out = graph_metrics_summary.summarize(path, mode='scalable', k=16, budget=5, workers=1)
+    assert out['nodes'] == 96 and out['communities']['method'] == 'label_propagation'
+    assert out['communities']['count'] == 12  # one per cave
+    assert out['communities']['modularity'] > 0.8
+
+
+def test_sparse_modularity_matches_networkx():
+    G = nx.les_miserables_graph()
+    nodes = list(G)
+    W = nx.to_scipy_sparse_array(G, nodelist=nodes, weight='weight', format='csr')
+    communities = nx.community.louvain_communities(G, seed=1)
+    labels = np.empty(len(nodes), dtype=int)
+    for c, members in enumerate(communities):
+        labels[[nodes.index(n) for n in members]] = c
+    assert np.isclose(sparse_modularity(W, labels), nx.community.modularity(G, communities))
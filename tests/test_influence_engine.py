@@ -0,0 +1,38 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from analysis.influence_engine import InfluenceEngine
+
+
+def _graph():
+    rng = np.random.default_rng(5)
+    G = nx.Graph()
+    for i in range(60):
+        G.add_node(f"user_{i}", type='user')
+        G.add_node(f"img_{i}", type='image')
+        G.add_edge(f"user_{i}", f"img_{i}", type='posted')
+        G.add_edge(f"img_{i}", f"person_{i % 7}", type='contains')
+    G.add_nodes_from((f"person_{c}" for c in range(7)), type='person_cluster')
+    for _ in range(80):  # some users stay without co-appearance edges (dangling in the user projection)
+        a, b = rng.integers(0, 45, 2)
+        if a != b:
+            G.add_edge(f"user_{a}", f"user_{b}", type='coappearance', weight=int(rng.integers(1, 4)))
+    return G
+
+
+def _vector(engine, pr):
+    return np.array([pr.get(n, 0.0) for n in engine.names])
+
+
+def test_masked_pagerank_matches_networkx_on_the_projection():
+    G = _graph()
+    engine = InfluenceEngine.from_networkx(G)
+    np.testing.assert_allclose(engine.pagerank(), _vector(engine, nx.pagerank(G, tol=1e-12)), atol=1e-7)
+    users = G.subgraph(n for n, d in G.nodes(data=True) if d['type'] == 'user')
+    np.testing.assert_allclose(engine.pagerank(['user']), _vector(engine, nx.pagerank(users, tol=1e-12)), atol=1e-7)
+    seeds = ['user_1', 'user_2', 'img_3']  # the image is outside the projection and ignored
+    expected = nx.pagerank(users, personalization={'user_1': 1, 'user_2': 1}, tol=1e-12)
+    np.testing.assert_allclose(engine.personalized([seeds], ['user'])[:, 0], _vector(engine, expected), atol=1e-7)
+    with pytest.raises(ValueError):
+        engine.pagerank(['usr'])
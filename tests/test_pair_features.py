@@ -0,0 +1,23 @@
+import networkx as nx
+import numpy as np
+
+from models.pair_features import graph_adjacency, pair_features
+
+
+def test_pair_features_match_networkx():
+    G = nx.gnm_random_graph(200, 900, seed=3)
+    G.add_edge(5, 5)  # self loops are not neighbours
+    G.add_nodes_from([1000, 1001])  # isolated: Jaccard 0, no division by zero
+    A, nodes, idx = graph_adjacency(G)
+    rng = np.random.default_rng(0)
+    pairs = [tuple(p) for p in rng.choice(nodes, (300, 2))] + [(1000, 1001), (5, 6)]
+    a = np.array([idx[u] for u, _ in pairs]); b = np.array([idx[v] for _, v in pairs])
+    got = pair_features(A, a, b, batch=64)
+
+    H = G.copy(); H.remove_edges_from(nx.selfloop_edges(H))
+    cn = [len(list(nx.common_neighbors(H, u, v))) for u, v in pairs]
+    pa = [p for _, _, p in nx.preferential_attachment(H, pairs)]
+    jac = [j for _, _, j in nx.jaccard_coefficient(H, pairs)]
+    np.testing.assert_array_equal(got[:, 0], cn)
+    np.testing.assert_array_equal(got[:, 1], pa)
+    np.testing.assert_allclose(got[:, 2], jac)
@@ -0,0 +1,67 @@
+import types
+
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageDraw
+
+from data import preprocess_cv_lite
+from data.preprocess_cv_lite import cascade_config, init_models, process, process_image
+from data.embedding_store import EmbeddingStore
+
+
+def _run(tmp_path, meta_csv, name, **kw):
+    out = tmp_path / name
+    process(meta_csv, str(out), **kw)
+    store = EmbeddingStore(str(out / "embeddings"), 'face')
+    vis = EmbeddingStore(str(out / "embeddings"), 'vis')
+    return (pd.read_csv(out / "cv_metadata_lite.csv"), pd.read_csv(out / "face_boxes.csv"),
+            {k: store.get(k) for k in store.ids()}, {k: vis.get(k) for k in vis.ids()})
+
+
+def test_parallel_output_matches_serial(tmp_path, fake_cv, make_images):
+    paths = make_images(24)
+    meta_csv = str(tmp_path / "metadata.csv")
+    pd.DataFrame({'id': range(len(paths)), 'file': paths, 'owner': 'o'}).to_csv(meta_csv, index=False)
+
+    cv, boxes, faces, vis = _run(tmp_path, meta_csv, "serial")
+    cv_p, boxes_p, faces_p, vis_p = _run(tmp_path, meta_csv, "parallel", workers=3, chunksize=2, checkpoint_every=5)
+
+    assert len(cv) == len(paths) and cv['num_faces'].sum() > 0
+    pd.testing.assert_frame_equal(cv, cv_p)
+    pd.testing.assert_frame_equal(boxes, boxes_p)
+    assert faces.keys() == faces_p.keys() and len(faces) == cv['num_faces'].sum()
+    for k in faces:
+        np.testing.assert_array_equal(faces[k], faces_p[k])
+    assert vis.keys() == vis_p.keys()
+    for k in vis:
+        np.testing.assert_array_equal(vis[k], vis_p[k])
+
+
+
+class _PersonIf:
+    """YOLO stand-in: a 'person' (class 0) box only for images whose file name says so."""
+    def predict(self, source=None, **kw):
+        cls = 0 if 'person' in source else 2
+        return [types.SimpleNamespace(boxes=types.SimpleNamespace(data=np.array([[0, 0, 9, 9, 0.9, cls]])))]
+
+
+def test_cascade_gates_skip_face_and_ocr_without_a_signal(tmp_path, fake_cv, monkeypatch):
+    monkeypatch.setattr(preprocess_cv_lite, "_models", {})
+    cascade = cascade_config(gates=('face', 'ocr'))
+    assert cascade['version'] != cascade_config()['version']  # gated results are not reused by ungated runs
+    init_models(cascade)
+    preprocess_cv_lite._models['yolo'] = _PersonIf()
+    for person in (True, False):
+        for text in (True, False):
+            path = str(tmp_path / f"{'person' if person else 'car'}_{'text' if text else 'plain'}.png")
+            im = Image.new('RGB', (400, 200), 'white' if text else (120, 130, 140))
+            if text:
+                for y in (30, 80, 130):
+                    ImageDraw.Draw(im).text((20, y), "Hello world TEXT line 12345", fill='black')
+            im.save(path)
+            row, face_embs, vis, info = process_image({'id': 1, 'file': path})
+            assert set(info['stages']) == {'face', 'yolo', 'vis', 'ocr'}  # gated stages count as done
+            assert sorted(info['gated']) == sorted(['face'] * (not person) + ['ocr'] * (not text))
+            assert ('face_detect' in info['seconds']) == person and ('ocr' in info['seconds']) == text
+            assert person or (row['num_faces'] == 0 and face_embs == [])
+            assert (row['ocr'] != "") == text
@@ -0,0 +1,33 @@
+import json
+
+from utils import profiling
+
+
+def test_trace_json_structure(tmp_path, monkeypatch):
+    assert profiling.stage("off") is profiling.item("off", 1)  # the shared no-op while tracing is off
+    path = tmp_path / "trace" / "script.trace.json"
+    tracer = profiling.Tracer(str(path), "script", top=2)
+    monkeypatch.setattr(profiling, "_tracer", tracer)
+    with profiling.stage("load", rows=3):
+        for k in range(5):
+            with profiling.item("ocr", f"img_{k}"):
+                pass
+    profiling.add_item("face", "img_9", 1.5)
+    tracer.write()
+
+    trace = json.loads(path.read_text())
+    assert trace['displayTimeUnit'] == 'ms'
+    events = trace['traceEvents']
+    stage = [e for e in events if e.get('cat') == 'stage']
+    assert [(e['name'], e['ph'], e['args']) for e in stage] == [('load', 'X', {'rows': 3})]
+    assert all(e['dur'] >= 0 and e['ts'] >= 0 for e in stage)
+    slow = [e for e in events if e.get('cat') == 'slow_item']
+    assert sorted(e['args']['stage'] for e in slow) == ['face', 'ocr', 'ocr']  # --trace_top 2 per stage
+    assert {'name': 'process_name', 'ph': 'M', 'pid': tracer.pid, 'args': {'name': 'script'}} in events
+
+    summary = trace['otherData']['summary']
+    assert summary['script'] == 'script' and summary['stages']['load']['calls'] == 1
+    ocr = summary['items']['ocr']
+    assert ocr['count'] == 5 and len(ocr['slowest']) == 2
+    assert set(ocr) >= {'total_s', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'items_per_s'}
+    assert summary['items']['face']['slowest'] == [{'key': 'img_9', 'seconds': 1.5}]
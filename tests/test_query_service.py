@@ -0,0 +1,71 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import networkx as nx
+import pytest
+
+from analysis.query_service import GraphServer, GraphState, Handler
+from data.graph_csr import save_csr
+
+
+def _graph(extra_user=False):
+    G = nx.Graph()
+    for u in range(4):
+        G.add_node(f"user_{u}", type='user')
+        G.add_node(f"img_{u}", type='image')
+        G.add_edge(f"user_{u}", f"img_{u}", type='posted')
+    G.add_node("person_0", type='person_cluster')
+    for i in (0, 1, 2):
+        G.add_edge(f"img_{i}", "person_0", type='contains', face=i)
+    G.add_edge("user_0", "user_1", type='coappearance', weight=2)
+    if extra_user:
+        G.add_node("user_9", type='user')
+        G.add_edge("user_9", "user_0", type='coappearance', weight=1)
+    return G
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "g.csr")
+    save_csr(_graph(), path)
+    server = GraphServer(('127.0.0.1', 0), Handler)
+    server.setup_service(lambda: GraphState(path))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, path, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url, method='GET'):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method=method, data=b'' if method == 'POST' else None)) as r:
+            return r.status, json.loads(r.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_endpoints_cache_and_reload(server):
+    srv, path, base = server
+    assert _get(f"{base}/health")[1]['nodes'] == 9
+    assert _get(f"{base}/nodes?type=user")[1]['total'] == 4
+    code, nb = _get(f"{base}/neighbors?node=img_1")
+    assert code == 200 and {(e['node'], e['edge']) for e in nb['neighbors']} == {('user_1', 'posted'), ('person_0', 'contains')}
+    assert [e['face'] for e in nb['neighbors'] if e['node'] == 'person_0'] == [1]
+    code, c = _get(f"{base}/centrality?node=person_0")
+    assert code == 200 and c['rank'] >= 1
+    assert len(_get(f"{base}/top_influencers?k=2&types=user")[1]['top']) == 2
+    assert _get(f"{base}/neighbors?node=nobody")[0] == 404
+    assert _get(f"{base}/nodes?limit=x")[0] == 400
+    assert _get(f"{base}/link_score?a=user_0&b=user_1")[0] == 503  # started without a model
+    assert _get(f"{base}/neighbors?node=img_1")[1] == nb
+    assert _get(f"{base}/health")[1]['cache']['hits'] == 1
+
+    save_csr(_graph(extra_user=True), path)
+    code, r = _get(f"{base}/reload", method='POST')
+    assert code == 200 and r['changed'] and r['nodes'] == 10
+    assert _get(f"{base}/nodes?type=user")[1]['total'] == 5
+    assert [e['node'] for e in _get(f"{base}/neighbors?node=user_9")[1]['neighbors']] == ['user_0']
+    assert _get(f"{base}/health")[1]['cache']['hits'] == 0  # the new state starts with an empty cache
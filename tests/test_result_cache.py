@@ -0,0 +1,31 @@
+import pickle
+
+import networkx as nx
+
+from analysis.result_cache import ResultCache, cached
+
+
+def _save(G, path):
+    with open(path, 'wb') as f:
+        pickle.dump(G, f)
+
+
+def test_cache_hit_and_invalidation_on_graph_change(tmp_path):
+    path = str(tmp_path / "g.gpickle")
+    _save(nx.path_graph(5), path)
+    calls = []
+    def compute():
+        calls.append(1)
+        with open(path, 'rb') as f:
+            return pickle.load(f).number_of_nodes()
+
+    assert cached(path, "nodes", {'x': 1}, compute) == 5
+    assert cached(path, "nodes", {'x': 1}, compute) == 5 and len(calls) == 1  # hit
+    assert ResultCache.for_graph(path).is_valid(path, "nodes", {'x': 1})
+    cached(path, "nodes", {'x': 2}, compute)
+    assert len(calls) == 2  # other parameters, other entry
+
+    _save(nx.path_graph(7), path)  # build_graph rewrote the graph
+    assert not ResultCache.for_graph(path).is_valid(path, "nodes", {'x': 1})
+    assert cached(path, "nodes", {'x': 1}, compute) == 7 and len(calls) == 3
+    assert cached(path, "nodes", {'x': 1}, compute) == 7 and len(calls) == 3
@@ -0,0 +1,32 @@
+import os
+import time
+
+import pandas as pd
+
+from run_pipeline import Stage, run
+from data.embedding_store import open_store
+from data.face_cluster import cluster
+
+
+def test_incremental_stage_output_is_not_stale_after_rerun(tmp_path):
+    # an incremental stage that only writes its output when it is missing
+    script = tmp_path / "incremental.py"
+    out, src = tmp_path / "out.csv", tmp_path / "in.csv"
+    script.write_text(f"import os\nif not os.path.exists({str(out)!r}):\n    open({str(out)!r}, 'w').close()\n")
+    src.write_text("a\n")
+    stage = Stage("inc", str(script), [], inputs=[str(src)], outputs=[str(out)])
+    assert run([stage], str(tmp_path), check='mtime', jobs=1) == {'inc': 'ok'}
+    time.sleep(0.01)
+    os.utime(src)  # the input changes; the stage runs again but leaves out.csv as it was
+    assert run([stage], str(tmp_path), check='mtime', jobs=1) == {'inc': 'ok'}
+    assert run([stage], str(tmp_path), check='mtime', jobs=1) == {'inc': 'skipped'}
+
+
+def test_no_faces_still_writes_stage_outputs(tmp_path):
+    emb, meta = tmp_path / "embeddings", tmp_path / "metadata.csv"
+    pd.DataFrame({'id': [1, 2], 'file': ['a.jpg', 'b.jpg']}).to_csv(meta, index=False)
+    open_store(str(emb), 'face').flush()
+    assert (emb / "face_index.csv").read_text().strip() == "id,shard,row"
+    cluster(str(emb), str(meta), str(tmp_path / "face_clusters.csv"))
+    faces = pd.read_csv(tmp_path / "face_clusters.csv")
+    assert list(faces.columns) == ['img_id', 'face', 'cluster', 'emb'] and len(faces) == 0